@@ -0,0 +1,101 @@
+"""
+Cached admin lookups for the Flask-Login user loader.
+
+Flask-Login loads the logged-in admin on every authenticated request.
+load_admin() serves that lookup from a per-process LocalCache (see cache.py)
+that holds at most ADMIN_CACHE_SIZE admins for ADMIN_CACHE_TTL seconds.
+
+The cache stores plain column values, without the password hash. Each
+request gets a new transient Admin built from them, so no ORM instance is
+shared between threads or sessions. Do not add the snapshot to a session;
+load the admin with Admin.query to change it.
+
+When an Admin row is updated or deleted through the ORM, its entry is
+dropped after the commit. That only reaches the current process. Other
+gunicorn workers pick up the change when their entry expires, so the TTL
+is the upper bound on how long a deactivated account keeps access. Bulk
+query.update() calls skip the mapper events and are also bounded only by
+the TTL.
+"""
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from cache import LocalCache
+
+SNAPSHOT_COLUMNS = ('id', 'username', 'email', 'role', 'active', 'created_at')
+PENDING_KEY = 'admin_cache_pending'
+
+
+def get_cache():
+    """Return the admin cache for the current app, creating it on first use"""
+    cache = current_app.extensions.get('admin_cache')
+    if cache is None:
+        config = current_app.config
+        cache = LocalCache(max_entries=config.get('ADMIN_CACHE_SIZE', 256),
+                           default_ttl=config.get('ADMIN_CACHE_TTL', 30))
+        current_app.extensions['admin_cache'] = cache
+    return cache
+
+
+def _snapshot(admin):
+    return {column: getattr(admin, column) for column in SNAPSHOT_COLUMNS}
+
+
+def load_admin(user_id):
+    """Return an active admin for ``user_id`` as a detached snapshot, or None"""
+    from models import Admin
+    try:
+        admin_id = int(user_id)
+    except (TypeError, ValueError):
+        return None
+    if current_app.config.get('ADMIN_CACHE_TTL', 30) <= 0:
+        admin = Admin.query.get(admin_id)
+        return admin if admin is not None and admin.active else None
+
+    cache = get_cache()
+    key = f"admin:{admin_id}"
+    values = cache.get(key)
+    if values is None:
+        admin = Admin.query.get(admin_id)
+        if admin is None:
+            return None
+        values = _snapshot(admin)
+        cache.set(key, values)
+    if not values['active']:
+        return None
+    return Admin(**values)
+
+
+def forget(admin_id):
+    """Drop one admin from this process's cache"""
+    if has_app_context() and 'admin_cache' in current_app.extensions:
+        current_app.extensions['admin_cache'].delete(f"admin:{admin_id}")
+
+
+def _admin_changed(mapper, connection, target):
+    # Defer until commit, so a concurrent request can't re-cache the old row
+    session = object_session(target)
+    if session is None:
+        forget(target.id)
+    else:
+        session.info.setdefault(PENDING_KEY, set()).add(target.id)
+
+
+def _after_commit(session):
+    for admin_id in session.info.pop(PENDING_KEY, ()):
+        forget(admin_id)
+
+
+def _after_rollback(session):
+    session.info.pop(PENDING_KEY, None)
+
+
+def init_app(flask_app):
+    """Register the invalidation hooks"""
+    from models import Admin
+    if not event.contains(Admin, 'after_update', _admin_changed):
+        event.listen(Admin, 'after_update', _admin_changed)
+        event.listen(Admin, 'after_delete', _admin_changed)
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_rollback', _after_rollback)
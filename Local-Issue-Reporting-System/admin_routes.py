@@ -0,0 +1,294 @@
+"""
+Admin pages: login, the issue list and detail views, and the analytics dashboard.
+"""
+from datetime import datetime
+from urllib.parse import urlparse
+
+from flask import Blueprint, current_app, render_template, request, redirect, url_for, flash, jsonify
+from flask_login import login_user, logout_user, login_required, current_user
+from sqlalchemy import case
+
+from app import db
+from models import Issue, Admin
+from forms import AdminUpdateForm, BulkUpdateForm
+from login_forms import AdminLoginForm, CreateAdminForm
+from email_service import queue_status_update_notification
+from pagination import keyset_page
+from stats_service import get_issue_counts, record_status_change
+import rollups
+from analytics_service import get_analytics, invalidate_analytics
+from search import apply_search
+import issue_service
+from change_feed import latest_cursor
+
+admin_bp = Blueprint('admin', __name__)
+
+@admin_bp.route('/admin/login', methods=['GET', 'POST'])
+def admin_login():
+    """Admin login page"""
+    if current_user.is_authenticated:
+        return redirect(url_for('admin.admin_panel'))
+
+    form = AdminLoginForm()
+
+    if form.validate_on_submit():
+        admin = Admin.query.filter_by(username=form.username.data).first()
+
+        if admin and admin.active and admin.check_password(form.password.data):
+            login_user(admin, remember=form.remember_me.data)
+            flash('Successfully logged in!', 'success')
+
+            # Redirect to originally requested page or admin panel
+            next_page = request.args.get('next')
+            if next_page:
+                # Parse the URL to check if it's safe
+                parsed_url = urlparse(next_page)
+                # Only allow relative URLs (no netloc) and same-origin URLs
+                if parsed_url.netloc == '' and next_page.startswith('/') and not next_page.startswith('//'):
+                    return redirect(next_page)
+            # Default to admin panel if no valid next page
+            return redirect(url_for('admin.admin_panel'))
+        else:
+            flash('Invalid username or password', 'error')
+
+    return render_template('admin_login.html', form=form)
+
+@admin_bp.route('/admin/logout')
+@login_required
+def admin_logout():
+    """Admin logout"""
+    logout_user()
+    flash('You have been logged out.', 'info')
+    return redirect(url_for('main.index'))
+
+# Columns the admin list can be sorted by; the id is appended as a tie-breaker
+ADMIN_SORT_KEYS = ('created_at', 'updated_at', 'id', 'category', 'status', 'priority')
+
+PRIORITY_RANK = {'low': 0, 'medium': 1, 'high': 2, 'urgent': 3}
+
+def admin_issue_page(args):
+    """Load one keyset page of the admin list described by request ``args``
+
+    Only the columns the list shows are selected. Returns (rows, next_cursor, options)
+    and raises ValueError for a malformed cursor.
+    """
+    options = {
+        'status': args.get('status', 'all'),
+        'category': args.get('category', 'all'),
+        'priority': args.get('priority', 'all'),
+        'q': args.get('q', '').strip(),
+        'sort': args.get('sort', 'created_at'),
+        'order': 'asc' if args.get('order') == 'asc' else 'desc',
+    }
+    if options['sort'] not in ADMIN_SORT_KEYS:
+        options['sort'] = 'created_at'
+    config = current_app.config
+    limit = max(1, min(args.get('limit', config['ADMIN_PAGE_SIZE'], type=int), config['API_PAGE_MAX_LIMIT']))
+
+    if options['sort'] == 'priority':
+        sort_column = case(PRIORITY_RANK, value=Issue.priority, else_=PRIORITY_RANK['medium'])
+    else:
+        sort_column = getattr(Issue, options['sort'])
+    columns = [Issue.id, Issue.category, Issue.status, Issue.priority, Issue.name,
+               Issue.location, Issue.created_at, Issue.report_count]
+    sort_keys = [('id', Issue.id)]
+    if options['sort'] != 'id':
+        # Selected under a fixed name so the next cursor can be read off the last row
+        columns.append(sort_column.label('sort_key'))
+        sort_keys.insert(0, ('sort_key', sort_column))
+
+    query = db.session.query(*columns)
+    query, _ = apply_search(query, options['q'])
+    for field in ('status', 'category', 'priority'):
+        if options[field] != 'all':
+            query = query.filter(getattr(Issue, field) == options[field])
+    rows, next_cursor = keyset_page(query, sort_keys, limit, args.get('after'),
+                                    descending=options['order'] == 'desc')
+    return rows, next_cursor, options
+
+def admin_row_dict(row):
+    """JSON form of an admin list row"""
+    return {
+        'id': row.id,
+        'category': row.category,
+        'status': row.status,
+        'priority': row.priority,
+        'name': row.name,
+        'location': row.location,
+        'created_at': row.created_at.strftime('%Y-%m-%d'),
+        'report_count': row.report_count,
+        'url': url_for('admin.issue_detail', issue_id=row.id)
+    }
+
+@admin_bp.route('/admin')
+@login_required
+def admin_panel():
+    """Admin panel to view and manage issues"""
+    # Taken before the list is read, so the live stream misses nothing after it
+    changes_cursor = latest_cursor(current_app.config['CHANGE_FEED_SETTLE_SECONDS'])
+    try:
+        issues, next_cursor, options = admin_issue_page(request.args)
+    except ValueError:
+        return redirect(url_for('admin.admin_panel', **{key: value for key, value in request.args.items()
+                                                        if key != 'after'}))
+    # Get counts for dashboard
+    stats = get_issue_counts()
+    return render_template('admin.html',
+                         bulk_form=BulkUpdateForm(),
+                         changes_cursor=changes_cursor,
+                         issues=issues,
+                         next_cursor=next_cursor,
+                         stats=stats,
+                         current_status=options['status'],
+                         current_category=options['category'],
+                         current_priority=options['priority'],
+                         search_query=options['q'],
+                         sort=options['sort'],
+                         order=options['order'],
+                         is_continuation=bool(request.args.get('after')))
+
+@admin_bp.route('/api/admin/issues')
+@login_required
+def api_admin_issues():
+    """Next page of the admin list for lazy loading
+
+    Takes the admin panel's filters plus ``sort``, ``order``, ``limit`` and
+    the ``after`` cursor from the previous page.
+    """
+    try:
+        rows, next_cursor, _ = admin_issue_page(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'issues': [admin_row_dict(row) for row in rows],
+        'next_cursor': next_cursor
+    })
+
+@admin_bp.route('/admin/issues/bulk-update', methods=['POST'])
+@login_required
+def bulk_update():
+    """Apply a status, priority or assignment change to many issues at once
+
+    Applies to the checked ``issue_ids``, or with ``scope=filter`` to every
+    issue matching the list filters (``filter_status``, ``filter_category``,
+    ``filter_priority``, ``filter_q``).
+    """
+    form = BulkUpdateForm()
+    filters = {field: request.form.get(f'filter_{field}', 'all') for field in ('status', 'category', 'priority')}
+    filters['q'] = request.form.get('filter_q', '').strip()
+    back = url_for('admin.admin_panel', sort=request.form.get('sort'), order=request.form.get('order'),
+                   **filters)
+    if not form.validate_on_submit():
+        for field_name, errors in form.errors.items():
+            for error in errors:
+                field_display = str(field_name).replace("_", " ").title()
+                flash(f'{field_display}: {error}', 'error')
+        return redirect(back)
+
+    if form.scope.data == 'filter':
+        condition = issue_service.selection_condition(filters=filters)
+    else:
+        issue_ids = [int(value) for value in request.form.getlist('issue_ids') if value.isdigit()]
+        if not issue_ids:
+            flash('Select at least one issue first.', 'error')
+            return redirect(back)
+        condition = issue_service.selection_condition(issue_ids=issue_ids)
+    changes = {'status': form.status.data, 'priority': form.priority.data,
+               'assigned_to': (form.assigned_to.data or '').strip()}
+    try:
+        updated, queued = issue_service.bulk_update_issues(
+            condition, changes, current_app.config['BULK_UPDATE_MAX_ISSUES'])
+        db.session.commit()
+        invalidate_analytics()
+        flash(f'Updated {updated} issues; {queued} reporter notifications queued.', 'success')
+        current_app.logger.info(f'Bulk update of {updated} issues by admin {current_user.username}: {changes}')
+    except (ValueError, issue_service.BulkUpdateConflict) as e:
+        db.session.rollback()
+        flash(str(e), 'error')
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Error in bulk update: {str(e)}')
+        flash('An error occurred while updating the issues.', 'error')
+    return redirect(back)
+
+@admin_bp.route('/issue/<int:issue_id>')
+@login_required
+def issue_detail(issue_id):
+    """View detailed information about a specific issue"""
+    issue = Issue.query.get_or_404(issue_id)
+    form = AdminUpdateForm(obj=issue)
+    return render_template('issue_detail.html', issue=issue, form=form)
+
+@admin_bp.route('/update_issue/<int:issue_id>', methods=['POST'])
+@login_required
+def update_issue(issue_id):
+    """Update issue status and details"""
+    issue = Issue.query.get_or_404(issue_id)
+    old_status = issue.status
+    old_priority = issue.priority
+    form = AdminUpdateForm()
+    if form.validate_on_submit():
+        try:
+            issue.status = form.status.data
+            issue.priority = form.priority.data
+            issue.admin_notes = form.admin_notes.data
+            issue.assigned_to = form.assigned_to.data
+            # Track when the issue was resolved; later note edits must not move it
+            if issue.status == 'resolved' and old_status != 'resolved':
+                issue.resolved_at = datetime.utcnow()
+            elif issue.status != 'resolved':
+                issue.resolved_at = None
+            record_status_change(old_status, issue.status)
+            rollups.record_issue_changed(issue, old_status, old_priority)
+            # Queue status update notification if status changed
+            if old_status != issue.status:
+                queue_status_update_notification(issue, old_status)
+            db.session.commit()
+            invalidate_analytics()
+            flash('Issue updated successfully!', 'success')
+            current_app.logger.info(f'Issue {issue_id} updated by admin {current_user.username}')
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f'Error updating issue {issue_id}: {str(e)}')
+            flash('An error occurred while updating the issue.', 'error')
+    else:
+        for field_name, errors in form.errors.items():
+            for error in errors:
+                field_display = str(field_name).replace("_", " ").title()
+                flash(f'{field_display}: {error}', 'error')
+    return redirect(url_for('admin.issue_detail', issue_id=issue_id))
+
+@admin_bp.route('/admin/create', methods=['GET', 'POST'])
+def create_admin():
+    """Create admin account - for initial setup only"""
+    # Check if any admin exists
+    if Admin.query.first():
+        flash('Admin account already exists. Please contact an existing admin.', 'error')
+        return redirect(url_for('admin.admin_login'))
+
+    form = CreateAdminForm()
+    if form.validate_on_submit():
+        try:
+            admin = Admin(
+                username=form.username.data,
+                email=form.email.data,
+                role=form.role.data or 'admin'
+            )
+            admin.set_password(form.password.data)
+            db.session.add(admin)
+            db.session.commit()
+            flash('Admin account created successfully! You can now log in.', 'success')
+            current_app.logger.info(f'Admin account created: {admin.username}')
+            return redirect(url_for('admin.admin_login'))
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f'Error creating admin: {str(e)}')
+            flash('An error occurred while creating the admin account.', 'error')
+    return render_template('create_admin.html', form=form)
+
+@admin_bp.route('/analytics')
+@login_required
+def analytics_dashboard():
+    """Analytics dashboard for government officials"""
+    changes_cursor = latest_cursor(current_app.config['CHANGE_FEED_SETTLE_SECONDS'])
+    return render_template('analytics.html', changes_cursor=changes_cursor, analytics=get_analytics())
@@ -0,0 +1,241 @@
+"""
+Analytics payload shared by /analytics and /api/analytics.
+
+build_analytics() runs every aggregate query. get_analytics() serves the
+payload from a cache (see cache.py) for ANALYTICS_CACHE_TTL seconds. Issue
+writes call invalidate_analytics() after they commit. Invalidation bumps a
+generation number that is part of the cache key, so with a shared backend
+every worker stops using the old payload at once.
+"""
+import threading
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import func, or_
+
+import geo
+from app import db
+from cache import create_cache
+from rollups import parse_window, trend_series
+from stats_service import get_issue_counts
+
+GENERATION_KEY = 'analytics:generation'
+
+_build_lock = threading.Lock()
+
+
+def get_cache():
+    """Return the analytics cache backend for the current app, creating it on first use"""
+    cache = current_app.extensions.get('analytics_cache')
+    if cache is None:
+        config = current_app.config
+        cache = create_cache(
+            url=config.get('ANALYTICS_CACHE_URL'),
+            max_entries=config.get('ANALYTICS_CACHE_MAX_ENTRIES', 128),
+            default_ttl=config.get('ANALYTICS_CACHE_TTL', 60)
+        )
+        current_app.extensions['analytics_cache'] = cache
+    return cache
+
+
+def _cache_key(cache):
+    return f"analytics:payload:{cache.get(GENERATION_KEY) or 0}"
+
+
+def _resolution_days(Issue):
+    """SQL expression for days between creation and resolution on the active dialect"""
+    if db.engine.dialect.name == 'postgresql':
+        return func.extract('epoch', Issue.resolved_at - Issue.created_at) / 86400.0
+    return func.julianday(Issue.resolved_at) - func.julianday(Issue.created_at)
+
+
+def _percentile(duration, criteria, count, fraction):
+    """Interpolated percentile computed in the database by ordered offset
+
+    Used on dialects without percentile_cont; only the two neighbouring
+    values are fetched.
+    """
+    position = fraction * (count - 1)
+    lower = int(position)
+    values = [row[0] for row in db.session.query(duration).filter(*criteria)
+              .order_by(duration).offset(lower).limit(2).all()]
+    if len(values) == 1:
+        return values[0]
+    return values[0] + (values[1] - values[0]) * (position - lower)
+
+
+def resolution_time_stats():
+    """Mean, median, p90 and per-category resolution time in days, aggregated in SQL"""
+    from models import Issue
+    duration = _resolution_days(Issue)
+    criteria = (Issue.status == 'resolved', Issue.resolved_at.isnot(None))
+    if db.engine.dialect.name == 'postgresql':
+        count, mean, median, p90 = db.session.query(
+            func.count(Issue.id),
+            func.avg(duration),
+            func.percentile_cont(0.5).within_group(duration),
+            func.percentile_cont(0.9).within_group(duration)
+        ).filter(*criteria).one()
+    else:
+        count, mean = db.session.query(func.count(Issue.id), func.avg(duration)).filter(*criteria).one()
+        median = _percentile(duration, criteria, count, 0.5) if count else None
+        p90 = _percentile(duration, criteria, count, 0.9) if count else None
+    by_category = db.session.query(
+        Issue.category,
+        func.count(Issue.id),
+        func.avg(duration)
+    ).filter(*criteria).group_by(Issue.category).all()
+    return {
+        'count': count,
+        'mean_days': round(float(mean or 0), 1),
+        'median_days': round(float(median or 0), 1),
+        'p90_days': round(float(p90 or 0), 1),
+        'by_category': {category: {'count': n, 'mean_days': round(float(avg or 0), 1)}
+                        for category, n, avg in by_category}
+    }
+
+
+def build_analytics():
+    """Run the analytics queries and return the full payload"""
+    from models import Issue
+    # Issues by status
+    status_stats = db.session.query(
+        Issue.status,
+        func.count(Issue.id).label('count')
+    ).group_by(Issue.status).all()
+    # Issues by category
+    category_stats = db.session.query(
+        Issue.category,
+        func.count(Issue.id).label('count')
+    ).group_by(Issue.category).all()
+    # Issues by priority
+    priority_stats = db.session.query(
+        Issue.priority,
+        func.count(Issue.id).label('count')
+    ).group_by(Issue.priority).all()
+    # Monthly trends (latest 12 months, from the daily rollup)
+    start, end = parse_window('12m')
+    monthly_stats = trend_series(start, end, 'month')
+    # Resolution time analysis
+    resolution_time = resolution_time_stats()
+    # Geographic extent; the map loads its clusters from /api/issues/geo
+    geo_count, geo_lat, geo_lng = db.session.query(
+        func.count(Issue.id),
+        func.avg(Issue.latitude),
+        func.avg(Issue.longitude)
+    ).filter(
+        Issue.latitude.isnot(None),
+        Issue.longitude.isnot(None)
+    ).one()
+    # Performance metrics
+    counts = get_issue_counts()
+    total_issues = counts['total']
+    resolution_rate = (counts['resolved'] / total_issues * 100) if total_issues > 0 else 0
+    notification_rate = (counts['notified'] / total_issues * 100) if total_issues > 0 else 0
+    return {
+        'status_stats': {item.status: item.count for item in status_stats},
+        'category_stats': {item.category: item.count for item in category_stats},
+        'priority_stats': {item.priority: item.count for item in priority_stats},
+        'monthly_stats': [
+            {'year': int(item['period'][:4]), 'month': int(item['period'][5:7]), 'count': item['count']}
+            for item in monthly_stats
+        ],
+        'geo': {
+            'count': geo_count,
+            'center': [float(geo_lat), float(geo_lng)] if geo_count else None
+        },
+        'performance': {
+            'total_issues': total_issues,
+            'resolved_count': counts['resolved'],
+            'in_progress_count': counts['in_progress'],
+            'pending_count': counts['submitted'],
+            'resolution_rate': round(resolution_rate, 1),
+            'avg_resolution_time': resolution_time['mean_days'],
+            'notification_rate': round(notification_rate, 1)
+        },
+        'resolution_time': resolution_time,
+        'generated_at': datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+    }
+
+
+def geo_summary(bbox, zoom, status=None):
+    """Clusters (or, at high zoom, individual points) for issues inside a bounding box
+
+    Clusters are geohash cells sized for the zoom level, with counts per
+    category and status and the mean position of their issues.
+    """
+    from models import Issue
+    west, south, east, north = bbox
+    criteria = [Issue.latitude.between(south, north), Issue.geohash.isnot(None)]
+    if west <= east:
+        criteria.append(Issue.longitude.between(west, east))
+    else:
+        # Box crosses the antimeridian
+        criteria.append(or_(Issue.longitude >= west, Issue.longitude <= east))
+    if status:
+        criteria.append(Issue.status == status)
+
+    precision = geo.precision_for_zoom(zoom)
+    if precision is None:
+        limit = current_app.config.get('GEO_MAX_POINTS', 2000)
+        rows = db.session.query(
+            Issue.id, Issue.latitude, Issue.longitude, Issue.category, Issue.status, Issue.priority
+        ).filter(*criteria).order_by(Issue.id.desc()).limit(limit + 1).all()
+        return {
+            'zoom': zoom,
+            'points': [{'id': row.id, 'lat': row.latitude, 'lng': row.longitude, 'category': row.category,
+                        'status': row.status, 'priority': row.priority} for row in rows[:limit]],
+            'truncated': len(rows) > limit
+        }
+
+    cell = func.substr(Issue.geohash, 1, precision)
+    rows = db.session.query(
+        cell.label('cell'),
+        Issue.category,
+        Issue.status,
+        func.count(Issue.id).label('count'),
+        func.sum(Issue.latitude).label('lat_sum'),
+        func.sum(Issue.longitude).label('lng_sum')
+    ).filter(*criteria).group_by(cell, Issue.category, Issue.status).all()
+    clusters = {}
+    for row in rows:
+        cluster = clusters.setdefault(row.cell, {
+            'cell': row.cell, 'count': 0, 'lat_sum': 0.0, 'lng_sum': 0.0, 'by_category': {}, 'by_status': {}
+        })
+        cluster['count'] += row.count
+        cluster['lat_sum'] += row.lat_sum
+        cluster['lng_sum'] += row.lng_sum
+        cluster['by_category'][row.category] = cluster['by_category'].get(row.category, 0) + row.count
+        cluster['by_status'][row.status] = cluster['by_status'].get(row.status, 0) + row.count
+    for cluster in clusters.values():
+        cluster['lat'] = cluster.pop('lat_sum') / cluster['count']
+        cluster['lng'] = cluster.pop('lng_sum') / cluster['count']
+    return {'zoom': zoom, 'precision': precision, 'clusters': list(clusters.values())}
+
+
+def get_analytics():
+    """Return the analytics payload, building it at most once per TTL per generation
+
+    The returned dict is shared with other requests and must not be mutated.
+    """
+    cache = get_cache()
+    key = _cache_key(cache)
+    payload = cache.get(key)
+    if payload is not None:
+        return payload
+    # Only one thread per process rebuilds; the others wait and reuse its result
+    with _build_lock:
+        payload = cache.get(key)
+        if payload is None:
+            payload = build_analytics()
+            cache.set(key, payload, ttl=current_app.config.get('ANALYTICS_CACHE_TTL', 60))
+    return payload
+
+
+def invalidate_analytics():
+    """Discard the cached payload; call after committing an issue write"""
+    try:
+        get_cache().incr(GENERATION_KEY)
+    except Exception as e:
+        # A cache outage must never fail the write that triggered it
+        current_app.logger.warning(f'Failed to invalidate analytics cache: {str(e)}')
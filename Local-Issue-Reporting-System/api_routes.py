@@ -0,0 +1,253 @@
+"""
+JSON API, the analytics endpoints and the Prometheus /metrics scrape.
+"""
+import hmac
+from datetime import datetime
+
+from flask import Blueprint, current_app, request, jsonify, Response, stream_with_context
+from flask_login import login_required
+
+from models import Issue
+from pagination import encode_cursor, keyset_after
+import rollups
+from analytics_service import get_analytics, geo_summary
+from geo import parse_bbox
+from search import apply_search
+from http_cache import collection_validators, not_modified, page_validators, set_validators
+import change_feed
+from stats_service import get_issue_counts
+
+api_bp = Blueprint('api', __name__)
+
+LOOPBACK_ADDRESSES = ('127.0.0.1', '::1')
+
+def _stream_issues(query, batch_size, ndjson=False):
+    """Yield serialized issues batch by batch so only one batch is held in memory"""
+    dumps = current_app.json.dumps
+    if not ndjson:
+        yield '['
+    first = True
+    for issue in query.yield_per(batch_size):
+        if ndjson:
+            yield dumps(issue.to_dict()) + '\n'
+        else:
+            yield ('' if first else ',') + dumps(issue.to_dict())
+        first = False
+    if not ndjson:
+        yield ']'
+
+@api_bp.route('/api/issues')
+def api_issues():
+    """API endpoint to get issues data
+
+    Modes:
+    - ``?limit=N&after=<cursor>``: one keyset page ordered by (created_at, id)
+      with a ``next_cursor`` to continue from
+    - ``?format=ndjson``: every issue (after ``after`` if given) streamed as
+      newline-delimited JSON
+    - no parameters: every issue streamed as a chunked JSON array
+    """
+    config = current_app.config
+    query = Issue.query.order_by(Issue.created_at.asc(), Issue.id.asc())
+    after = request.args.get('after')
+    if after:
+        try:
+            query = keyset_after(query, Issue, after)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+    batch_size = config['API_STREAM_BATCH_SIZE']
+    if (after or 'limit' in request.args) and request.args.get('format') != 'ndjson':
+        limit = request.args.get('limit', config['API_PAGE_DEFAULT_LIMIT'], type=int)
+        limit = max(1, min(limit, config['API_PAGE_MAX_LIMIT']))
+        # Fetch one extra row to know whether another page exists
+        issues = query.limit(limit + 1).all()
+        next_cursor = None
+        if len(issues) > limit:
+            issues = issues[:limit]
+            next_cursor = encode_cursor(issues[-1].created_at, issues[-1].id)
+        # Validators from the page itself: no second pass over the filter
+        etag, last_modified = page_validators(issues, next_cursor)
+        cached = not_modified(etag, last_modified)
+        if cached is not None:
+            return cached
+        response = jsonify({
+            'issues': [issue.to_dict() for issue in issues],
+            'next_cursor': next_cursor
+        })
+        return set_validators(response, etag, last_modified)
+
+    # The streams read every matching row anyway; one aggregate up front
+    # lets an unchanged collection skip them entirely
+    etag, last_modified = collection_validators(query, Issue)
+    cached = not_modified(etag, last_modified)
+    if cached is not None:
+        return cached
+
+    if request.args.get('format') == 'ndjson':
+        response = Response(stream_with_context(_stream_issues(query, batch_size, ndjson=True)),
+                            mimetype='application/x-ndjson')
+        return set_validators(response, etag, last_modified)
+
+    response = Response(stream_with_context(_stream_issues(query, batch_size)),
+                        mimetype='application/json')
+    return set_validators(response, etag, last_modified)
+
+@api_bp.route('/api/issues/changes')
+@login_required
+def api_issue_changes():
+    """Issues created or updated after the ``since`` cursor, oldest first
+
+    Omit ``since`` to read from the beginning, or pass ``since=now`` to get
+    only the current cursor. Keep passing back ``next_cursor``. ``counts``
+    holds the dashboard counters whenever something changed.
+    """
+    config = current_app.config
+    limit = max(1, min(request.args.get('limit', config['API_PAGE_DEFAULT_LIMIT'], type=int),
+                       config['API_PAGE_MAX_LIMIT']))
+    since = request.args.get('since')
+    if since == 'now':
+        return jsonify({'changes': [], 'next_cursor': change_feed.latest_cursor(config['CHANGE_FEED_SETTLE_SECONDS'])})
+    try:
+        rows, next_cursor = change_feed.fetch_changes(since, limit, config['CHANGE_FEED_SETTLE_SECONDS'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    data = {'changes': [change_feed.change_dict(row) for row in rows], 'next_cursor': next_cursor}
+    if rows:
+        data['counts'] = get_issue_counts()
+    return jsonify(data)
+
+@api_bp.route('/api/issues/stream')
+@login_required
+def api_issue_stream():
+    """Server-Sent Events stream of the change feed for live dashboards
+
+    Starts after the ``since`` cursor, or after the Last-Event-ID the browser
+    sends when it reconnects. Each ``changes`` event carries the changed
+    issues, the dashboard counters and the new cursor.
+    """
+    cursor = request.headers.get('Last-Event-ID') or request.args.get('since')
+    if cursor:
+        try:
+            change_feed.decode_cursor(cursor)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    stream = change_feed.stream_changes(current_app._get_current_object(), cursor)
+    return Response(stream_with_context(stream), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@api_bp.route('/api/issues/search')
+def api_issues_search():
+    """Ranked full-text search over description, location and admin notes
+
+    Query parameters: ``q`` (required), ``page``, ``per_page`` and the optional
+    ``status``/``category``/``priority`` filters.
+    """
+    search_query = request.args.get('q', '').strip()
+    query, matches = apply_search(Issue.query, search_query)
+    if matches is None:
+        return jsonify({'error': 'q must contain at least one search term'}), 400
+    for field in ('status', 'category', 'priority'):
+        value = request.args.get(field, 'all')
+        if value != 'all':
+            query = query.filter(getattr(Issue, field) == value)
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = max(1, min(request.args.get('per_page', 20, type=int), current_app.config['API_PAGE_MAX_LIMIT']))
+    total = query.order_by(None).count()
+    rows = query.add_columns(matches.c.rank).order_by(
+        matches.c.rank.desc(), Issue.id.desc()
+    ).offset((page - 1) * per_page).limit(per_page).all()
+    return jsonify({
+        'query': search_query,
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'results': [dict(issue.to_dict(), rank=rank) for issue, rank in rows]
+    })
+
+@api_bp.route('/api/issues/geo')
+@login_required
+def api_issues_geo():
+    """Map data for a bounding box: clusters at low zoom, points at high zoom
+
+    Query parameters: ``bbox=west,south,east,north``, ``zoom`` (Leaflet zoom
+    level) and an optional ``status`` filter.
+    """
+    try:
+        bbox = parse_bbox(request.args.get('bbox'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    zoom = request.args.get('zoom', 12, type=int)
+    status = request.args.get('status')
+    if status == 'all':
+        status = None
+    return jsonify(geo_summary(bbox, zoom, status))
+
+@api_bp.route('/metrics')
+def prometheus_metrics():
+    """Request, SQL and email metrics in Prometheus text format"""
+    config = current_app.config
+    if not config['METRICS_ENABLED']:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    token = config.get('METRICS_TOKEN')
+    if token:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return jsonify({'error': 'Unauthorized'}), 401
+    elif request.remote_addr not in LOOPBACK_ADDRESSES or 'X-Forwarded-For' in request.headers:
+        # No token: only a scraper on this host, talking to the app directly
+        # rather than through a local reverse proxy, may read the numbers
+        return jsonify({'error': 'Set METRICS_TOKEN to scrape metrics remotely'}), 403
+    import metrics
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@api_bp.route('/api/analytics/trends')
+@login_required
+def api_analytics_trends():
+    """Issue counts over time from the daily rollup
+
+    Query parameters: either ``window`` (``30d``, ``8w``, ``12m``; default
+    ``12m``) or ``start``/``end`` dates (YYYY-MM-DD), plus ``granularity``
+    (day/week/month, default month) and optional ``category``/``status``/
+    ``priority`` filters.
+    """
+    granularity = request.args.get('granularity', 'month')
+    try:
+        if request.args.get('start'):
+            start = datetime.strptime(request.args['start'], '%Y-%m-%d').date()
+            end = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') \
+                else datetime.utcnow().date()
+        else:
+            start, end = rollups.parse_window(request.args.get('window', '12m'))
+        if (end - start).days > 3660:
+            raise ValueError('range must not exceed ten years')
+        series = rollups.trend_series(
+            start, end, granularity,
+            category=request.args.get('category'),
+            status=request.args.get('status'),
+            priority=request.args.get('priority')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'granularity': granularity,
+        'series': series
+    })
+
+@api_bp.route('/api/analytics')
+@login_required
+def api_analytics():
+    """API endpoint for analytics data"""
+    # Served from the same cached payload as the dashboard
+    analytics = get_analytics()
+    data = {
+        'category_distribution': analytics['category_stats'],
+        'status_distribution': analytics['status_stats'],
+        'priority_distribution': analytics['priority_stats'],
+        'monthly_trends': [
+            {'month': f"{item['year']}-{item['month']:02d}", 'count': item['count']}
+            for item in analytics['monthly_stats']
+        ]
+    }
+    return jsonify(data)
@@ -1,3 +1,13 @@
+"""
+Application factory.
+
+Importing this module only defines the extensions; nothing touches the
+database. create_app() builds a configured app and registers the blueprints
+and CLI commands. The schema is created by "flask upgrade-db", not on
+startup, so workers boot without DDL round trips. main.py builds the app
+once at import, so "gunicorn --preload main:app" shares the loaded code
+between workers copy-on-write.
+"""
 import os
 import logging
 from flask import Flask
@@ -6,52 +16,182 @@ from flask_login import LoginManager
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 
-# Set up logging for debugging
-logging.basicConfig(level=logging.DEBUG)
+from replicas import RoutingSession
 
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
-
-# Create the app
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
-
-# Configure the database
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///civic_issues.db")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
-app.config["UPLOAD_FOLDER"] = "static/uploads"
-app.config["MAX_CONTENT_LENGTH"] = 16 * 1024 * 1024  # 16MB max file size
-
-# Initialize the app with the extension
-db.init_app(app)
+# RoutingSession sends reads to a replica when one is configured (see replicas.py)
+db = SQLAlchemy(model_class=Base, session_options={"class_": RoutingSession})
 
-# Initialize Flask-Login
 login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'admin_login'
+login_manager.login_view = 'admin.admin_login'
 login_manager.login_message = 'Please log in to access the admin panel.'
 login_manager.login_message_category = 'info'
 
 @login_manager.user_loader
 def load_user(user_id):
-    from models import Admin
-    return Admin.query.get(int(user_id))
+    from admin_cache import load_admin
+    return load_admin(user_id)
+
+
+def create_app(config=None):
+    """Create and configure the application; ``config`` overrides the environment"""
+    logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper())
+
+    app = Flask(__name__)
+    app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key")
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+
+    # Configure the database
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///civic_issues.db")
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_recycle": 300,
+        "pool_pre_ping": True,
+    }
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+
+    # Engine tuning per backend (see db_profile.py)
+    app.config["SQLITE_JOURNAL_MODE"] = os.environ.get("SQLITE_JOURNAL_MODE", "wal")
+    app.config["SQLITE_SYNCHRONOUS"] = os.environ.get("SQLITE_SYNCHRONOUS", "normal")
+    app.config["SQLITE_BUSY_TIMEOUT_MS"] = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    app.config["SQLITE_MMAP_SIZE"] = int(os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    app.config["DB_POOL_SIZE"] = int(os.environ.get("DB_POOL_SIZE", "10"))
+    app.config["DB_MAX_OVERFLOW"] = int(os.environ.get("DB_MAX_OVERFLOW", "20"))
+    app.config["PG_STATEMENT_TIMEOUT_MS"] = int(os.environ.get("PG_STATEMENT_TIMEOUT_MS", "30000"))
+    app.config["PG_SYNCHRONOUS_COMMIT"] = os.environ.get("PG_SYNCHRONOUS_COMMIT", "on")
+
+    # Read replicas for GET requests (see replicas.py), comma-separated URLs
+    app.config["SQLALCHEMY_REPLICA_URIS"] = [url.strip() for url in os.environ.get("DATABASE_REPLICA_URLS", "").split(",")
+                                             if url.strip()]
+    app.config["REPLICA_STICKY_SECONDS"] = float(os.environ.get("REPLICA_STICKY_SECONDS", "5"))
+    app.config["REPLICA_HEALTH_INTERVAL"] = float(os.environ.get("REPLICA_HEALTH_INTERVAL", "5"))
+    app.config["REPLICA_MAX_LAG_SECONDS"] = float(os.environ.get("REPLICA_MAX_LAG_SECONDS", "10"))
+
+    # Batch concurrent submissions into one transaction (see group_commit.py)
+    app.config["GROUP_COMMIT_ENABLED"] = os.environ.get("GROUP_COMMIT_ENABLED", "false").lower() == "true"
+    app.config["GROUP_COMMIT_MAX_BATCH"] = int(os.environ.get("GROUP_COMMIT_MAX_BATCH", "64"))
+    app.config["GROUP_COMMIT_MAX_WAIT_MS"] = float(os.environ.get("GROUP_COMMIT_MAX_WAIT_MS", "2"))
+    app.config["GROUP_COMMIT_TIMEOUT"] = float(os.environ.get("GROUP_COMMIT_TIMEOUT", "30"))
+    app.config["UPLOAD_FOLDER"] = "static/uploads"
+    app.config["MAX_CONTENT_LENGTH"] = 16 * 1024 * 1024  # 16MB max file size
+    app.config["UPLOAD_CHUNK_SIZE"] = 64 * 1024
+    app.config["PHOTO_VARIANT_WORKERS"] = int(os.environ.get("PHOTO_VARIANT_WORKERS", "2"))
+    app.config["PHOTO_GC_GRACE_SECONDS"] = int(os.environ.get("PHOTO_GC_GRACE_SECONDS", "86400"))
+
+    # Response compression (brotli needs the optional 'brotli' package)
+    app.config["COMPRESS_MIN_SIZE"] = int(os.environ.get("COMPRESS_MIN_SIZE", "500"))
+    app.config["COMPRESS_GZIP_LEVEL"] = int(os.environ.get("COMPRESS_GZIP_LEVEL", "6"))
+    app.config["COMPRESS_BROTLI_QUALITY"] = int(os.environ.get("COMPRESS_BROTLI_QUALITY", "5"))
+
+    # /api/issues paging and streaming
+    app.config["API_PAGE_DEFAULT_LIMIT"] = int(os.environ.get("API_PAGE_DEFAULT_LIMIT", "100"))
+    app.config["API_PAGE_MAX_LIMIT"] = int(os.environ.get("API_PAGE_MAX_LIMIT", "1000"))
+    app.config["ADMIN_PAGE_SIZE"] = int(os.environ.get("ADMIN_PAGE_SIZE", "50"))
+    # Most issues one admin bulk update may change
+    app.config["BULK_UPDATE_MAX_ISSUES"] = int(os.environ.get("BULK_UPDATE_MAX_ISSUES", "5000"))
+    app.config["API_STREAM_BATCH_SIZE"] = int(os.environ.get("API_STREAM_BATCH_SIZE", "500"))
+
+    # Read dashboard counters from the issue_counter table instead of aggregating.
+    # Run "flask rebuild-counters" before turning this on for an existing database.
+    app.config["ISSUE_COUNTERS_ENABLED"] = os.environ.get("ISSUE_COUNTERS_ENABLED", "false").lower() == "true"
+
+    # Analytics payload cache. Leave ANALYTICS_CACHE_URL unset for a per-process
+    # cache, or point it at redis:// to share one cache across gunicorn workers.
+    app.config["ANALYTICS_CACHE_TTL"] = int(os.environ.get("ANALYTICS_CACHE_TTL", "60"))
+    app.config["ANALYTICS_CACHE_MAX_ENTRIES"] = int(os.environ.get("ANALYTICS_CACHE_MAX_ENTRIES", "128"))
+    app.config["ANALYTICS_CACHE_URL"] = os.environ.get("ANALYTICS_CACHE_URL")
+
+    # Maximum individual issues returned by /api/issues/geo at high zoom
+    app.config["GEO_MAX_POINTS"] = int(os.environ.get("GEO_MAX_POINTS", "2000"))
+
+    # Near-duplicate detection on submission (see duplicates.py)
+    app.config["DUPLICATE_DETECTION_ENABLED"] = os.environ.get("DUPLICATE_DETECTION_ENABLED", "true").lower() == "true"
+    app.config["DUPLICATE_RADIUS_METERS"] = float(os.environ.get("DUPLICATE_RADIUS_METERS", "50"))
+    app.config["DUPLICATE_WINDOW_HOURS"] = float(os.environ.get("DUPLICATE_WINDOW_HOURS", "72"))
+    app.config["DUPLICATE_MIN_SIMILARITY"] = float(os.environ.get("DUPLICATE_MIN_SIMILARITY", "0.3"))
+    app.config["DUPLICATE_MAX_CANDIDATES"] = int(os.environ.get("DUPLICATE_MAX_CANDIDATES", "50"))
+
+    # Email outbox delivery (see outbox_worker.py). With EMAIL_OUTBOX_WORKER_THREADS=0
+    # run "python outbox_worker.py" as a separate process.
+    app.config["EMAIL_OUTBOX_WORKER_THREADS"] = int(os.environ.get("EMAIL_OUTBOX_WORKER_THREADS", "0"))
+    app.config["EMAIL_OUTBOX_POLL_INTERVAL"] = float(os.environ.get("EMAIL_OUTBOX_POLL_INTERVAL", "5"))
+    app.config["EMAIL_OUTBOX_BATCH_SIZE"] = int(os.environ.get("EMAIL_OUTBOX_BATCH_SIZE", "50"))
+    app.config["EMAIL_OUTBOX_MAX_ATTEMPTS"] = int(os.environ.get("EMAIL_OUTBOX_MAX_ATTEMPTS", "8"))
+    app.config["EMAIL_OUTBOX_BACKOFF_SECONDS"] = int(os.environ.get("EMAIL_OUTBOX_BACKOFF_SECONDS", "30"))
+    app.config["EMAIL_OUTBOX_BACKOFF_MAX_SECONDS"] = int(os.environ.get("EMAIL_OUTBOX_BACKOFF_MAX_SECONDS", "3600"))
+    app.config["EMAIL_OUTBOX_LEASE_SECONDS"] = int(os.environ.get("EMAIL_OUTBOX_LEASE_SECONDS", "600"))
+
+    # Change feed and the live dashboard stream (see change_feed.py). Streams hold
+    # a worker thread each, so serve them with threaded or async workers.
+    app.config["CHANGE_FEED_POLL_INTERVAL"] = float(os.environ.get("CHANGE_FEED_POLL_INTERVAL", "2"))
+    # Unset: derived from the lock and group-commit timeouts (see change_feed.py)
+    app.config["CHANGE_FEED_SETTLE_SECONDS"] = (float(os.environ["CHANGE_FEED_SETTLE_SECONDS"])
+                                                if os.environ.get("CHANGE_FEED_SETTLE_SECONDS") else None)
+    app.config["CHANGE_FEED_BATCH_SIZE"] = int(os.environ.get("CHANGE_FEED_BATCH_SIZE", "200"))
+    app.config["CHANGE_STREAM_QUEUE_SIZE"] = int(os.environ.get("CHANGE_STREAM_QUEUE_SIZE", "100"))
+    app.config["CHANGE_STREAM_HEARTBEAT"] = float(os.environ.get("CHANGE_STREAM_HEARTBEAT", "15"))
+    app.config["CHANGE_STREAM_MAX_SECONDS"] = float(os.environ.get("CHANGE_STREAM_MAX_SECONDS", "300"))
+
+    # Authorities that get one digest email instead of a message per issue
+    # (see digests.py), e.g. "roads.dept@civic.gov:900:50,maintenance@city.gov"
+    app.config["AUTHORITY_DIGESTS"] = os.environ.get("AUTHORITY_DIGESTS", "")
+    app.config["AUTHORITY_DIGEST_INTERVAL"] = float(os.environ.get("AUTHORITY_DIGEST_INTERVAL", "900"))
+    app.config["AUTHORITY_DIGEST_MAX_ISSUES"] = int(os.environ.get("AUTHORITY_DIGEST_MAX_ISSUES", "50"))
+
+    # Request/SQL instrumentation served at /metrics (see metrics.py). Set
+    # METRICS_TOKEN to require "Authorization: Bearer <token>" for scrapes;
+    # without it only direct requests from localhost are answered.
+    app.config["METRICS_ENABLED"] = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
+    app.config["METRICS_TOKEN"] = os.environ.get("METRICS_TOKEN")
+    app.config["SLOW_REQUEST_MS"] = float(os.environ.get("SLOW_REQUEST_MS", "500"))
+    app.config["SLOW_QUERY_MS"] = float(os.environ.get("SLOW_QUERY_MS", "100"))
+
+    # Per-process cache of logged-in admins (see admin_cache.py). The TTL bounds how
+    # long another worker can keep serving a deactivated account; 0 disables it.
+    app.config["ADMIN_CACHE_TTL"] = float(os.environ.get("ADMIN_CACHE_TTL", "30"))
+    app.config["ADMIN_CACHE_SIZE"] = int(os.environ.get("ADMIN_CACHE_SIZE", "256"))
+
+    if config:
+        app.config.update(config)
+    if app.config["CHANGE_FEED_SETTLE_SECONDS"] is None:
+        from change_feed import default_settle_seconds
+        app.config["CHANGE_FEED_SETTLE_SECONDS"] = default_settle_seconds(app.config)
+
+    import db_profile
+    import replicas
+    db_profile.apply_engine_options(app.config)
+    replicas.configure(app.config)
+    db.init_app(app)
+    db_profile.init_app(app)
+    replicas.init_app(app)
+    login_manager.init_app(app)
+
+    import models  # noqa: F401  (registers the mappers)
+    import admin_cache
+    admin_cache.init_app(app)
+
+    from routes import main_bp
+    from admin_routes import admin_bp
+    from api_routes import api_bp
+    app.register_blueprint(main_bp)
+    app.register_blueprint(admin_bp)
+    app.register_blueprint(api_bp)
+
+    from http_cache import compress_response
+    from uploads import photo_url
+    app.after_request(compress_response)
+    app.add_template_global(photo_url)
 
+    import commands
+    commands.init_app(app)
 
-# Import models and routes after app and db are ready
+    if app.config["METRICS_ENABLED"]:
+        import metrics
+        metrics.init_app(app)
 
-# Import models and routes after app and db are ready, but avoid circular import at startup
-with app.app_context():
-    import models
-    db.create_all()
-import routes
+    if app.config["EMAIL_OUTBOX_WORKER_THREADS"] > 0:
+        from outbox_worker import start_worker_threads_on_first_request
+        start_worker_threads_on_first_request(app, app.config["EMAIL_OUTBOX_WORKER_THREADS"])
 
-if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    return app
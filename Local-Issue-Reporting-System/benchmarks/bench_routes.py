@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Per-route benchmark through the Flask test client.
+
+Each route is requested --warmup times (not measured) and then --iterations
+times, one after another. The report gives latency percentiles, throughput
+and the number of SQL statements per request.
+
+Usage:
+    python benchmarks/generate_data.py --db bench.db --rows 100k
+    python benchmarks/bench_routes.py --db bench.db --output results/baseline.json
+    python benchmarks/bench_routes.py --db bench.db --routes all_issues,api_issues --cold-analytics
+
+submit_issue really inserts issues, so run it against a scratch database.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import (ROUTES, load_app, install_query_counter, reset_query_count, query_count,  # noqa: E402
+                    ensure_admin, logged_in_client, summarize, environment, write_results, new_rng)
+
+
+def bench_route(client, name, iterations, warmup, rng):
+    request = ROUTES[name]
+    for _ in range(warmup):
+        request(client, rng)
+    latencies, queries, statuses = [], [], []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        reset_query_count()
+        begin = time.perf_counter()
+        response = request(client, rng)
+        response.get_data()
+        latencies.append(time.perf_counter() - begin)
+        queries.append(query_count())
+        statuses.append(response.status_code)
+    return summarize(latencies, time.perf_counter() - started, queries, statuses)
+
+
+def print_table(results):
+    print(f"{'route':<22}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'queries':>9}")
+    for name, result in results.items():
+        latency = result['latency_ms']
+        print(f"{name:<22}{latency['p50']:>10.2f}{latency['p95']:>10.2f}{latency['p99']:>10.2f}"
+              f"{result['throughput_rps']:>10.1f}{result['queries_per_request']['mean']:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='benchmark.db', help='SQLite database file')
+    parser.add_argument('--routes', default=','.join(ROUTES), help='comma-separated routes to run')
+    parser.add_argument('--iterations', default=200, type=int)
+    parser.add_argument('--warmup', default=10, type=int)
+    parser.add_argument('--seed', default=1, type=int)
+    parser.add_argument('--cold-analytics', action='store_true',
+                        help='disable the analytics cache so every request rebuilds the payload')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.routes.split(',') if name.strip()]
+    unknown = [name for name in names if name not in ROUTES]
+    if unknown:
+        parser.error(f"unknown routes: {', '.join(unknown)} (choose from {', '.join(ROUTES)})")
+
+    app = load_app(args.db, cold_analytics=args.cold_analytics)
+    install_query_counter(app)
+    client = logged_in_client(app, ensure_admin(app))
+    rng = new_rng(args.seed)
+
+    results = {}
+    for name in names:
+        print(f'Benchmarking {name}...', flush=True)
+        results[name] = bench_route(client, name, args.iterations, args.warmup, rng)
+    print_table(results)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        write_results(args.output, {
+            'benchmark': 'routes',
+            'environment': environment(app),
+            'settings': {'iterations': args.iterations, 'warmup': args.warmup,
+                         'cold_analytics': args.cold_analytics, 'seed': args.seed},
+            'routes': results,
+        })
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Worker startup benchmark.
+
+Each run starts a fresh interpreter, the way a gunicorn worker without
+--preload would, and times these phases:
+- import: importing the app module (just the extensions)
+- create_app: configuration, models, blueprints and CLI registration
+- first_request: the first GET of --path, including lazy imports and the
+  first database connection
+- create_all: what db.create_all() would add on top. The app used to run it
+  on every import; now it runs only in "flask upgrade-db".
+
+The report gives the median and p95 of each phase over --runs runs, plus peak
+RSS. --importtime also lists the slowest modules of one run (python -X importtime).
+
+Usage:
+    python benchmarks/generate_data.py --db bench.db --rows 10k
+    python benchmarks/bench_startup.py --db bench.db --runs 20 --output results/startup.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import APP_DIR, percentile, environment, load_app, write_results  # noqa: E402
+
+CHILD = '''
+import json, resource, sys, time
+started = time.perf_counter()
+import app as app_module
+imported = time.perf_counter()
+flask_app = app_module.create_app({'SQLALCHEMY_DATABASE_URI': sys.argv[1]})
+created = time.perf_counter()
+response = flask_app.test_client().get(sys.argv[2])
+response.close()
+served = time.perf_counter()
+with flask_app.app_context():
+    app_module.db.create_all(bind_key=None)
+schema = time.perf_counter()
+print(json.dumps({
+    'import': imported - started,
+    'create_app': created - imported,
+    'first_request': served - created,
+    'create_all': schema - served,
+    'status': response.status_code,
+    'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}))
+'''
+
+PHASES = ('import', 'create_app', 'first_request', 'create_all')
+
+
+def run_once(uri, path, importtime=False):
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', CHILD, uri, path]
+    env = dict(os.environ, LOG_LEVEL='WARNING')
+    result = subprocess.run(command, cwd=APP_DIR, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise SystemExit(f'Startup run failed:\n{result.stderr}')
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_imports(stderr, count=15):
+    """Top-level modules with the largest cumulative import time, in ms"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        # Nested imports are indented further; keep the ones the child itself triggered
+        if not name.startswith('  ') and cumulative.strip().isdigit():
+            modules.append((int(cumulative) / 1000, name.strip()))
+    return sorted(modules, reverse=True)[:count]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='benchmark.db', help='SQLite database file')
+    parser.add_argument('--runs', default=10, type=int)
+    parser.add_argument('--path', default='/all-issues', help='route requested as the first request')
+    parser.add_argument('--importtime', action='store_true', help='list the slowest imports of one run')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    # Make sure the schema exists, so the runs measure startup and not DDL
+    app = load_app(args.db)
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+
+    samples = []
+    for index in range(args.runs):
+        print(f'Run {index + 1}/{args.runs}...', end='\r', flush=True)
+        samples.append(run_once(uri, args.path)[0])
+    print()
+
+    results = {}
+    print(f"{'phase':<16}{'p50 ms':>10}{'p95 ms':>10}")
+    for phase in PHASES + ('total',):
+        if phase == 'total':
+            values = sorted(sum(sample[name] for name in PHASES[:3]) for sample in samples)
+        else:
+            values = sorted(sample[phase] for sample in samples)
+        results[phase] = {
+            'p50': round(percentile(values, 0.50) * 1000, 2),
+            'p95': round(percentile(values, 0.95) * 1000, 2),
+        }
+        print(f"{phase:<16}{results[phase]['p50']:>10.2f}{results[phase]['p95']:>10.2f}")
+    max_rss = max(sample['max_rss_mb'] for sample in samples)
+    print(f'total = import + create_app + first_request; peak RSS {max_rss:.1f} MB; '
+          f'first request status {samples[-1]["status"]}')
+
+    imports = None
+    if args.importtime:
+        _, stderr = run_once(uri, args.path, importtime=True)
+        imports = slowest_imports(stderr)
+        print('Slowest imports (cumulative ms):')
+        for milliseconds, name in imports:
+            print(f'  {milliseconds:>8.1f}  {name}')
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        write_results(args.output, {
+            'benchmark': 'startup',
+            'environment': environment(app),
+            'settings': {'runs': args.runs, 'path': args.path},
+            'phases_ms': results,
+            'max_rss_mb': round(max_rss, 1),
+            'slowest_imports_ms': imports,
+        })
+
+
+if __name__ == '__main__':
+    main()
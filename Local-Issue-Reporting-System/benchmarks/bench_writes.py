@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Submission burst benchmark.
+
+--threads workers post to /submit_issue as fast as they can until
+--submissions issues have been created, against a fresh SQLite file for each
+engine profile:
+- default: rollback journal with synchronous=FULL, one commit per submission
+- tuned: the db_profile defaults (WAL, synchronous=NORMAL, busy timeout, mmap)
+- group: tuned plus GROUP_COMMIT_ENABLED, so concurrent submissions share a commit
+
+The report gives throughput, latency percentiles, database commits per
+submission and failed submissions for each profile and thread count. Put
+--dir on the disk the real database lives on, since the gain depends on how
+expensive a flush is there.
+
+Usage:
+    python benchmarks/bench_writes.py --threads 1,8,32 --submissions 2000 --output results/writes.json
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import ROUTES, load_app, percentile, new_rng, write_results  # noqa: E402
+
+PROFILES = {
+    'default': {'SQLITE_JOURNAL_MODE': 'delete', 'SQLITE_SYNCHRONOUS': 'full'},
+    'tuned': {},
+    'group': {'GROUP_COMMIT_ENABLED': True},
+}
+
+
+def run_profile(directory, profile, threads, submissions, seed):
+    database = os.path.join(directory, f'{profile}-{threads}.db')
+    app = load_app(database, config=PROFILES[profile])
+
+    from sqlalchemy import event
+    from app import db
+    commits = []
+    with app.app_context():
+        event.listen(db.engine, 'commit', lambda conn: commits.append(1))
+
+    remaining = [submissions]
+    latencies, failures = [], []
+    lock = threading.Lock()
+
+    def worker(index):
+        client = app.test_client()
+        rng = new_rng(seed + index)
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            begin = time.perf_counter()
+            response = ROUTES['submit_issue'](client, rng)
+            elapsed = time.perf_counter() - begin
+            with client.session_transaction() as session:
+                ok = response.status_code == 302 and \
+                    all(category == 'success' for category, _ in session.pop('_flashes', []))
+            with lock:
+                latencies.append(elapsed)
+                if not ok:
+                    failures.append(response.status_code)
+
+    workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'profile': profile,
+        'threads': threads,
+        'submissions': len(latencies),
+        'failed': len(failures),
+        'throughput_per_s': round(len(latencies) / elapsed, 1),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 0.50) * 1000, 2),
+            'p95': round(percentile(latencies, 0.95) * 1000, 2),
+            'p99': round(percentile(latencies, 0.99) * 1000, 2),
+        },
+        'commits_per_submission': round(len(commits) / len(latencies), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', default='1,8,32', help='comma-separated thread counts')
+    parser.add_argument('--submissions', default=1000, type=int, help='submissions per run')
+    parser.add_argument('--profiles', default=','.join(PROFILES), help='comma-separated profiles to run')
+    parser.add_argument('--dir', help='directory for the scratch databases (default: a temporary one)')
+    parser.add_argument('--seed', default=1, type=int)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    directory = args.dir or tempfile.mkdtemp(prefix='bench-writes-')
+    os.makedirs(directory, exist_ok=True)
+    thread_counts = [int(value) for value in args.threads.split(',')]
+    profiles = [name.strip() for name in args.profiles.split(',')]
+    for name in profiles:
+        if name not in PROFILES:
+            parser.error(f'unknown profile {name!r}')
+
+    results = []
+    print(f"{'profile':<10}{'threads':>8}{'subm/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'commits':>9}{'failed':>8}")
+    try:
+        for threads in thread_counts:
+            for profile in profiles:
+                result = run_profile(directory, profile, threads, args.submissions, args.seed)
+                results.append(result)
+                print(f"{profile:<10}{threads:>8}{result['throughput_per_s']:>10.1f}"
+                      f"{result['latency_ms']['p50']:>10.2f}{result['latency_ms']['p95']:>10.2f}"
+                      f"{result['commits_per_submission']:>9.3f}{result['failed']:>8}")
+    finally:
+        if not args.dir:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        write_results(args.output, {
+            'benchmark': 'writes',
+            'settings': {'submissions': args.submissions, 'threads': thread_counts},
+            'results': results,
+        })
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+"""
+Shared setup for the benchmark scripts.
+
+load_app() creates the application against a file-backed SQLite database
+and brings its schema up to date. The route table lists the requests the benchmarks issue.
+Query counts come from a cursor-execute listener on the engine and are kept
+per thread, so the concurrent load driver can attribute them to requests.
+"""
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+from datetime import datetime
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+_query_counts = threading.local()
+
+
+def load_app(database_path, cold_analytics=False, config=None):
+    """Create the app against ``database_path``, creating or upgrading its schema
+
+    ``config`` overrides settings for this run.
+    """
+    config = dict(config or {}, **{
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.abspath(database_path),
+        'WTF_CSRF_ENABLED': False,
+    })
+    if cold_analytics:
+        # Rebuild the analytics payload on every request instead of serving the cache
+        config['ANALYTICS_CACHE_TTL'] = 0
+    os.chdir(APP_DIR)
+    from app import create_app
+    from migrations import upgrade_database
+    app = create_app(config)
+    logging.getLogger().setLevel(logging.WARNING)
+    app.logger.setLevel(logging.WARNING)
+    with app.app_context():
+        upgrade_database()
+    return app
+
+
+def install_query_counter(app):
+    """Count SQL statements executed by the current thread"""
+    from sqlalchemy import event
+
+    def count_query(conn, cursor, statement, parameters, context, executemany):
+        _query_counts.value = getattr(_query_counts, 'value', 0) + 1
+
+    from app import db
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', count_query)
+
+
+def reset_query_count():
+    _query_counts.value = 0
+
+
+def query_count():
+    return getattr(_query_counts, 'value', 0)
+
+
+def ensure_admin(app, username='bench'):
+    """Return the id of the benchmark admin, creating it if needed"""
+    from app import db
+    from models import Admin
+    with app.app_context():
+        admin = Admin.query.filter_by(username=username).first()
+        if admin is None:
+            admin = Admin(username=username, email=f'{username}@civic.local')
+            admin.set_password(os.urandom(16).hex())
+            db.session.add(admin)
+            db.session.commit()
+        return admin.id
+
+
+def logged_in_client(app, admin_id):
+    """A test client with an admin session, so login_required routes are reachable"""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin_id)
+        session['_fresh'] = True
+    return client
+
+
+def _submission(rng):
+    from generate_data import CATEGORY_WEIGHTS, random_coordinates, random_description
+    category = rng.choices(list(CATEGORY_WEIGHTS), weights=list(CATEGORY_WEIGHTS.values()))[0]
+    latitude, longitude = random_coordinates(rng)
+    return {
+        'name': 'Benchmark Reporter',
+        'email': 'reporter@example.com',
+        'category': category,
+        'description': random_description(rng, category),
+        'location': f'{rng.randint(1, 999)} Benchmark Street',
+        'latitude': f'{latitude:.6f}',
+        'longitude': f'{longitude:.6f}',
+    }
+
+
+# name -> function(client, rng) issuing one request
+ROUTES = {
+    'index': lambda client, rng: client.get('/'),
+    'submit_issue': lambda client, rng: client.post('/submit_issue', data=_submission(rng)),
+    'all_issues': lambda client, rng: client.get('/all-issues', query_string={'page': rng.randint(1, 5)}),
+    'admin_panel': lambda client, rng: client.get('/admin'),
+    'analytics_dashboard': lambda client, rng: client.get('/analytics'),
+    'api_issues': lambda client, rng: client.get('/api/issues', query_string={'limit': 100}),
+    'api_analytics': lambda client, rng: client.get('/api/analytics'),
+}
+
+
+def percentile(sorted_values, fraction):
+    """Interpolated percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    position = fraction * (len(sorted_values) - 1)
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(latencies, elapsed, queries, statuses):
+    """Latency percentiles (ms), throughput and query counts for one route"""
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        'requests': count,
+        'throughput_rps': round(count / elapsed, 2) if elapsed else None,
+        'latency_ms': {
+            'mean': round(sum(latencies) / count * 1000, 3) if count else None,
+            'p50': round(percentile(latencies, 0.50) * 1000, 3) if count else None,
+            'p90': round(percentile(latencies, 0.90) * 1000, 3) if count else None,
+            'p95': round(percentile(latencies, 0.95) * 1000, 3) if count else None,
+            'p99': round(percentile(latencies, 0.99) * 1000, 3) if count else None,
+            'max': round(latencies[-1] * 1000, 3) if count else None,
+        },
+        'queries_per_request': {
+            'mean': round(sum(queries) / len(queries), 2) if queries else None,
+            'max': max(queries) if queries else None,
+        },
+        'status_codes': {str(code): statuses.count(code) for code in sorted(set(statuses))},
+    }
+
+
+def environment(app):
+    """Describe the run so result files can be compared later"""
+    from app import db
+    from models import Issue
+    with app.app_context():
+        issue_count = db.session.query(Issue.id).count()
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIR,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'timestamp': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'database': app.config['SQLALCHEMY_DATABASE_URI'],
+        'issue_rows': issue_count,
+    }
+
+
+def write_results(path, results):
+    with open(path, 'w') as output:
+        json.dump(results, output, indent=2)
+    print(f'Results written to {path}')
+
+
+def new_rng(seed):
+    return random.Random(seed)
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Fill the issue table with synthetic but realistically shaped data.
+
+- categories: the IssueForm choices, weighted toward potholes and roads
+- coordinates: clustered around hotspots in one city (10% have none)
+- created_at: spread over --days, with volume growing over time and
+  most reports during the day
+- status lifecycle by age: submitted, then triaged (in_progress), then mostly
+  resolved after a long-tailed delay; a few are rejected
+
+Usage:
+    python benchmarks/generate_data.py --db bench.db --rows 100k
+    python benchmarks/generate_data.py --db bench.db --rows 10M --batch 20000
+
+Rows are inserted in batches with SQLAlchemy Core. The daily rollups and
+dashboard counters are rebuilt at the end.
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import load_app, new_rng  # noqa: E402
+
+# Relative report frequency per category; categories missing here get 0.05
+_CATEGORY_FREQUENCY = {
+    'potholes': 0.22,
+    'roads': 0.16,
+    'cleanliness': 0.12,
+    'waste_management': 0.12,
+    'street_lights': 0.10,
+    'drainage': 0.10,
+    'water_supply': 0.08,
+    'traffic': 0.06,
+    'other': 0.04,
+}
+
+PRIORITY_WEIGHTS = {'low': 0.25, 'medium': 0.45, 'high': 0.22, 'urgent': 0.08}
+
+CITY_CENTER = (40.7128, -74.0060)
+HOTSPOT_COUNT = 40
+
+_STREETS = ['Main Street', 'Park Avenue', 'Oak Road', 'Station Road', 'Market Lane',
+            'River Drive', 'Church Street', 'Hill Road', 'Lake View', 'Mill Lane']
+_NAMES = ['Asha', 'Ben', 'Chen', 'Divya', 'Elena', 'Farid', 'Grace', 'Hiro', 'Ines', 'Jamal']
+_DETAILS = {
+    'potholes': ['Deep pothole in the left lane', 'Several potholes after the rain', 'Pothole damaging car tyres'],
+    'roads': ['Road surface is cracked and uneven', 'Broken divider on the road', 'Road caved in near the junction'],
+    'cleanliness': ['Garbage dumped on the footpath', 'Public toilet not cleaned for days', 'Litter all over the park'],
+    'waste_management': ['Waste bins overflowing', 'Garbage not collected this week', 'Construction debris left on road'],
+    'street_lights': ['Street light not working at night', 'Flickering street lamp', 'Entire stretch of lights is off'],
+    'drainage': ['Drain blocked and overflowing', 'Open drain without cover', 'Water logging after light rain'],
+    'water_supply': ['No water supply since morning', 'Pipeline leaking on the street', 'Dirty water from the taps'],
+    'traffic': ['Traffic signal not working', 'Illegal parking blocking the road', 'Missing speed breaker near school'],
+    'other': ['Stray animals on the road', 'Fallen tree blocking the path', 'Noise from construction at night'],
+}
+
+
+def _category_weights():
+    from forms import IssueForm
+    choices = IssueForm.category.kwargs['choices']
+    return {value: _CATEGORY_FREQUENCY.get(value, 0.05) for value, _ in choices}
+
+
+CATEGORY_WEIGHTS = _category_weights()
+
+
+def _hotspots(rng):
+    """Hotspot centres within ~15km of the city centre, with a spread and popularity each"""
+    spots = []
+    for rank in range(1, HOTSPOT_COUNT + 1):
+        distance = abs(rng.gauss(0, 6000))
+        bearing = rng.uniform(0, 2 * math.pi)
+        spots.append((
+            _offset(CITY_CENTER, distance * math.cos(bearing), distance * math.sin(bearing)),
+            rng.uniform(200, 1500),
+            1.0 / rank  # Zipf-like popularity
+        ))
+    return spots
+
+
+def _offset(origin, north_meters, east_meters):
+    latitude = origin[0] + north_meters / 111320
+    longitude = origin[1] + east_meters / (111320 * math.cos(math.radians(origin[0])))
+    return latitude, longitude
+
+
+# Fixed seed: every run (and the benchmark's submissions) shares one city map
+HOTSPOTS = _hotspots(random.Random(7))
+_HOTSPOT_WEIGHTS = [spot[2] for spot in HOTSPOTS]
+
+
+def random_coordinates(rng):
+    """A point near a hotspot (70%) or anywhere in the city (30%)"""
+    if rng.random() < 0.7:
+        (center, spread, _), = rng.choices(HOTSPOTS, weights=_HOTSPOT_WEIGHTS)
+        return _offset(center, rng.gauss(0, spread), rng.gauss(0, spread))
+    return _offset(CITY_CENTER, rng.gauss(0, 8000), rng.gauss(0, 8000))
+
+
+def random_description(rng, category):
+    detail = rng.choice(_DETAILS.get(category, _DETAILS['other']))
+    return f"{detail} near {rng.choice(_STREETS)}. Reported {rng.randint(1, 5)} times by neighbours."
+
+
+def _created_at(rng, now, days):
+    # sqrt makes recent days denser: report volume grows over time
+    day = days * math.sqrt(rng.random())
+    created = now - timedelta(days=days - day)
+    # Most reports arrive between 07:00 and 22:00
+    hour = min(23, max(0, int(rng.gauss(14, 4))))
+    created = created.replace(hour=hour, minute=rng.randint(0, 59), second=rng.randint(0, 59), microsecond=0)
+    return min(created, now)
+
+
+def _lifecycle(rng, created, now):
+    """Return (status, updated_at, resolved_at) for an issue created at ``created``"""
+    triage = created + timedelta(hours=rng.lognormvariate(math.log(36), 0.8))
+    if triage > now:
+        return 'submitted', created, None
+    if rng.random() < 0.05:
+        return 'rejected', triage, None
+    resolved = triage + timedelta(days=rng.lognormvariate(math.log(6), 1.0))
+    if resolved > now or rng.random() < 0.08:
+        return 'in_progress', triage, None
+    return 'resolved', resolved, resolved
+
+
+def issue_rows(rng, count, now, days):
+    """Yield ``count`` issue rows as dicts for a Core insert"""
+    import geo
+    categories = list(CATEGORY_WEIGHTS)
+    category_weights = list(CATEGORY_WEIGHTS.values())
+    priorities = list(PRIORITY_WEIGHTS)
+    priority_weights = list(PRIORITY_WEIGHTS.values())
+    for _ in range(count):
+        category = rng.choices(categories, weights=category_weights)[0]
+        created = _created_at(rng, now, days)
+        status, updated, resolved = _lifecycle(rng, created, now)
+        latitude = longitude = geohash = None
+        if rng.random() < 0.9:
+            latitude, longitude = random_coordinates(rng)
+            geohash = geo.encode(latitude, longitude)
+        notified = created < now - timedelta(minutes=10)
+        name = rng.choice(_NAMES)
+        yield {
+            'name': name,
+            'email': f'{name.lower()}{rng.randint(1, 9999)}@example.com',
+            'category': category,
+            'description': random_description(rng, category),
+            'location': f'{rng.randint(1, 999)} {rng.choice(_STREETS)}',
+            'latitude': latitude,
+            'longitude': longitude,
+            'geohash': geohash,
+            'photo_filename': None,
+            'status': status,
+            'priority': rng.choices(priorities, weights=priority_weights)[0],
+            'created_at': created,
+            'updated_at': updated,
+            'resolved_at': resolved,
+            'admin_notes': None,
+            'assigned_to': None,
+            'authority_notified': notified,
+            'notification_sent_at': created + timedelta(minutes=rng.randint(1, 10)) if notified else None,
+            'parent_id': None,
+            'report_count': 1,
+        }
+
+
+def parse_count(value):
+    """Parse 100000, 100k or 10M"""
+    multipliers = {'k': 1_000, 'm': 1_000_000}
+    value = value.strip().lower()
+    if value[-1:] in multipliers:
+        return int(float(value[:-1]) * multipliers[value[-1]])
+    return int(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='benchmark.db', help='SQLite database file (created if missing)')
+    parser.add_argument('--rows', default='100k', type=parse_count, help='issues to add, e.g. 100k or 10M')
+    parser.add_argument('--days', default=730, type=int, help='history length in days')
+    parser.add_argument('--batch', default=10000, type=int, help='rows per insert batch')
+    parser.add_argument('--seed', default=42, type=int, help='random seed for reproducible data')
+    args = parser.parse_args()
+
+    app = load_app(args.db)
+    from app import db
+    from models import Issue
+    from rollups import rebuild_rollups
+    from stats_service import rebuild_counters
+
+    rng = new_rng(args.seed)
+    now = datetime.utcnow()
+    table = Issue.__table__
+    with app.app_context():
+        started = time.perf_counter()
+        written = 0
+        rows = issue_rows(rng, args.rows, now, args.days)
+        while written < args.rows:
+            batch = [row for _, row in zip(range(args.batch), rows)]
+            with db.engine.begin() as conn:
+                conn.exec_driver_sql('PRAGMA synchronous = OFF')
+                conn.execute(table.insert(), batch)
+            written += len(batch)
+            rate = written / (time.perf_counter() - started)
+            print(f'\r{written:,}/{args.rows:,} issues ({rate:,.0f} rows/s)', end='', flush=True)
+        print()
+        print('Rebuilding daily rollups and counters...')
+        rebuild_rollups()
+        rebuild_counters()
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql('ANALYZE')
+        total = db.session.query(Issue.id).count()
+    print(f'✓ Added {written:,} issues in {time.perf_counter() - started:.1f}s ({total:,} in {args.db})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Concurrent load driver.
+
+--threads workers each hold their own logged-in test client. For --duration
+seconds they issue requests drawn from a weighted route mix. The report gives
+per-route and overall latency percentiles, throughput, SQL statements per
+request and errors. Everything runs in one process, so it measures the app
+and database under contention (SQLite locking, pool size), not the network
+or a WSGI server.
+
+Usage:
+    python benchmarks/load_test.py --db bench.db --threads 8 --duration 30 \\
+        --mix all_issues=5,api_issues=3,index=2,submit_issue=1 --output results/load.json
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common import (ROUTES, load_app, install_query_counter, reset_query_count, query_count,  # noqa: E402
+                    ensure_admin, logged_in_client, summarize, environment, write_results, new_rng)
+
+DEFAULT_MIX = 'index=2,all_issues=5,admin_panel=2,analytics_dashboard=1,api_issues=3,api_analytics=1,submit_issue=1'
+
+
+def parse_mix(value):
+    """Parse 'route=weight,...' into {route: weight}"""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ROUTES:
+            raise argparse.ArgumentTypeError(f'unknown route {name!r}')
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def worker(app, admin_id, mix, deadline, seed, samples, errors, lock):
+    client = logged_in_client(app, admin_id)
+    rng = new_rng(seed)
+    names, weights = list(mix), list(mix.values())
+    local = defaultdict(lambda: ([], [], []))
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights=weights)[0]
+        reset_query_count()
+        begin = time.perf_counter()
+        try:
+            response = ROUTES[name](client, rng)
+            response.get_data()
+            status = response.status_code
+        except Exception as e:
+            status = 'error'
+            with lock:
+                errors.append(f'{name}: {type(e).__name__}: {e}')
+        latencies, queries, statuses = local[name]
+        latencies.append(time.perf_counter() - begin)
+        queries.append(query_count())
+        statuses.append(status)
+    with lock:
+        for name, (latencies, queries, statuses) in local.items():
+            samples[name][0].extend(latencies)
+            samples[name][1].extend(queries)
+            samples[name][2].extend(statuses)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='benchmark.db', help='SQLite database file')
+    parser.add_argument('--threads', default=8, type=int)
+    parser.add_argument('--duration', default=30, type=float, help='seconds to run')
+    parser.add_argument('--mix', default=DEFAULT_MIX, type=parse_mix, help='weighted route mix')
+    parser.add_argument('--seed', default=1, type=int)
+    parser.add_argument('--cold-analytics', action='store_true',
+                        help='disable the analytics cache so every request rebuilds the payload')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    app = load_app(args.db, cold_analytics=args.cold_analytics)
+    install_query_counter(app)
+    admin_id = ensure_admin(app)
+
+    samples = defaultdict(lambda: ([], [], []))
+    errors = []
+    lock = threading.Lock()
+    started = time.perf_counter()
+    deadline = started + args.duration
+    threads = [
+        threading.Thread(target=worker, args=(app, admin_id, args.mix, deadline, args.seed + index,
+                                              samples, errors, lock))
+        for index in range(args.threads)
+    ]
+    print(f'Running {args.threads} threads for {args.duration:.0f}s...', flush=True)
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    routes = {name: summarize(latencies, elapsed, queries, statuses)
+              for name, (latencies, queries, statuses) in sorted(samples.items())}
+    overall = summarize(
+        [latency for latencies, _, _ in samples.values() for latency in latencies], elapsed,
+        [count for _, queries, _ in samples.values() for count in queries],
+        [status for _, _, statuses in samples.values() for status in statuses]
+    )
+
+    print(f"{'route':<22}{'requests':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}")
+    for name, result in list(routes.items()) + [('TOTAL', overall)]:
+        latency = result['latency_ms']
+        print(f"{name:<22}{result['requests']:>10}{latency['p50']:>10.2f}{latency['p95']:>10.2f}"
+              f"{latency['p99']:>10.2f}{result['throughput_rps']:>10.1f}")
+    if errors:
+        print(f'{len(errors)} requests raised; first: {errors[0]}')
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        write_results(args.output, {
+            'benchmark': 'load',
+            'environment': environment(app),
+            'settings': {'threads': args.threads, 'duration': args.duration, 'mix': args.mix,
+                         'cold_analytics': args.cold_analytics, 'seed': args.seed},
+            'overall': overall,
+            'routes': routes,
+            'errors': errors[:50],
+        })
+
+
+if __name__ == '__main__':
+    main()
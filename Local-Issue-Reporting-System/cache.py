@@ -0,0 +1,100 @@
+"""
+Small cache backends with a shared interface.
+
+LocalCache is an in-process, thread-safe LRU with per-entry TTL. RedisCache
+keeps entries in Redis so every gunicorn worker sees the same values. Both
+implement get / set / delete / incr; values stored in RedisCache must be
+JSON-serializable.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class LocalCache:
+    """In-process LRU cache with a TTL and a maximum number of entries"""
+
+    def __init__(self, max_entries=128, default_ttl=60):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value, or None if missing or expired"""
+        with self._lock:
+            if key in self._counters:
+                return self._counters[key]
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        """Store a value, evicting the least recently used entry when full"""
+        ttl = self.default_ttl if ttl is None else ttl
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        """Remove a key if present"""
+        with self._lock:
+            self._entries.pop(key, None)
+            self._counters.pop(key, None)
+
+    def incr(self, key):
+        """Atomically increment an integer counter; counters are never evicted"""
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+            self._counters.clear()
+
+
+class RedisCache:
+    """Redis-backed cache shared across processes (requires the redis package)"""
+
+    def __init__(self, url, default_ttl=60, prefix='civic:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.default_ttl = default_ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        self.client.set(self.prefix + key, json.dumps(value), ex=max(1, int(ttl)))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def incr(self, key):
+        return int(self.client.incr(self.prefix + key))
+
+    def clear(self):
+        for key in self.client.scan_iter(match=self.prefix + '*'):
+            self.client.delete(key)
+
+
+def create_cache(url=None, max_entries=128, default_ttl=60):
+    """Return a RedisCache for a redis:// URL, otherwise a LocalCache"""
+    if url and url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisCache(url, default_ttl=default_ttl)
+    return LocalCache(max_entries=max_entries, default_ttl=default_ttl)
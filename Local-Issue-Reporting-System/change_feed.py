@@ -0,0 +1,240 @@
+"""
+Incremental change feed for the live admin dashboards.
+
+Issues changed since a cursor are read in (updated_at, id) order, using the
+ix_issue_updated_at_id index. A write only appears in the feed once it is
+CHANGE_FEED_SETTLE_SECONDS old. A transaction that stamped updated_at
+earlier but committed later therefore can't slip in behind a cursor that
+has already moved past it.
+
+updated_at is stamped in Python when the session flushes, not when it
+commits, so the settle window has to cover the longest a write can sit
+between the two. Left unset, it is derived from the timeouts that bound
+that gap: the lock wait (SQLITE_BUSY_TIMEOUT_MS, or PG_STATEMENT_TIMEOUT_MS
+on PostgreSQL), plus GROUP_COMMIT_TIMEOUT when group commit is on, plus a
+second of slack. A shorter window makes the dashboards livelier but can
+drop a slow commit from the stream; it still shows up on the next reload.
+
+/api/issues/changes serves the feed page by page. /api/issues/stream pushes
+it as Server-Sent Events. For the stream, one ChangeBroadcaster thread per
+process polls the feed every CHANGE_FEED_POLL_INTERVAL seconds while anyone
+is subscribed. It serializes each batch of changes, together with the
+current dashboard counts, once and hands the same event to every subscriber
+queue. A subscriber that falls CHANGE_STREAM_QUEUE_SIZE events behind is
+disconnected. Its browser reconnects with Last-Event-ID and catches up from
+that cursor.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy.engine import make_url
+
+from app import db
+from models import Issue
+from pagination import decode_cursor, encode_cursor, keyset_condition
+from stats_service import get_issue_counts
+
+# Columns the dashboards patch into their rows
+_CHANGE_COLUMNS = (Issue.id, Issue.category, Issue.status, Issue.priority, Issue.name,
+                   Issue.location, Issue.created_at, Issue.updated_at, Issue.report_count)
+
+# Tells a stream that its subscriber was dropped for falling behind
+_DROPPED = object()
+
+
+def default_settle_seconds(config):
+    """Settle window covering the longest gap between stamping updated_at and committing"""
+    if make_url(config['SQLALCHEMY_DATABASE_URI']).get_backend_name() == 'postgresql':
+        lock_wait = config['PG_STATEMENT_TIMEOUT_MS'] / 1000
+    else:
+        lock_wait = config['SQLITE_BUSY_TIMEOUT_MS'] / 1000
+    if config['GROUP_COMMIT_ENABLED']:
+        lock_wait += config['GROUP_COMMIT_TIMEOUT']
+    return lock_wait + 1
+
+
+def _settled(settle_seconds):
+    """Only changes old enough that no earlier-stamped write can still commit"""
+    return Issue.updated_at <= datetime.utcnow() - timedelta(seconds=settle_seconds)
+
+
+def fetch_changes(cursor, limit, settle_seconds):
+    """Issues changed after ``cursor`` (None means from the start), oldest first
+
+    Returns (rows, next_cursor); next_cursor is ``cursor`` when nothing changed.
+    Raises ValueError for a malformed cursor.
+    """
+    query = db.session.query(*_CHANGE_COLUMNS).filter(_settled(settle_seconds))
+    if cursor:
+        query = query.filter(keyset_condition((Issue.updated_at, Issue.id), decode_cursor(cursor)))
+    rows = query.order_by(Issue.updated_at.asc(), Issue.id.asc()).limit(limit).all()
+    if rows:
+        cursor = encode_cursor(rows[-1].updated_at, rows[-1].id)
+    return rows, cursor
+
+
+def latest_cursor(settle_seconds):
+    """Cursor of the most recent settled change, for clients that only want what comes next
+
+    Changes still inside the settle window lie after this cursor, so
+    fetch_changes() delivers them once they settle.
+    """
+    row = db.session.query(Issue.updated_at, Issue.id).filter(_settled(settle_seconds)).order_by(
+        Issue.updated_at.desc(), Issue.id.desc()).first()
+    return encode_cursor(row.updated_at, row.id) if row else None
+
+
+def change_dict(row):
+    """JSON form of a changed issue, matching the admin list rows"""
+    return {
+        'id': row.id,
+        'category': row.category,
+        'status': row.status,
+        'priority': row.priority,
+        'name': row.name,
+        'location': row.location,
+        'created_at': row.created_at.strftime('%Y-%m-%d'),
+        'updated_at': row.updated_at.strftime('%Y-%m-%d %H:%M:%S'),
+        'report_count': row.report_count,
+    }
+
+
+def format_event(cursor, payload, event='changes'):
+    """One Server-Sent Events message; the cursor becomes the event id"""
+    return f'id: {cursor}\nevent: {event}\ndata: {payload}\n\n'
+
+
+class ChangeBroadcaster:
+    """Polls the change feed once per process and fans it out to subscribers"""
+
+    def __init__(self, flask_app):
+        self.app = flask_app
+        config = flask_app.config
+        self.interval = config['CHANGE_FEED_POLL_INTERVAL']
+        self.settle = config['CHANGE_FEED_SETTLE_SECONDS']
+        self.batch_size = config['CHANGE_FEED_BATCH_SIZE']
+        self.queue_size = config['CHANGE_STREAM_QUEUE_SIZE']
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        with flask_app.app_context():
+            self.cursor = latest_cursor(self.settle)
+        self.thread = threading.Thread(target=self._run, name='change-broadcaster', daemon=True)
+        self.thread.start()
+
+    def subscribe(self):
+        subscriber = queue.Queue(self.queue_size)
+        with self.lock:
+            self.subscribers.add(subscriber)
+        self.wakeup.set()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def _run(self):
+        while True:
+            if not self.subscribers:
+                # Nobody is listening: don't poll, and skip what changed meanwhile
+                # (new subscribers catch up from their own cursor)
+                self.wakeup.wait()
+                self.wakeup.clear()
+                with self.app.app_context():
+                    self.cursor = latest_cursor(self.settle)
+            try:
+                with self.app.app_context():
+                    self._poll()
+            except Exception as e:
+                logging.error(f'Change feed poll failed: {str(e)}')
+            time.sleep(self.interval)
+
+    def _poll(self):
+        while True:
+            rows, cursor = fetch_changes(self.cursor, self.batch_size, self.settle)
+            if not rows:
+                return
+            payload = self.app.json.dumps({
+                'changes': [change_dict(row) for row in rows],
+                'counts': get_issue_counts(),
+                'cursor': cursor,
+            })
+            self.cursor = cursor
+            self._publish(format_event(cursor, payload))
+            if len(rows) < self.batch_size:
+                return
+
+    def _publish(self, message):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                self.unsubscribe(subscriber)
+                # Make room for the marker so the stream ends promptly
+                try:
+                    subscriber.get_nowait()
+                except queue.Empty:
+                    pass
+                subscriber.put_nowait(_DROPPED)
+
+
+_broadcasters = {}
+_broadcasters_lock = threading.Lock()
+
+
+def get_broadcaster(flask_app):
+    """The broadcaster for ``flask_app`` in this process, started on first use"""
+    key = (id(flask_app), os.getpid())
+    broadcaster = _broadcasters.get(key)
+    if broadcaster is None:
+        with _broadcasters_lock:
+            broadcaster = _broadcasters.get(key)
+            if broadcaster is None:
+                broadcaster = _broadcasters[key] = ChangeBroadcaster(flask_app)
+    return broadcaster
+
+
+def stream_changes(flask_app, cursor):
+    """Generate the SSE stream: what changed after ``cursor``, then live changes
+
+    Subscribes before reading the backlog, so nothing published in between is
+    missed; a change may arrive twice, which the dashboards tolerate. Ends
+    after CHANGE_STREAM_MAX_SECONDS so long-lived connections are recycled;
+    EventSource reconnects on its own.
+    """
+    config = flask_app.config
+    broadcaster = get_broadcaster(flask_app)
+    subscriber = broadcaster.subscribe()
+    deadline = time.monotonic() + config['CHANGE_STREAM_MAX_SECONDS']
+    heartbeat = config['CHANGE_STREAM_HEARTBEAT']
+    try:
+        yield f'retry: {int(config["CHANGE_FEED_POLL_INTERVAL"] * 1000)}\n\n'
+        while cursor:
+            rows, next_cursor = fetch_changes(cursor, broadcaster.batch_size, broadcaster.settle)
+            if not rows:
+                break
+            cursor = next_cursor
+            yield format_event(cursor, flask_app.json.dumps({
+                'changes': [change_dict(row) for row in rows],
+                'counts': get_issue_counts(),
+                'cursor': cursor,
+            }))
+        db.session.remove()
+        while time.monotonic() < deadline:
+            try:
+                message = subscriber.get(timeout=heartbeat)
+            except queue.Empty:
+                # Comment line: keeps proxies from closing an idle connection
+                yield ': keepalive\n\n'
+                continue
+            if message is _DROPPED:
+                return
+            yield message
+    finally:
+        broadcaster.unsubscribe(subscriber)
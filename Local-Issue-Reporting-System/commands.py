@@ -0,0 +1,140 @@
+"""
+Flask CLI commands (run with ``flask <command>``, FLASK_APP=main.py)
+
+create_app() registers every command in COMMANDS. "flask upgrade-db" is
+also how a new database gets its schema; the app no longer creates tables
+on startup.
+"""
+import logging
+import sys
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from app import db
+
+
+@click.command('upgrade-db')
+@with_appcontext
+def upgrade_db_command():
+    """Create the schema, or add missing tables, indexes and columns to an existing one"""
+    from migrations import upgrade_database
+    upgrade_database()
+    click.echo('✓ Database schema is up to date')
+
+
+@click.command('check-query-plans')
+@with_appcontext
+def check_query_plans_command():
+    """EXPLAIN the hot list/analytics queries and fail if any skips its index"""
+    from query_plans import check_query_plans
+    failures = 0
+    for name, uses_index, plan in check_query_plans():
+        click.echo(f"{'✓' if uses_index else '✗'} {name}")
+        for line in plan:
+            click.echo(f"    {line}")
+        if not uses_index:
+            failures += 1
+    if failures:
+        click.echo(f"❌ {failures} queries do not use an index")
+        sys.exit(1)
+
+
+@click.command('rebuild-counters')
+@with_appcontext
+def rebuild_counters_command():
+    """Recompute the issue_counter table from the issue table"""
+    from stats_service import rebuild_counters
+    counts = rebuild_counters()
+    click.echo('✓ Counters rebuilt: ' + ', '.join(f'{name}={value}' for name, value in counts.items()))
+
+
+@click.command('rebuild-rollups')
+@with_appcontext
+def rebuild_rollups_command():
+    """Recompute the issue_daily_rollup table from the issue table"""
+    from rollups import rebuild_rollups
+    rows = rebuild_rollups()
+    click.echo(f'✓ Daily rollups rebuilt ({rows} rows)')
+
+
+@click.command('generate-photo-variants')
+@with_appcontext
+@click.option('--force', is_flag=True, help='Regenerate variants that already exist')
+def generate_photo_variants_command(force):
+    """Create the resized, metadata-free variants of every stored issue photo"""
+    from models import Issue
+    from uploads import generate_variants, load_pillow
+    if load_pillow() is None:
+        click.echo('❌ Pillow is required to generate photo variants')
+        sys.exit(1)
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    processed = failed = 0
+    query = db.session.query(Issue.photo_filename).filter(
+        Issue.photo_filename.isnot(None)).distinct().yield_per(500)
+    for (filename,) in query:
+        try:
+            generate_variants(filename, upload_folder, force=force)
+            processed += 1
+        except Exception as e:
+            logging.error(f"Failed to generate variants for {filename}: {str(e)}")
+            failed += 1
+        if (processed + failed) % 1000 == 0:
+            click.echo(f'... {processed + failed} photos')
+    click.echo(f'✓ Variants generated for {processed} photos ({failed} failed)')
+
+
+@click.command('migrate-photo-store')
+@with_appcontext
+def migrate_photo_store_command():
+    """Move flat uploads into the content-addressed photo store"""
+    from photo_store import migrate_flat_uploads
+    moved = migrate_flat_uploads(current_app.config['UPLOAD_FOLDER'])
+    click.echo(f'✓ Moved {moved} photos into the store')
+    click.echo('  Run "flask generate-photo-variants" to rebuild their variants')
+
+
+@click.command('gc-photos')
+@with_appcontext
+@click.option('--dry-run', is_flag=True, help='Only report what would be removed')
+@click.option('--grace-seconds', type=int, default=None,
+              help='Keep files younger than this (default PHOTO_GC_GRACE_SECONDS)')
+def gc_photos_command(dry_run, grace_seconds):
+    """Delete stored photos that no issue references"""
+    from photo_store import collect_garbage
+    if grace_seconds is None:
+        grace_seconds = current_app.config['PHOTO_GC_GRACE_SECONDS']
+    removed, freed = collect_garbage(current_app.config['UPLOAD_FOLDER'], grace_seconds, dry_run=dry_run)
+    verb = 'Would remove' if dry_run else 'Removed'
+    click.echo(f'✓ {verb} {removed} files ({freed / 1024 / 1024:.1f} MB)')
+
+
+@click.command('sync-replicas')
+@with_appcontext
+def sync_replicas_command():
+    """Copy the SQLite primary over the SQLite read replicas (for local testing)"""
+    from replicas import sync_sqlite_replicas
+    copied = sync_sqlite_replicas(current_app._get_current_object())
+    if not copied:
+        click.echo('No SQLite replicas configured (set DATABASE_REPLICA_URLS)')
+    for path in copied:
+        click.echo(f'✓ Copied the primary to {path}')
+
+
+COMMANDS = [
+    upgrade_db_command,
+    check_query_plans_command,
+    rebuild_counters_command,
+    rebuild_rollups_command,
+    generate_photo_variants_command,
+    migrate_photo_store_command,
+    gc_photos_command,
+    sync_replicas_command,
+]
+
+
+def init_app(flask_app):
+    """Register the CLI commands on ``flask_app``"""
+    for command in COMMANDS:
+        flask_app.cli.add_command(command)
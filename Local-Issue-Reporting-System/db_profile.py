@@ -0,0 +1,97 @@
+"""
+Backend-specific engine tuning.
+
+SQLite connections are switched to WAL journaling with synchronous=NORMAL.
+Readers no longer block the writer, and a commit appends to the WAL without
+waiting on a full fsync of the database file. A busy timeout makes
+concurrent writers queue for the lock instead of failing with "database is
+locked", and mmap serves reads from the page cache. On PostgreSQL the pool
+is sized for the worker's threads and every connection gets the configured
+synchronous_commit level. PG_SYNCHRONOUS_COMMIT=off is the counterpart of
+SQLite's NORMAL: a crash can lose the last few commits, but the database
+cannot be corrupted. PG_STATEMENT_TIMEOUT_MS only applies to transactions
+begun while serving a request; CLI commands and background workers run
+index builds, rollup rebuilds and bulk imports that may take longer.
+"""
+from flask import current_app, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+from replicas import RoutingSession
+
+SQLITE_JOURNAL_MODES = ('delete', 'truncate', 'persist', 'memory', 'wal', 'off')
+SQLITE_SYNCHRONOUS = ('off', 'normal', 'full', 'extra')
+PG_SYNCHRONOUS_COMMIT = ('on', 'off', 'local', 'remote_write', 'remote_apply')
+
+
+def _choice(config, key, allowed):
+    value = str(config[key]).lower()
+    if value not in allowed:
+        raise ValueError(f'{key} must be one of {", ".join(allowed)}, not {value!r}')
+    return value
+
+
+def apply_engine_options(config):
+    """Add the options for the configured backend to SQLALCHEMY_ENGINE_OPTIONS
+
+    Call before db.init_app(); explicitly configured options win.
+    """
+    backend = make_url(config['SQLALCHEMY_DATABASE_URI']).get_backend_name()
+    options = {}
+    if backend == 'sqlite':
+        # pysqlite's own busy handler; the PRAGMA in _set_sqlite_pragmas matches it
+        options['connect_args'] = {'timeout': config['SQLITE_BUSY_TIMEOUT_MS'] / 1000}
+    elif backend == 'postgresql':
+        synchronous_commit = _choice(config, 'PG_SYNCHRONOUS_COMMIT', PG_SYNCHRONOUS_COMMIT)
+        options.update({
+            'pool_size': config['DB_POOL_SIZE'],
+            'max_overflow': config['DB_MAX_OVERFLOW'],
+            # Reuse the most recent connection so surplus ones can time out
+            'pool_use_lifo': True,
+            'connect_args': {'options': f"-c synchronous_commit={synchronous_commit}"},
+        })
+    options.update(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+
+def _set_statement_timeout(session, transaction, connection):
+    if connection.dialect.name != 'postgresql' or not has_request_context():
+        return
+    timeout = int(current_app.config['PG_STATEMENT_TIMEOUT_MS'])
+    if timeout > 0:
+        # Ends with the transaction, so a pooled connection goes back without it
+        connection.exec_driver_sql(f'SET LOCAL statement_timeout = {timeout}')
+
+
+def init_app(app):
+    """Set the SQLite PRAGMAs on every new connection and the PostgreSQL
+    statement timeout on request transactions; call after db.init_app()
+
+    Covers the primary and any replica binds.
+    """
+    from app import db
+    with app.app_context():
+        dialects = {engine.dialect.name for engine in db.engines.values()}
+        engines = [engine for engine in db.engines.values() if engine.dialect.name == 'sqlite']
+    if 'postgresql' in dialects and not event.contains(RoutingSession, 'after_begin', _set_statement_timeout):
+        event.listen(RoutingSession, 'after_begin', _set_statement_timeout)
+    if not engines:
+        return
+    config = app.config
+    pragmas = (
+        ('journal_mode', _choice(config, 'SQLITE_JOURNAL_MODE', SQLITE_JOURNAL_MODES)),
+        ('synchronous', _choice(config, 'SQLITE_SYNCHRONOUS', SQLITE_SYNCHRONOUS)),
+        ('busy_timeout', int(config['SQLITE_BUSY_TIMEOUT_MS'])),
+        ('mmap_size', int(config['SQLITE_MMAP_SIZE'])),
+    )
+
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+
+    for engine in engines:
+        event.listen(engine, 'connect', _set_sqlite_pragmas)
@@ -0,0 +1,152 @@
+"""
+Digest mode for authority notifications.
+
+Authorities listed in AUTHORITY_DIGESTS get one summary email covering many
+new issues. They no longer get one email per issue. A submission adds a
+DigestEntry row per digest recipient, in the same transaction as the issue.
+The outbox worker calls flush_due_digests() on every pass. For each
+recipient whose oldest waiting entry is older than its interval, or who has
+reached its size threshold, it renders one digest and queues it as an
+ordinary outbox message. When that message is delivered, the issues it
+covers are marked authority_notified like single notifications are, so
+notification_rate still counts them.
+
+AUTHORITY_DIGESTS is a comma-separated list of ``address[:interval[:max]]``
+entries, with the interval in seconds. ``*`` stands for every authority
+address. Omitted values fall back to AUTHORITY_DIGEST_INTERVAL and
+AUTHORITY_DIGEST_MAX_ISSUES, for example
+``roads.dept@civic.gov:900:50,maintenance@city.gov``.
+"""
+import logging
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func, update
+
+from app import db
+from models import DigestEntry, EmailOutbox, Issue
+
+
+def digest_settings(config=None):
+    """{address: (interval seconds, max issues)} parsed from AUTHORITY_DIGESTS"""
+    config = config or current_app.config
+    settings = {}
+    for entry in (config.get('AUTHORITY_DIGESTS') or '').split(','):
+        parts = [part.strip() for part in entry.split(':')]
+        if not parts[0]:
+            continue
+        interval = float(parts[1]) if len(parts) > 1 and parts[1] else config['AUTHORITY_DIGEST_INTERVAL']
+        max_issues = int(parts[2]) if len(parts) > 2 and parts[2] else config['AUTHORITY_DIGEST_MAX_ISSUES']
+        settings[parts[0].lower()] = (interval, max_issues)
+    return settings
+
+
+def _settings_for(address, settings):
+    return settings.get(address.lower(), settings.get('*'))
+
+
+def split_recipients(recipients):
+    """Split ``recipients`` into (send now, collect for a digest)"""
+    settings = digest_settings()
+    if not settings:
+        return list(recipients), []
+    immediate, digest = [], []
+    for address in recipients:
+        (digest if _settings_for(address, settings) else immediate).append(address)
+    return immediate, digest
+
+
+def queue_digest_entries(issue_id, recipients):
+    """Hold a new issue for each recipient's next digest (the caller commits)"""
+    now = datetime.utcnow()
+    db.session.execute(DigestEntry.__table__.insert(), [
+        {'recipient': address, 'issue_id': issue_id, 'created_at': now} for address in recipients
+    ])
+
+
+def flush_due_digests(now=None):
+    """Queue a digest for every recipient that is due; returns how many were queued"""
+    settings = digest_settings()
+    now = now or datetime.utcnow()
+    waiting = db.session.query(
+        DigestEntry.recipient, func.count(DigestEntry.id), func.min(DigestEntry.created_at)
+    ).filter(DigestEntry.outbox_id.is_(None)).group_by(DigestEntry.recipient).all()
+    db.session.commit()
+
+    queued = 0
+    for recipient, count, oldest in waiting:
+        # Recipients taken out of digest mode still get what they were owed
+        interval, max_issues = _settings_for(recipient, settings) or (0, 1)
+        if count < max_issues and oldest > now - timedelta(seconds=interval):
+            continue
+        if _queue_digest(recipient):
+            queued += 1
+    return queued
+
+
+def _queue_digest(recipient):
+    """Render and queue one digest for ``recipient``; False if another worker took it"""
+    entries = db.session.query(
+        DigestEntry.id, Issue.id.label('issue_id'), Issue.category, Issue.priority,
+        Issue.location, Issue.description, Issue.created_at
+    ).join(Issue, Issue.id == DigestEntry.issue_id).filter(
+        DigestEntry.recipient == recipient, DigestEntry.outbox_id.is_(None)
+    ).order_by(DigestEntry.id).all()
+    if not entries:
+        db.session.rollback()
+        return False
+
+    subject, body = render_digest(entries)
+    message = EmailOutbox(kind='authority_digest', recipients=recipient, subject=subject, body=body,
+                          status='pending', attempts=0, next_attempt_at=datetime.utcnow())
+    db.session.add(message)
+    db.session.flush()
+    entry_ids = [entry.id for entry in entries]
+    result = db.session.execute(
+        update(DigestEntry)
+        .where(DigestEntry.id.in_(entry_ids), DigestEntry.outbox_id.is_(None))
+        .values(outbox_id=message.id)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != len(entry_ids):
+        # Another worker is sending some of these; leave them to it
+        db.session.rollback()
+        return False
+    db.session.commit()
+    logging.info(f"Queued digest of {len(entries)} issues for {recipient}")
+    return True
+
+
+def render_digest(entries):
+    """Subject and body of one digest covering ``entries``"""
+    from email_service import get_admin_panel_url
+    admin_url = get_admin_panel_url()
+    categories = sorted({entry.category.replace('_', ' ').title() for entry in entries})
+    subject = f"{len(entries)} New Civic Issues Reported - {', '.join(categories)}"
+    if len(subject) > 255:
+        subject = f"{len(entries)} New Civic Issues Reported"
+    lines = [f"{len(entries)} new civic issues have been reported and require attention:", ""]
+    for entry in entries:
+        description = entry.description if len(entry.description) <= 200 else entry.description[:197] + '...'
+        lines += [
+            f"#{entry.issue_id} {entry.category.replace('_', ' ').title()} ({entry.priority.title()} priority)"
+            f" - {entry.location}",
+            f"  Reported on {entry.created_at.strftime('%B %d, %Y at %I:%M %p')}",
+            f"  {description}",
+            f"  {admin_url}/issue/{entry.issue_id}",
+            "",
+        ]
+    lines.append("This is an automated digest from the Civic Issues Reporting System.")
+    return subject, '\n'.join(lines)
+
+
+def mark_digest_delivered(message):
+    """Mark the issues a delivered digest covered as notified; returns how many were"""
+    covered = db.session.query(DigestEntry.issue_id).filter(DigestEntry.outbox_id == message.id)
+    result = db.session.execute(
+        update(Issue)
+        .where(Issue.id.in_(covered.scalar_subquery()), Issue.authority_notified.is_(False))
+        .values(authority_notified=True, notification_sent_at=message.sent_at)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
@@ -0,0 +1,86 @@
+"""
+Near-duplicate detection for new reports.
+
+An incoming report matches an existing issue when that issue:
+- has the same category and is still open
+- is not itself a duplicate
+- was created within DUPLICATE_WINDOW_HOURS
+- lies within DUPLICATE_RADIUS_METERS
+- has a description similar enough to the new one
+
+Candidates are found through the (category, geohash) index. The query
+covers the report's geohash cell and the eight cells around it, at a
+precision where one cell is at least the search radius. Only that small
+candidate set is checked for exact distance and text similarity.
+"""
+import re
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, or_, update
+
+import geo
+from app import db
+
+OPEN_STATUSES = ('submitted', 'in_progress')
+
+_WORD = re.compile(r'[a-z0-9]+')
+
+
+def _tokens(text):
+    return {word for word in _WORD.findall((text or '').lower()) if len(word) > 2}
+
+
+def text_similarity(first, second):
+    """Jaccard similarity of the word sets of two descriptions (0.0 - 1.0)"""
+    first_tokens, second_tokens = _tokens(first), _tokens(second)
+    if not first_tokens or not second_tokens:
+        return 0.0
+    return len(first_tokens & second_tokens) / len(first_tokens | second_tokens)
+
+
+def find_duplicate(category, latitude, longitude, description):
+    """Return the open issue this report duplicates, or None"""
+    from models import Issue
+    config = current_app.config
+    if not config.get('DUPLICATE_DETECTION_ENABLED', True) or latitude is None or longitude is None:
+        return None
+    radius = config['DUPLICATE_RADIUS_METERS']
+    precision = geo.precision_for_radius(radius, latitude)
+    cells = geo.neighbors(geo.encode(latitude, longitude, precision))
+    # A prefix range keeps each cell an index range scan on every backend
+    cell_ranges = [and_(Issue.geohash >= cell, Issue.geohash < cell + '~') for cell in cells]
+    since = datetime.utcnow() - timedelta(hours=config['DUPLICATE_WINDOW_HOURS'])
+    candidates = db.session.query(
+        Issue.id, Issue.latitude, Issue.longitude, Issue.description
+    ).filter(
+        Issue.category == category,
+        or_(*cell_ranges),
+        Issue.status.in_(OPEN_STATUSES),
+        Issue.parent_id.is_(None),
+        Issue.created_at >= since
+    ).order_by(Issue.created_at.desc()).limit(config['DUPLICATE_MAX_CANDIDATES']).all()
+
+    best, best_score = None, config['DUPLICATE_MIN_SIMILARITY']
+    for candidate in candidates:
+        if geo.distance_meters(latitude, longitude, candidate.latitude, candidate.longitude) > radius:
+            continue
+        score = text_similarity(description, candidate.description)
+        if score >= best_score:
+            best, best_score = candidate, score
+    if best is None:
+        return None
+    return db.session.get(Issue, best.id)
+
+
+def link_duplicate(issue, parent):
+    """Attach a new report to its parent issue and bump the parent's report counter"""
+    from models import Issue
+    issue.parent_id = parent.id
+    # Increment in SQL so simultaneous reports of the same problem don't lose counts
+    db.session.execute(
+        update(Issue)
+        .where(Issue.id == parent.id)
+        .values(report_count=Issue.report_count + 1)
+        .execution_options(synchronize_session=False)
+    )
@@ -1,9 +1,12 @@
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from collections import deque
+from contextlib import contextmanager, nullcontext
 from datetime import datetime
 import logging
 import os
+import threading
+import time
+
+import metrics
 
 # Authority email mappings by category
 AUTHORITY_EMAILS = {
@@ -18,16 +21,28 @@ AUTHORITY_EMAILS = {
     'other': ['general@civic.gov', 'admin@city.gov']
 }
 
-def send_authority_notification(issue):
-    """Send email notification to relevant authorities"""
-    try:
-        # Get authority emails for this category
-        recipients = AUTHORITY_EMAILS.get(issue.category, AUTHORITY_EMAILS['other'])
-        
-        # Create email content
-        subject = f"New Civic Issue Reported - {issue.category.replace('_', ' ').title()} (#{issue.id})"
-        
-        body = f"""
+def queue_authority_notification(issue):
+    """Queue the authority notification for a new issue in the outbox
+
+    The message is added to the current session and is committed together with
+    the issue; outbox_worker delivers it and then marks the issue as notified.
+    Authorities in digest mode get the issue in their next digest instead (see
+    digests.py). The issue must already have an id (flush the session first).
+    Returns the queued message, or None if every recipient is in digest mode.
+    """
+    from digests import split_recipients, queue_digest_entries
+    # Get authority emails for this category
+    recipients, digest_recipients = split_recipients(
+        AUTHORITY_EMAILS.get(issue.category, AUTHORITY_EMAILS['other']))
+    if digest_recipients:
+        queue_digest_entries(issue.id, digest_recipients)
+    if not recipients:
+        return None
+    
+    # Create email content
+    subject = f"New Civic Issue Reported - {issue.category.replace('_', ' ').title()} (#{issue.id})"
+    
+    body = f"""
 New civic issue has been reported and requires attention:
 
 Issue ID: #{issue.id}
@@ -55,74 +70,260 @@ Please log into the admin panel to review and update this issue:
 {get_admin_panel_url()}/issue/{issue.id}
 
 This is an automated notification from the Civic Issues Reporting System.
-        """
-        
-        # Send email to each authority
-        for recipient in recipients:
-            send_email(recipient, subject, body)
-        
-        # Update issue notification status
-        from app import db
-        issue.authority_notified = True
-        issue.notification_sent_at = datetime.utcnow()
-        db.session.commit()
-        
-        logging.info(f"Authority notification sent for issue #{issue.id} to {len(recipients)} recipients")
-        
-    except Exception as e:
-        logging.error(f"Failed to send authority notification for issue #{issue.id}: {str(e)}")
-        raise
+    """
+    
+    return queue_email('authority_notification', recipients, subject, body, issue_id=issue.id)
+
+def queue_email(kind, recipients, subject, body, issue_id=None):
+    """Add an email to the outbox in the current transaction (the caller commits)"""
+    from app import db
+    from models import EmailOutbox
+    message = EmailOutbox(
+        kind=kind,
+        issue_id=issue_id,
+        recipients=','.join(recipients),
+        subject=subject,
+        body=body,
+        status='pending',
+        attempts=0,
+        next_attempt_at=datetime.utcnow()
+    )
+    db.session.add(message)
+    return message
+
+def queue_emails(kind, messages):
+    """Add many (issue_id, recipients, subject, body) emails to the outbox in one INSERT
+
+    Runs in the current transaction (the caller commits); returns the number queued.
+    """
+    from app import db
+    from models import EmailOutbox
+    now = datetime.utcnow()
+    rows = [{
+        'kind': kind,
+        'issue_id': issue_id,
+        'recipients': ','.join(recipients),
+        'subject': subject,
+        'body': body,
+        'status': 'pending',
+        'attempts': 0,
+        'next_attempt_at': now,
+        'created_at': now,
+    } for issue_id, recipients, subject, body in messages]
+    if rows:
+        db.session.execute(EmailOutbox.__table__.insert(), rows)
+    return len(rows)
+
+class SMTPConnectionPool:
+    """Pool of authenticated SMTP connections reused across sends
+
+    Connections idle for longer than ``idle_timeout`` are closed instead of
+    reused. A connection that has been idle for more than
+    ``health_check_after`` seconds is checked with NOOP before it is handed
+    out. At most ``max_size`` connections are open at once.
+    """
+
+    def __init__(self, host, port, username, password, max_size=4,
+                 idle_timeout=60, health_check_after=5, timeout=30, starttls=True):
+        self.host = host
+        self.port = port
+        self.starttls = starttls
+        self.username = username
+        self.password = password
+        self.idle_timeout = idle_timeout
+        self.health_check_after = health_check_after
+        self.timeout = timeout
+        self._idle = []  # (connection, last_used) pairs, most recent last
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def _connect(self):
+        import smtplib
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            server.starttls()
+        server.login(self.username, self.password)
+        return server
+
+    @staticmethod
+    def _close(server):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def _healthy(self, server):
+        try:
+            return server.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _acquire(self):
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                server, last_used = self._idle.pop()
+            idle_for = now - last_used
+            if idle_for > self.idle_timeout:
+                self._close(server)
+            elif idle_for <= self.health_check_after or self._healthy(server):
+                return server
+            else:
+                server.close()
+        return self._connect()
+
+    def _release(self, server):
+        with self._lock:
+            self._idle.append((server, time.monotonic()))
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection; it is returned to the pool unless an error may have broken it"""
+        import smtplib
+        self._slots.acquire()
+        try:
+            server = self._acquire()
+            try:
+                yield server
+            except smtplib.SMTPRecipientsRefused:
+                # Only this message failed; sendmail() has already reset the session
+                self._release(server)
+                raise
+            except BaseException:
+                server.close()
+                raise
+            else:
+                self._release(server)
+        finally:
+            self._slots.release()
+
+    def close_all(self):
+        """Close every idle connection"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server, _ in idle:
+            self._close(server)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_smtp_pool():
+    """Return the process-wide SMTP pool, or None in development mode (no SENDER_PASSWORD)"""
+    global _pool
+    sender_password = os.environ.get("SENDER_PASSWORD")  # Must be set via environment variable
+    if not sender_password:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = SMTPConnectionPool(
+                host=os.environ.get("SMTP_SERVER", "smtp.gmail.com"),
+                port=int(os.environ.get("SMTP_PORT", "587")),
+                username=os.environ.get("SENDER_EMAIL", "civic.system@example.com"),
+                password=sender_password,
+                max_size=int(os.environ.get("SMTP_POOL_SIZE", "4")),
+                idle_timeout=int(os.environ.get("SMTP_IDLE_TIMEOUT", "60")),
+                # Only for a local relay or test server that has no TLS
+                starttls=os.environ.get("SMTP_STARTTLS", "true").lower() == "true"
+            )
+        return _pool
+
+def build_message(recipients, subject, body):
+    """Build one MIME message addressed to every recipient"""
+    # Imported here: the web process only queues mail, the worker sends it
+    from email.mime.text import MIMEText
+    from email.mime.multipart import MIMEMultipart
+    sender_email = os.environ.get("SENDER_EMAIL", "civic.system@example.com")
+    msg = MIMEMultipart()
+    msg['From'] = sender_email
+    msg['To'] = ', '.join(recipients)
+    msg['Subject'] = subject
+    msg.attach(MIMEText(body, 'plain'))
+    return sender_email, msg.as_string()
+
+def _deliver(server, recipients, subject, body):
+    """Send one message to all recipients in a single SMTP transaction"""
+    started = time.perf_counter()
+    outcome = 'failed'
+    try:
+        outcome = _send_message(server, recipients, subject, body)
+    finally:
+        metrics.observe_email(time.perf_counter() - started, outcome)
+
+def _send_message(server, recipients, subject, body):
+    sender_email, text = build_message(recipients, subject, body)
+    if server is None:
+        # Development mode - just log the email instead of sending
+        logging.info(f"EMAIL NOTIFICATION (Development Mode):")
+        logging.info(f"To: {', '.join(recipients)}")
+        logging.info(f"Subject: {subject}")
+        logging.info(f"Body: {body[:200]}...")
+        return 'logged'
+    refused = server.sendmail(sender_email, recipients, text)
+    if refused:
+        logging.warning(f"Email '{subject}' refused for: {', '.join(refused)}")
+    logging.info(f"Email sent to {', '.join(recipients)}")
+    return 'partial' if refused else 'sent'
 
 def send_email(to_email, subject, body):
-    """Send individual email using SMTP"""
+    """Send one email to one address or a list of addresses using a pooled SMTP connection"""
+    recipients = [to_email] if isinstance(to_email, str) else list(to_email)
     try:
-        # Email configuration (set via environment variables)
-        smtp_server = os.environ.get("SMTP_SERVER", "smtp.gmail.com")
-        smtp_port = int(os.environ.get("SMTP_PORT", "587"))
-        sender_email = os.environ.get("SENDER_EMAIL", "civic.system@example.com")
-        sender_password = os.environ.get("SENDER_PASSWORD")  # Must be set via environment variable
-        
-        # Create message
-        msg = MIMEMultipart()
-        msg['From'] = sender_email
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        
-        # Add body to email
-        msg.attach(MIMEText(body, 'plain'))
-        
-        # Check if we're in development mode (no password set)
-        if not sender_password:
-            # Development mode - just log the email instead of sending
-            logging.info(f"EMAIL NOTIFICATION (Development Mode):")
-            logging.info(f"To: {to_email}")
-            logging.info(f"Subject: {subject}")
-            logging.info(f"Body: {body[:200]}...")
+        pool = get_smtp_pool()
+        if pool is None:
+            _deliver(None, recipients, subject, body)
         else:
-            # Production mode - actually send the email
-            server = smtplib.SMTP(smtp_server, smtp_port)
-            server.starttls()
-            server.login(sender_email, sender_password)
-            text = msg.as_string()
-            server.sendmail(sender_email, to_email, text)
-            server.quit()
-            logging.info(f"Email sent to {to_email}")
-        
+            with pool.connection() as server:
+                _deliver(server, recipients, subject, body)
     except Exception as e:
-        logging.error(f"Failed to send email to {to_email}: {str(e)}")
+        logging.error(f"Failed to send email to {', '.join(recipients)}: {str(e)}")
         raise
 
+def send_bulk(messages):
+    """Send many (recipients, subject, body) messages over as few connections as possible
+
+    Returns a list with None for each delivered message or the exception that
+    prevented it, in the same order as ``messages``.
+    """
+    import smtplib
+    results = []
+    pool = get_smtp_pool()
+    pending = deque(messages)
+    while pending:
+        try:
+            if pool is None:
+                server_context = nullcontext(None)
+            else:
+                server_context = pool.connection()
+            with server_context as server:
+                while pending:
+                    recipients, subject, body = pending[0]
+                    try:
+                        _deliver(server, list(recipients), subject, body)
+                        results.append(None)
+                    except smtplib.SMTPRecipientsRefused as e:
+                        # Message-level failure; the connection is still usable
+                        results.append(e)
+                    pending.popleft()
+        except Exception as e:
+            # The connection failed: charge the failure to the message in flight
+            # and carry on with a fresh connection for the rest
+            logging.error(f"Bulk send failed for '{pending[0][1]}': {str(e)}")
+            results.append(e)
+            pending.popleft()
+    return results
+
 def get_admin_panel_url():
     """Get the base URL for the admin panel"""
     # In production, this would be the actual domain
     return "http://localhost:5000"
 
-def send_status_update_notification(issue, old_status):
-    """Send notification when issue status is updated"""
-    try:
-        subject = f"Issue Status Update - #{issue.id}"
-        
-        body = f"""
+def status_update_email(issue, old_status):
+    """Subject and body of the reporter notification for a status change"""
+    subject = f"Issue Status Update - #{issue.id}"
+    
+    body = f"""
 Your reported civic issue has been updated:
 
 Issue ID: #{issue.id}
@@ -137,17 +338,17 @@ Priority: {issue.priority.title()}
 {f'Assigned to: {issue.assigned_to}' if issue.assigned_to else ''}
 {f'Admin Notes: {issue.admin_notes}' if issue.admin_notes else ''}
 
-Updated on: {issue.updated_at.strftime('%B %d, %Y at %I:%M %p')}
+Updated on: {datetime.utcnow().strftime('%B %d, %Y at %I:%M %p')}
 
 Thank you for reporting this issue. We will continue to keep you updated on its progress.
 
 This is an automated notification from the Civic Issues Reporting System.
-        """
-        
-        # Send to issue reporter
-        send_email(issue.email, subject, body)
-        
-        logging.info(f"Status update notification sent for issue #{issue.id} to {issue.email}")
-        
-    except Exception as e:
-        logging.error(f"Failed to send status update notification for issue #{issue.id}: {str(e)}")
\ No newline at end of file
+    """
+    
+    return subject, body
+
+def queue_status_update_notification(issue, old_status):
+    """Queue a notification to the reporter when the issue status is updated"""
+    subject, body = status_update_email(issue, old_status)
+    # Send to issue reporter
+    return queue_email('status_update', [issue.email], subject, body, issue_id=issue.id)
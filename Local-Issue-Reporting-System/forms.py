@@ -71,3 +71,18 @@ class AdminUpdateForm(FlaskForm):
     ])
     
     submit = SubmitField('Update Issue')
+
+class BulkUpdateForm(FlaskForm):
+    """Form for applying one change to many issues from the admin list"""
+    status = SelectField('Status', default='',
+                         choices=[('', 'Status: no change')] + AdminUpdateForm.status.kwargs['choices'])
+
+    priority = SelectField('Priority', default='',
+                           choices=[('', 'Priority: no change')] + AdminUpdateForm.priority.kwargs['choices'])
+
+    assigned_to = StringField('Assign To', validators=[
+        Length(max=100, message='Assigned to field cannot exceed 100 characters')
+    ])
+
+    # 'selected' applies to the checked issue_ids, 'filter' to every issue matching the list filters
+    scope = HiddenField('Scope', default='selected')
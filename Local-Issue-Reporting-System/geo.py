@@ -0,0 +1,133 @@
+"""
+Geohash helpers used to bucket issues spatially.
+
+Each issue with coordinates stores its geohash (GEOHASH_PRECISION characters).
+A prefix of length N names a grid cell, and every issue inside that cell
+shares the prefix. Grouping by substr(geohash, 1, N) therefore clusters
+issues, and a range on the column selects a cell through its index.
+"""
+import math
+
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+GEOHASH_PRECISION = 9  # ~5m cells
+
+# Geohash precision used for map clusters at each Leaflet zoom level; at and
+# above POINTS_MIN_ZOOM individual issues are returned instead
+_ZOOM_PRECISION = [1, 1, 2, 2, 2, 3, 3, 4, 4, 4, 5, 5, 5, 6, 6, 7]
+POINTS_MIN_ZOOM = len(_ZOOM_PRECISION)
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Return the geohash of a coordinate"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lng_range[0] + lng_range[1]) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lng_range[0] = mid
+            else:
+                bits <<= 1
+                lng_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits <<= 1
+                lat_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(chars)
+
+
+def decode_bounds(geohash):
+    """Return (south, north, west, east) of a geohash cell"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = _BASE32.index(char)
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            target = lng_range if even else lat_range
+            mid = (target[0] + target[1]) / 2
+            target[1 - bit] = mid
+            even = not even
+    return lat_range[0], lat_range[1], lng_range[0], lng_range[1]
+
+
+def neighbors(geohash):
+    """Return the cell and its eight surrounding cells at the same precision"""
+    south, north, west, east = decode_bounds(geohash)
+    height = north - south
+    width = east - west
+    center_lat = (south + north) / 2
+    center_lng = (west + east) / 2
+    cells = set()
+    for dlat in (-1, 0, 1):
+        latitude = center_lat + dlat * height
+        if not -90 <= latitude <= 90:
+            continue
+        for dlng in (-1, 0, 1):
+            longitude = (center_lng + dlng * width + 180) % 360 - 180
+            cells.add(encode(latitude, longitude, len(geohash)))
+    return sorted(cells)
+
+
+def cell_size_meters(precision, latitude):
+    """Approximate (height, width) in meters of a cell at a latitude"""
+    lat_bits = (5 * precision) // 2
+    lng_bits = 5 * precision - lat_bits
+    height = 180.0 / (2 ** lat_bits) * 111320
+    width = 360.0 / (2 ** lng_bits) * 111320 * math.cos(math.radians(latitude))
+    return height, width
+
+
+def precision_for_radius(radius_meters, latitude):
+    """Finest precision whose cells are at least ``radius_meters`` across
+
+    A point's cell plus its eight neighbors then covers the whole radius.
+    """
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        if min(cell_size_meters(precision, latitude)) >= radius_meters:
+            return precision
+    return 1
+
+
+def distance_meters(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two coordinates"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * 6371000 * math.asin(math.sqrt(a))
+
+
+def precision_for_zoom(zoom):
+    """Cluster cell precision for a map zoom level, or None when points should be shown"""
+    if zoom >= POINTS_MIN_ZOOM:
+        return None
+    return _ZOOM_PRECISION[max(0, zoom)]
+
+
+def parse_bbox(value):
+    """Parse 'west,south,east,north' into floats, raising ValueError when invalid"""
+    try:
+        west, south, east, north = (float(part) for part in value.split(','))
+    except (AttributeError, ValueError):
+        raise ValueError('bbox must be "west,south,east,north"')
+    if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+        raise ValueError('bbox is out of range')
+    return west, south, east, north
@@ -0,0 +1,139 @@
+"""
+Group commit for issue submissions.
+
+With GROUP_COMMIT_ENABLED, request threads hand their write to one writer
+thread per process and wait for the result. The writer takes whatever has
+queued up (at most GROUP_COMMIT_MAX_BATCH jobs) and runs the whole batch in
+one transaction, so a burst of N submissions costs one commit and one log
+flush instead of N. The writer waits up to GROUP_COMMIT_MAX_WAIT_MS for a
+batch to fill, which is the most latency a lone submission pays. If the
+batch fails, each job is retried in its own transaction, so a single bad
+submission only fails itself.
+
+Without group commit, run_write() runs the job in the request's session and
+commits it straight away.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+from app import db
+
+
+class GroupCommitWriter:
+    """One writer thread that commits queued jobs in batches"""
+
+    def __init__(self, flask_app, max_batch, max_wait):
+        self.app = flask_app
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.jobs = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name='group-commit-writer', daemon=True)
+        self.thread.start()
+
+    def submit(self, job, *args):
+        """Queue ``job(*args)``; returns a Future for its return value"""
+        future = Future()
+        self.jobs.put((future, job, args))
+        return future
+
+    def _next_batch(self):
+        batch = [self.jobs.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self.jobs.get_nowait())
+            except queue.Empty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.jobs.get(timeout=remaining))
+                except queue.Empty:
+                    break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = []
+            try:
+                # Drop jobs whose caller gave up waiting; the rest can no longer be cancelled
+                batch = [item for item in self._next_batch() if item[0].set_running_or_notify_cancel()]
+                if batch:
+                    with self.app.app_context():
+                        self._commit(batch)
+            except Exception as e:
+                logging.error(f'Group commit writer failed: {str(e)}')
+                for future, _, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _commit(self, batch):
+        try:
+            results = [job(*args) for _, job, args in batch]
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            if len(batch) == 1:
+                batch[0][0].set_exception(e)
+                return
+            logging.warning(f'Group commit of {len(batch)} writes failed ({str(e)}); retrying them one by one')
+            for job in batch:
+                self._commit([job])
+            return
+        for (future, _, _), result in zip(batch, results):
+            future.set_result(result)
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(flask_app):
+    """The writer for ``flask_app`` in this process, started on first use
+
+    Threads do not survive fork, so each gunicorn worker starts its own.
+    """
+    key = (id(flask_app), os.getpid())
+    writer = _writers.get(key)
+    if writer is None:
+        with _writers_lock:
+            writer = _writers.get(key)
+            if writer is None:
+                config = flask_app.config
+                writer = GroupCommitWriter(flask_app, config['GROUP_COMMIT_MAX_BATCH'],
+                                           config['GROUP_COMMIT_MAX_WAIT_MS'] / 1000)
+                _writers[key] = writer
+    return writer
+
+
+def run_write(flask_app, job, *args):
+    """Run ``job(*args)`` and commit it, through the writer when group commit is on
+
+    ``job`` must only use db.session and return plain values, since with
+    group commit it runs on another thread with the writer's session.
+    Exceptions raised by the job or the commit propagate to the caller. A
+    job still queued after GROUP_COMMIT_TIMEOUT seconds is cancelled and
+    raises TimeoutError; one the writer has started is waited for.
+    """
+    config = flask_app.config
+    if not config['GROUP_COMMIT_ENABLED']:
+        try:
+            result = job(*args)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return result
+    future = get_writer(flask_app).submit(job, *args)
+    try:
+        return future.result(timeout=config['GROUP_COMMIT_TIMEOUT'])
+    except FutureTimeoutError:
+        if future.cancel():
+            raise
+        # The writer has already started the job, so it may still commit:
+        # wait for the outcome rather than invite a duplicate retry
+        return future.result()
@@ -0,0 +1,124 @@
+"""
+HTTP caching and response compression.
+
+- Uploaded photos are immutable: store names are content hashes, so they
+  are served with a year-long ``immutable`` Cache-Control and the hash as
+  a strong ETag. Range requests are supported.
+- List pages and list APIs get a weak ETag and Last-Modified, built from the
+  newest updated_at and the row count for the active filter. A matching
+  conditional GET is answered with 304 before any rows are loaded or any
+  template is rendered. Keyset API pages instead build them from the rows of
+  the page, so a page costs one indexed range read rather than an extra
+  aggregate over the whole filter.
+- HTML/JSON responses are compressed with brotli (when the ``brotli``
+  package is installed) or gzip, depending on Accept-Encoding. Streamed
+  responses are sent uncompressed.
+"""
+import gzip
+import hashlib
+
+from flask import current_app, request, session, send_from_directory, Response
+from sqlalchemy import func
+from werkzeug.http import is_resource_modified
+
+from photo_store import stored_digest
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+COMPRESSIBLE_MIMETYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/javascript',
+    'application/json', 'application/javascript',
+}
+
+
+def send_upload(filename):
+    """Serve a file from UPLOAD_FOLDER, marking content-addressed files immutable"""
+    digest = stored_digest(filename)
+    if digest is None:
+        # Names outside the store can change; let send_file use its mtime based ETag
+        return send_from_directory(current_app.config['UPLOAD_FOLDER'], filename, conditional=True)
+    response = send_from_directory(current_app.config['UPLOAD_FOLDER'], filename,
+                                   conditional=True, etag=digest,
+                                   max_age=IMMUTABLE_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def collection_validators(query, model, *extra):
+    """Return (etag, last_modified) describing the rows ``query`` selects
+
+    ``extra`` covers anything else the response depends on, such as page
+    totals or the login state.
+    """
+    newest, count = query.order_by(None).with_entities(
+        func.max(model.updated_at), func.count(model.id)
+    ).one()
+    version = repr((newest.isoformat() if newest else None, count) + extra)
+    return hashlib.sha1(version.encode()).hexdigest(), newest
+
+
+def page_validators(rows, *extra):
+    """Return (etag, last_modified) describing one already-loaded page of rows
+
+    The page is fully described by the (id, updated_at) pairs it holds;
+    ``extra`` covers the paging parameters and anything else it depends on.
+    """
+    newest = max((row.updated_at for row in rows if row.updated_at is not None), default=None)
+    version = repr(tuple((row.id, row.updated_at.isoformat() if row.updated_at else None) for row in rows) + extra)
+    return hashlib.sha1(version.encode()).hexdigest(), newest
+
+
+def not_modified(etag, last_modified):
+    """Return a 304 response when the client's copy is current, otherwise None"""
+    # Pending flash messages are shown by the next render; don't swallow them
+    if '_flashes' in session:
+        return None
+    if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return None
+    return set_validators(Response(status=304), etag, last_modified)
+
+
+def set_validators(response, etag, last_modified):
+    """Attach validators; clients and proxies must revalidate before reuse"""
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response
+
+
+def _compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=current_app.config['COMPRESS_BROTLI_QUALITY'])
+    return gzip.compress(data, compresslevel=current_app.config['COMPRESS_GZIP_LEVEL'])
+
+
+def compress_response(response):
+    """after_request hook: negotiate gzip/brotli for HTML and JSON bodies"""
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+    response.vary.add('Accept-Encoding')
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers):
+        return response
+    offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+    encoding = request.accept_encodings.best_match(offered)
+    if encoding is None:
+        return response
+    data = response.get_data()
+    if len(data) < current_app.config['COMPRESS_MIN_SIZE']:
+        return response
+    response.set_data(_compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    # The compressed bytes differ, so a strong validator must not be reused for them
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
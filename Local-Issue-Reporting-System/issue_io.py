@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+Bulk import and export of issues
+
+Import CSV or NDJSON (e.g. legacy reports); stdin ('-') is read as NDJSON
+unless --format says otherwise:
+    python issue_io.py import reports.csv
+    python issue_io.py import reports.ndjson --batch 10000 --errors rejected.ndjson
+
+Rows are validated with the same rules as the web forms: IssueForm for the
+report fields, and AdminUpdateForm for status/priority/admin_notes/
+assigned_to when present. A photo_filename must name a photo already in
+the photo store (see photo_store.py). Valid rows go in as multi-row
+inserts, one transaction per batch. No notification emails are queued, and duplicate
+detection is skipped. Afterwards the daily rollups (and the dashboard
+counters, when enabled) are rebuilt.
+
+Export to CSV, NDJSON or Parquet (Parquet needs pyarrow):
+    python issue_io.py export issues.csv --since 2024-01-01 --status resolved
+    python issue_io.py export - --format ndjson --category potholes | gzip > potholes.ndjson.gz
+
+Exports stream from a server-side cursor in batches, so memory use stays
+flat however many rows match. Reporter name and email are left out unless
+--include-personal is given.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from datetime import datetime
+sys.path.append('.')
+
+from flask import current_app
+from werkzeug.datastructures import MultiDict
+
+from app import create_app, db
+from forms import IssueForm, AdminUpdateForm
+from models import Issue
+import geo
+import photo_store
+
+IMPORT_FIELDS = ('name', 'email', 'category', 'description', 'location', 'latitude', 'longitude',
+                 'status', 'priority', 'admin_notes', 'assigned_to', 'created_at', 'updated_at',
+                 'resolved_at', 'authority_notified', 'notification_sent_at', 'photo_filename')
+
+EXPORT_COLUMNS = ('id', 'category', 'description', 'location', 'latitude', 'longitude', 'status',
+                  'priority', 'created_at', 'updated_at', 'resolved_at', 'assigned_to',
+                  'authority_notified', 'parent_id', 'report_count')
+PERSONAL_COLUMNS = ('name', 'email')
+
+_ADMIN_FIELDS = ('status', 'priority', 'admin_notes', 'assigned_to')
+_DATE_FIELDS = ('created_at', 'updated_at', 'resolved_at', 'notification_sent_at')
+
+
+def _format_for(path, requested):
+    if requested:
+        return requested
+    if path == '-':
+        return 'ndjson'
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    return {'jsonl': 'ndjson', 'json': 'ndjson'}.get(extension, extension)
+
+
+def _progress(label, done, failed, started):
+    rate = done / max(time.perf_counter() - started, 1e-9)
+    sys.stderr.write(f"\r{label}: {done:,} rows ({failed:,} rejected, {rate:,.0f} rows/s)")
+    sys.stderr.flush()
+
+
+# --- Import -----------------------------------------------------------------
+
+def _read_rows(path, file_format):
+    """Yield (line number, row, errors) from a CSV or NDJSON file, one row at a time
+
+    ``errors`` is None unless the line could not be read as a row, in which
+    case ``row`` is the raw line and the caller rejects it like any other.
+    """
+    handle = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+    try:
+        if file_format == 'csv':
+            for line_number, row in enumerate(csv.DictReader(handle), start=2):
+                yield line_number, row, None
+        elif file_format == 'ndjson':
+            for line_number, line in enumerate(handle, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    yield line_number, line.rstrip('\r\n'), {'row': [f"Invalid JSON: {e}"]}
+                    continue
+                if not isinstance(row, dict):
+                    yield line_number, row, {'row': [f"Expected a JSON object, got {type(row).__name__}"]}
+                    continue
+                yield line_number, row, None
+        else:
+            raise ValueError(f"Unsupported import format: {file_format}")
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+
+def _parse_datetime(value):
+    if value in (None, ''):
+        return None
+    return datetime.fromisoformat(str(value).replace('Z', '+00:00')).replace(tzinfo=None)
+
+
+def _parse_coordinate(value, limit):
+    if value in (None, ''):
+        return None
+    number = float(value)
+    if not -limit <= number <= limit:
+        raise ValueError(f"{number} is out of range")
+    return number
+
+
+def _parse_bool(value):
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y', 't')
+
+
+def _photo_error(name):
+    """Why ``name`` can't be an issue's photo, or None when it is empty or a stored photo"""
+    if not name:
+        return None
+    if not photo_store.is_stored_name(name):
+        return 'Not a photo store name (ab/cd/<sha256>.<ext>); run "flask migrate-photo-store" on old uploads'
+    if not os.path.isfile(os.path.join(current_app.config['UPLOAD_FOLDER'], name)):
+        return 'No such photo in the photo store'
+    return None
+
+
+def validate_row(row):
+    """Return (issue values, None) for a valid row, or (None, {field: [errors]})"""
+    row = {key: ('' if value is None else str(value)) for key, value in row.items() if key in IMPORT_FIELDS}
+    form = IssueForm(formdata=MultiDict(row), meta={'csrf': False})
+    errors = {} if form.validate() else dict(form.errors)
+    admin_data = {field: row[field] for field in _ADMIN_FIELDS if row.get(field)}
+    admin_data.setdefault('status', 'submitted')
+    admin_data.setdefault('priority', 'medium')
+    admin_form = AdminUpdateForm(formdata=MultiDict(admin_data), meta={'csrf': False})
+    if not admin_form.validate():
+        errors.update(admin_form.errors)
+
+    values = {}
+    try:
+        values['latitude'] = _parse_coordinate(row.get('latitude'), 90)
+        values['longitude'] = _parse_coordinate(row.get('longitude'), 180)
+    except ValueError as e:
+        errors['coordinates'] = [str(e)]
+    for field in _DATE_FIELDS:
+        try:
+            values[field] = _parse_datetime(row.get(field))
+        except ValueError as e:
+            errors[field] = [str(e)]
+    photo_error = _photo_error(row.get('photo_filename'))
+    if photo_error:
+        errors['photo_filename'] = [photo_error]
+    if errors:
+        return None, errors
+
+    now = datetime.utcnow()
+    created_at = values['created_at'] or now
+    status = admin_form.status.data
+    resolved_at = values['resolved_at']
+    if status == 'resolved' and resolved_at is None:
+        resolved_at = values['updated_at'] or created_at
+    latitude, longitude = values['latitude'], values['longitude']
+    if (latitude is None) != (longitude is None):
+        latitude = longitude = None
+    return {
+        'name': form.name.data,
+        'email': form.email.data,
+        'category': form.category.data,
+        'description': form.description.data,
+        'location': form.location.data,
+        'latitude': latitude,
+        'longitude': longitude,
+        # Core inserts skip the ORM hook that normally fills this in
+        'geohash': geo.encode(latitude, longitude) if latitude is not None else None,
+        'photo_filename': row.get('photo_filename') or None,
+        'status': status,
+        'priority': admin_form.priority.data,
+        'admin_notes': admin_form.admin_notes.data or None,
+        'assigned_to': admin_form.assigned_to.data or None,
+        'created_at': created_at,
+        'updated_at': values['updated_at'] or created_at,
+        'resolved_at': resolved_at if status == 'resolved' else None,
+        'authority_notified': _parse_bool(row.get('authority_notified', '')),
+        'notification_sent_at': values['notification_sent_at'],
+        'parent_id': None,
+        'report_count': 1,
+    }, None
+
+
+def import_issues(path, file_format, batch_size, errors_path=None, dry_run=False):
+    """Validate and insert every row of ``path``; returns (inserted, rejected)"""
+    from rollups import rebuild_rollups
+    from stats_service import counters_enabled, rebuild_counters
+    from analytics_service import invalidate_analytics
+    table = Issue.__table__
+    inserted = rejected = 0
+    started = time.perf_counter()
+    error_log = open(errors_path, 'w', encoding='utf-8') if errors_path else None
+    batch = []
+
+    def flush():
+        nonlocal inserted
+        if batch and not dry_run:
+            with db.engine.begin() as conn:
+                conn.execute(table.insert(), batch)
+        inserted += len(batch)
+        batch.clear()
+        _progress('Imported', inserted, rejected, started)
+
+    try:
+        # The forms need a request context; CSRF is off for these instances
+        with current_app.test_request_context():
+            for line_number, row, errors in _read_rows(path, file_format):
+                if errors is None:
+                    values, errors = validate_row(row)
+                if errors:
+                    rejected += 1
+                    if error_log:
+                        error_log.write(json.dumps({'line': line_number, 'errors': errors, 'row': row}) + '\n')
+                    continue
+                batch.append(values)
+                if len(batch) >= batch_size:
+                    flush()
+            flush()
+    finally:
+        sys.stderr.write('\n')
+        if error_log:
+            error_log.close()
+
+    if inserted and not dry_run:
+        print("Rebuilding daily rollups...")
+        rebuild_rollups()
+        if counters_enabled():
+            rebuild_counters()
+        invalidate_analytics()
+    return inserted, rejected
+
+
+# --- Export -----------------------------------------------------------------
+
+def _export_query(since=None, until=None, status=None, category=None, columns=EXPORT_COLUMNS):
+    query = db.select(*[getattr(Issue, column) for column in columns]).order_by(Issue.id)
+    if since:
+        query = query.where(Issue.created_at >= since)
+    if until:
+        query = query.where(Issue.created_at < until)
+    if status:
+        query = query.where(Issue.status == status)
+    if category:
+        query = query.where(Issue.category == category)
+    return query
+
+
+def _serialize(value):
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return value
+
+
+def _batches(query, batch_size):
+    """Yield lists of rows from a server-side cursor"""
+    with db.engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(query)
+        for partition in result.partitions():
+            yield partition
+
+
+class _CsvWriter:
+    def __init__(self, handle, columns):
+        self.writer = csv.writer(handle)
+        self.writer.writerow(columns)
+
+    def write(self, rows):
+        self.writer.writerows([[_serialize(value) for value in row] for row in rows])
+
+    def close(self):
+        pass
+
+
+class _NdjsonWriter:
+    def __init__(self, handle, columns):
+        self.handle = handle
+        self.columns = columns
+
+    def write(self, rows):
+        self.handle.writelines(
+            json.dumps({column: _serialize(value) for column, value in zip(self.columns, row)}) + '\n'
+            for row in rows
+        )
+
+    def close(self):
+        pass
+
+
+class _ParquetWriter:
+    def __init__(self, path, columns):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("❌ Parquet export needs pyarrow: pip install pyarrow")
+        types = {
+            'id': pa.int64(), 'parent_id': pa.int64(), 'report_count': pa.int64(),
+            'latitude': pa.float64(), 'longitude': pa.float64(), 'authority_notified': pa.bool_(),
+            'created_at': pa.timestamp('us'), 'updated_at': pa.timestamp('us'), 'resolved_at': pa.timestamp('us'),
+        }
+        self.pa = pa
+        self.columns = columns
+        self.schema = pa.schema([(column, types.get(column, pa.string())) for column in columns])
+        self.writer = pq.ParquetWriter(path, self.schema, compression='zstd')
+
+    def write(self, rows):
+        arrays = [list(values) for values in zip(*rows)]
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+def export_issues(path, file_format, batch_size, include_personal=False, **filters):
+    """Stream matching issues to ``path`` ('-' for stdout); returns the row count"""
+    columns = PERSONAL_COLUMNS + EXPORT_COLUMNS if include_personal else EXPORT_COLUMNS
+    query = _export_query(columns=columns, **filters)
+    if file_format == 'parquet':
+        if path == '-':
+            raise SystemExit("❌ Parquet export needs a file path, not stdout")
+        handle = None
+        writer = _ParquetWriter(path, columns)
+    else:
+        handle = sys.stdout if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+        writer_class = {'csv': _CsvWriter, 'ndjson': _NdjsonWriter}.get(file_format)
+        if writer_class is None:
+            raise SystemExit(f"❌ Unsupported export format: {file_format}")
+        writer = writer_class(handle, columns)
+    exported = 0
+    started = time.perf_counter()
+    try:
+        for rows in _batches(query, batch_size):
+            writer.write(rows)
+            exported += len(rows)
+            _progress('Exported', exported, 0, started)
+        writer.close()
+    finally:
+        sys.stderr.write('\n')
+        if handle is not None and handle is not sys.stdout:
+            handle.close()
+    return exported
+
+
+def _date(value):
+    return datetime.strptime(value, '%Y-%m-%d')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = commands.add_parser('import', help='import issues from CSV or NDJSON')
+    import_parser.add_argument('path', help="input file, or '-' for stdin")
+    import_parser.add_argument('--format', choices=('csv', 'ndjson'),
+                               help='default: from the file extension, NDJSON for stdin')
+    import_parser.add_argument('--batch', type=int, default=5000, help='rows per insert transaction')
+    import_parser.add_argument('--errors', help='write rejected rows with their errors to this NDJSON file')
+    import_parser.add_argument('--dry-run', action='store_true', help='validate only, insert nothing')
+
+    export_parser = commands.add_parser('export', help='export issues to CSV, NDJSON or Parquet')
+    export_parser.add_argument('path', help="output file, or '-' for stdout")
+    export_parser.add_argument('--format', choices=('csv', 'ndjson', 'parquet'), help='default: from the file extension')
+    export_parser.add_argument('--batch', type=int, default=5000, help='rows fetched per round trip')
+    export_parser.add_argument('--since', type=_date, help='created on or after YYYY-MM-DD')
+    export_parser.add_argument('--until', type=_date, help='created before YYYY-MM-DD')
+    export_parser.add_argument('--status')
+    export_parser.add_argument('--category')
+    export_parser.add_argument('--include-personal', action='store_true', help='include reporter name and email')
+    args = parser.parse_args()
+
+    file_format = _format_for(args.path, args.format)
+    app = create_app()
+    with app.app_context():
+        if args.command == 'import':
+            inserted, rejected = import_issues(args.path, file_format, args.batch, args.errors, args.dry_run)
+            verb = 'Validated' if args.dry_run else 'Imported'
+            print(f"✓ {verb} {inserted:,} issues ({rejected:,} rejected)")
+        else:
+            exported = export_issues(args.path, file_format, args.batch, args.include_personal,
+                                     since=args.since, until=args.until,
+                                     status=args.status, category=args.category)
+            # Keep stdout clean when the export itself goes there
+            print(f"✓ Exported {exported:,} issues", file=sys.stderr if args.path == '-' else sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Issue write operations shared by the public and admin views.
+
+create_issue() adds a submitted report with its duplicate link, authority
+notification, counters and rollups, ready for one commit. It takes plain
+values so group_commit.py can run it on its writer thread.
+
+bulk_update_issues() applies one status, priority or assignment change to
+many issues. The changed rows are updated by a single set-based UPDATE.
+The dashboard counters, daily rollups and resolved_at stay in step within
+the same transaction, and the reporter notifications are added to the
+outbox with one multi-row INSERT.
+"""
+from collections import Counter
+from datetime import datetime
+from types import SimpleNamespace
+
+from sqlalchemy import and_, case, func, or_, select, update
+
+from app import db
+from models import Issue
+import rollups
+from duplicates import find_duplicate, link_duplicate
+from email_service import queue_authority_notification, queue_emails, status_update_email
+from search import search_matches
+from stats_service import record_issue_created, record_status_change
+
+BULK_FIELDS = ('status', 'priority', 'assigned_to')
+
+# What the notification body and the counter/rollup deltas need from each row
+_SNAPSHOT_COLUMNS = (Issue.id, Issue.email, Issue.category, Issue.location, Issue.status,
+                     Issue.priority, Issue.assigned_to, Issue.admin_notes,
+                     func.date(Issue.created_at).label('day'))
+
+
+def create_issue(values):
+    """Add a new issue built from ``values``; the caller commits
+
+    Reports of an already-open nearby issue are linked to it instead of
+    notifying the authorities again. Returns (issue id, id of the issue it
+    duplicates or None).
+    """
+    issue = Issue(status='submitted', priority='medium', **values)
+    parent = find_duplicate(issue.category, issue.latitude, issue.longitude, issue.description)
+    db.session.add(issue)
+    if parent:
+        link_duplicate(issue, parent)
+    db.session.flush()
+    if not parent:
+        # Queued in the same commit as the issue; outbox_worker delivers it
+        # off the request path
+        queue_authority_notification(issue)
+    record_issue_created(issue)
+    rollups.record_issue_created(issue)
+    return issue.id, parent.id if parent else None
+
+
+class BulkUpdateConflict(Exception):
+    """Some selected issues changed while the bulk update ran; nothing was applied"""
+
+
+def selection_condition(issue_ids=None, filters=None):
+    """WHERE clause for explicit ``issue_ids``, or else the admin list ``filters``
+
+    ``filters`` may hold status, category and priority ('all' means any) and a
+    search query ``q``.
+    """
+    if issue_ids:
+        return Issue.id.in_(issue_ids)
+    filters = filters or {}
+    conditions = [getattr(Issue, field) == filters[field]
+                  for field in ('status', 'category', 'priority')
+                  if filters.get(field, 'all') != 'all']
+    matches = search_matches(db.engine.dialect.name, filters.get('q', ''))
+    if matches is not None:
+        conditions.append(Issue.id.in_(select(matches.c.id)))
+    return and_(True, *conditions)
+
+
+def bulk_update_issues(condition, changes, max_issues):
+    """Apply ``changes`` to every issue matching ``condition``; the caller commits
+
+    ``changes`` holds any of status, priority and assigned_to. Issues that
+    already have those values are left alone, so their updated_at doesn't move.
+    Returns (updated, notifications queued). Raises ValueError when nothing
+    would change or more than ``max_issues`` issues match. Raises
+    BulkUpdateConflict when a matching issue is modified concurrently.
+    """
+    changes = {field: value for field, value in changes.items() if field in BULK_FIELDS and value}
+    if not changes:
+        raise ValueError('Choose a status, priority or assignee to apply')
+    differs = or_(*[getattr(Issue, field).is_distinct_from(value) for field, value in changes.items()])
+    target = and_(condition, differs)
+
+    snapshot_at = datetime.utcnow()
+    rows = db.session.execute(
+        select(*_SNAPSHOT_COLUMNS).where(target).order_by(Issue.id).limit(max_issues + 1).with_for_update()
+    ).all()
+    if len(rows) > max_issues:
+        raise ValueError(f'More than {max_issues} issues match; narrow the selection')
+    if not rows:
+        return 0, 0
+
+    now = datetime.utcnow()
+    values = dict(changes, updated_at=now)
+    new_status = changes.get('status')
+    if new_status == 'resolved':
+        # Issues that were already resolved keep their original resolution time
+        values['resolved_at'] = case((Issue.status != 'resolved', now), else_=Issue.resolved_at)
+    elif new_status:
+        values['resolved_at'] = None
+    # The updated_at guard catches rows changed between the snapshot and this
+    # UPDATE on backends where the SELECT above takes no row locks (SQLite)
+    result = db.session.execute(
+        update(Issue.__table__)
+        .where(Issue.id.in_([row.id for row in rows]),
+               or_(Issue.updated_at.is_(None), Issue.updated_at <= snapshot_at), differs)
+        .values(**values)
+    )
+    if result.rowcount != len(rows):
+        db.session.rollback()
+        raise BulkUpdateConflict(f'{len(rows) - result.rowcount} of the selected issues changed meanwhile')
+
+    status_changes = Counter(row.status for row in rows if new_status and row.status != new_status)
+    for old_status, count in status_changes.items():
+        record_status_change(old_status, new_status, count)
+    groups = Counter((_as_date(row.day), row.category, row.status, row.priority) for row in rows)
+    rollups.record_bulk_change(groups, new_status, changes.get('priority'))
+
+    messages = []
+    if new_status:
+        for row in rows:
+            if row.status == new_status:
+                continue
+            issue = SimpleNamespace(**dict(row._mapping, **changes))
+            subject, body = status_update_email(issue, row.status)
+            messages.append((row.id, [row.email], subject, body))
+    queued = queue_emails('status_update', messages)
+    return len(rows), queued
+
+
+def _as_date(value):
+    # func.date() comes back as a string on SQLite and as a date on PostgreSQL
+    if isinstance(value, str):
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    return value
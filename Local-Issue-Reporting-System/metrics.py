@@ -0,0 +1,216 @@
+"""
+Request, SQL and email instrumentation exposed in Prometheus text format.
+
+Recorded per endpoint:
+- http_request_duration_seconds: request latency, including streamed bodies
+- http_requests_total: requests by method and status
+- db_statements_per_request / db_time_per_request_seconds: how many SQL
+  statements a request ran and how long they took in total
+- db_statement_duration_seconds: the latency of each statement
+
+email_send_duration_seconds records the time per delivered message.
+
+SQL statements are timed by cursor-execute events on every Engine.
+Statements outside a request (the outbox worker, CLI commands) are labelled
+endpoint="background". Requests slower than SLOW_REQUEST_MS and statements
+slower than SLOW_QUERY_MS are logged as warnings, with the route and the SQL.
+
+Metrics are held in process memory. With several gunicorn workers, each
+worker serves its own numbers.
+"""
+import logging
+import threading
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+logger = logging.getLogger('metrics')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with labels"""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {_format_number(value)}')
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels"""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    bucket_labels = _format_labels(self.labelnames, labels, [('le', _format_number(bound))])
+                    lines.append(f'{self.name}_bucket{bucket_labels} {cumulative}')
+                label_text = _format_labels(self.labelnames, labels)
+                lines.append(f'{self.name}_sum{label_text} {_format_number(total)}')
+                lines.append(f'{self.name}_count{label_text} {count}')
+        return lines
+
+
+REQUEST_DURATION = Histogram('http_request_duration_seconds', 'Request latency by endpoint',
+                             ('endpoint', 'method'))
+REQUESTS = Counter('http_requests_total', 'Requests by endpoint, method and status',
+                   ('endpoint', 'method', 'status'))
+STATEMENTS_PER_REQUEST = Histogram('db_statements_per_request', 'SQL statements executed per request',
+                                   ('endpoint',), COUNT_BUCKETS)
+DB_TIME_PER_REQUEST = Histogram('db_time_per_request_seconds', 'Total SQL time per request',
+                                ('endpoint',))
+STATEMENT_DURATION = Histogram('db_statement_duration_seconds', 'SQL statement latency',
+                               ('endpoint',), STATEMENT_BUCKETS)
+EMAIL_DURATION = Histogram('email_send_duration_seconds', 'Time to hand one message to SMTP',
+                           ('outcome',), LATENCY_BUCKETS)
+
+REGISTRY = [REQUEST_DURATION, REQUESTS, STATEMENTS_PER_REQUEST, DB_TIME_PER_REQUEST,
+            STATEMENT_DURATION, EMAIL_DURATION]
+
+_settings = {'slow_request_ms': 500.0, 'slow_query_ms': 100.0}
+
+
+def render():
+    """All metrics in Prometheus text exposition format"""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def _endpoint():
+    return request.endpoint or 'unmatched'
+
+
+def _request_stats():
+    if has_request_context():
+        return g.get('_request_metrics')
+    return None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_metrics_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    stats = _request_stats()
+    if stats is not None:
+        stats['statements'] += 1
+        stats['db_seconds'] += elapsed
+        endpoint = stats['endpoint']
+    else:
+        endpoint = 'background'
+    STATEMENT_DURATION.observe(elapsed, endpoint)
+    if elapsed * 1000 >= _settings['slow_query_ms']:
+        route = f"{request.method} {request.path}" if has_request_context() else 'background'
+        logger.warning(f"Slow query ({elapsed * 1000:.1f} ms) in {endpoint} [{route}]: {statement}")
+
+
+def _start_request():
+    g._request_metrics = {
+        'started': time.perf_counter(),
+        'endpoint': _endpoint(),
+        'statements': 0,
+        'db_seconds': 0.0,
+    }
+
+
+def _finish_request(response):
+    stats = g.get('_request_metrics')
+    if stats is None:
+        return response
+    method, path, status = request.method, request.path, response.status_code
+
+    def record():
+        # Runs when the response is closed, so streamed bodies are included
+        elapsed = time.perf_counter() - stats['started']
+        endpoint = stats['endpoint']
+        REQUEST_DURATION.observe(elapsed, endpoint, method)
+        REQUESTS.inc(endpoint, method, str(status))
+        STATEMENTS_PER_REQUEST.observe(stats['statements'], endpoint)
+        DB_TIME_PER_REQUEST.observe(stats['db_seconds'], endpoint)
+        if elapsed * 1000 >= _settings['slow_request_ms']:
+            logger.warning(
+                f"Slow request ({elapsed * 1000:.1f} ms) {method} {path} [{endpoint}] -> {status}: "
+                f"{stats['statements']} SQL statements, {stats['db_seconds'] * 1000:.1f} ms in SQL"
+            )
+
+    response.call_on_close(record)
+    return response
+
+
+def observe_email(seconds, outcome):
+    EMAIL_DURATION.observe(seconds, outcome)
+
+
+def init_app(flask_app):
+    """Register the request hooks and SQL timing for ``flask_app``"""
+    _settings['slow_request_ms'] = flask_app.config['SLOW_REQUEST_MS']
+    _settings['slow_query_ms'] = flask_app.config['SLOW_QUERY_MS']
+    flask_app.before_request(_start_request)
+    flask_app.after_request(_finish_request)
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
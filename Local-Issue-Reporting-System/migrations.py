@@ -0,0 +1,133 @@
+"""
+Schema upgrades for existing databases.
+
+db.create_all() only creates missing tables; it never adds indexes or columns
+to a table that already exists. upgrade_database() runs create_all() and then
+every step in MIGRATIONS, each of which must be idempotent so the whole thing
+can be re-run safely on any deployment.
+"""
+import logging
+
+from sqlalchemy import inspect, text
+
+from app import db
+
+
+def _add_column(table_name, column_name):
+    """Add a model column to an existing table if it is not there yet
+
+    Returns True when the column was added.
+    """
+    inspector = inspect(db.engine)
+    if column_name in {column['name'] for column in inspector.get_columns(table_name)}:
+        return False
+    column = db.metadata.tables[table_name].columns[column_name]
+    column_type = column.type.compile(dialect=db.engine.dialect)
+    ddl = f'ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}'
+    # NOT NULL columns can only be added to a populated table with a default
+    if column.server_default is not None:
+        ddl += f' DEFAULT {column.server_default.arg}'
+        if not column.nullable:
+            ddl += ' NOT NULL'
+    logging.info(f"Adding column {table_name}.{column_name}")
+    with db.engine.begin() as conn:
+        conn.execute(text(ddl))
+    return True
+
+
+def _add_resolved_at():
+    """Add issue.resolved_at, backfilled from updated_at for already-resolved issues"""
+    _add_column('issue', 'resolved_at')
+    with db.engine.begin() as conn:
+        conn.execute(text(
+            "UPDATE issue SET resolved_at = updated_at "
+            "WHERE status = 'resolved' AND resolved_at IS NULL"
+        ))
+
+
+def _add_geohash():
+    """Add issue.geohash and fill it for issues that already have coordinates"""
+    from sqlalchemy import update, bindparam
+    import geo
+    from models import Issue
+    _add_column('issue', 'geohash')
+    table = Issue.__table__
+    # Assigning updated_at to itself stops its onupdate from firing on a backfill
+    statement = update(table).where(table.c.id == bindparam('row_id')).values(
+        geohash=bindparam('row_geohash'), updated_at=table.c.updated_at)
+    while True:
+        rows = db.session.query(Issue.id, Issue.latitude, Issue.longitude).filter(
+            Issue.geohash.is_(None),
+            Issue.latitude.isnot(None),
+            Issue.longitude.isnot(None)
+        ).limit(1000).all()
+        if not rows:
+            break
+        db.session.execute(statement, [
+            {'row_id': row.id, 'row_geohash': geo.encode(row.latitude, row.longitude)} for row in rows
+        ])
+        db.session.commit()
+
+
+def _add_duplicate_tracking():
+    """Add issue.parent_id and issue.report_count for near-duplicate reports"""
+    _add_column('issue', 'parent_id')
+    _add_column('issue', 'report_count')
+
+
+def _install_search_index():
+    """Create the full-text index on an existing issue table and populate it
+
+    The index is only rebuilt when it is first created; after that the
+    triggers keep it current, so later upgrades skip the full table scan.
+    """
+    from search import install_search_index
+    with db.engine.begin() as conn:
+        created = 'issue_fts' not in inspect(conn).get_table_names()
+        install_search_index(conn, rebuild=created)
+
+
+def _ensure_indexes():
+    """Create any model index that is missing from the live schema"""
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                logging.info(f"Creating index {index.name} on {table.name}")
+                index.create(bind=db.engine)
+
+
+def _seed_issue_counters():
+    """Populate issue_counter from the issue table when counters are enabled"""
+    from stats_service import counters_enabled, rebuild_counters
+    if counters_enabled():
+        rebuild_counters()
+
+
+def _seed_daily_rollups():
+    """Fill issue_daily_rollup the first time it exists alongside issues"""
+    from models import IssueDailyRollup
+    from rollups import rebuild_rollups
+    if db.session.query(IssueDailyRollup.day).first() is None:
+        rebuild_rollups()
+
+
+# Column steps run before _ensure_indexes so new indexes can cover new columns
+MIGRATIONS = [
+    _add_resolved_at,
+    _add_geohash,
+    _add_duplicate_tracking,
+    _ensure_indexes,
+    _install_search_index,
+    _seed_issue_counters,
+    _seed_daily_rollups,
+]
+
+
+def upgrade_database():
+    """Create missing tables and apply every migration step in order"""
+    db.create_all(bind_key=None)  # the replicas get their schema from the primary
+    for step in MIGRATIONS:
+        logging.info(f"Running migration step {step.__name__}")
+        step()
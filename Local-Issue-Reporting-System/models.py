@@ -3,6 +3,8 @@ from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
 
 
+import geo
+import search
 from app import db
 class Issue(db.Model):
     """Model for storing civic issues reported by citizens"""
@@ -23,6 +25,31 @@ class Issue(db.Model):
     assigned_to = db.Column(db.String(100))
     authority_notified = db.Column(db.Boolean, default=False, nullable=False)
     notification_sent_at = db.Column(db.DateTime, nullable=True)
+    resolved_at = db.Column(db.DateTime, nullable=True)
+    geohash = db.Column(db.String(12), nullable=True)  # set from latitude/longitude, see geo.py
+    parent_id = db.Column(db.Integer, db.ForeignKey('issue.id'), nullable=True)  # set on near-duplicate reports
+    report_count = db.Column(db.Integer, default=1, server_default='1', nullable=False)
+
+    # Indexes for the admin/public list filters (always sorted by created_at desc)
+    # and the analytics filters. Existing databases pick these up through
+    # migrations.upgrade_database() since db.create_all() skips existing tables.
+    __table_args__ = (
+        db.Index('ix_issue_created_at_id', 'created_at', 'id'),
+        db.Index('ix_issue_updated_at_id', 'updated_at', 'id'),
+        db.Index('ix_issue_status_created_at', 'status', 'created_at'),
+        db.Index('ix_issue_category_created_at', 'category', 'created_at'),
+        db.Index('ix_issue_priority_created_at', 'priority', 'created_at'),
+        db.Index('ix_issue_status_category_created_at', 'status', 'category', 'created_at'),
+        db.Index('ix_issue_authority_notified', 'authority_notified', 'created_at'),
+        db.Index('ix_issue_geo', 'latitude', 'longitude',
+                 sqlite_where=db.text('latitude IS NOT NULL AND longitude IS NOT NULL'),
+                 postgresql_where=db.text('latitude IS NOT NULL AND longitude IS NOT NULL')),
+        db.Index('ix_issue_geohash', 'geohash', 'category', 'status'),
+        db.Index('ix_issue_category_geohash', 'category', 'geohash'),
+        db.Index('ix_issue_parent_id', 'parent_id'),
+        # Reference lookups for the content-addressed photo store
+        db.Index('ix_issue_photo_filename', 'photo_filename'),
+    )
 
     def __repr__(self):
         return f'<Issue {self.id}: {self.category} - {self.status}>'
@@ -46,9 +73,88 @@ class Issue(db.Model):
             'admin_notes': self.admin_notes,
             'assigned_to': self.assigned_to,
             'authority_notified': self.authority_notified,
-            'notification_sent_at': self.notification_sent_at.strftime('%Y-%m-%d %H:%M:%S') if self.notification_sent_at else None
+            'notification_sent_at': self.notification_sent_at.strftime('%Y-%m-%d %H:%M:%S') if self.notification_sent_at else None,
+            'resolved_at': self.resolved_at.strftime('%Y-%m-%d %H:%M:%S') if self.resolved_at else None,
+            'parent_id': self.parent_id,
+            'report_count': self.report_count
         }
 
+@db.event.listens_for(Issue, 'before_insert')
+@db.event.listens_for(Issue, 'before_update')
+def _set_issue_geohash(mapper, connection, target):
+    """Keep the geohash bucket in step with the coordinates"""
+    if target.latitude is not None and target.longitude is not None:
+        target.geohash = geo.encode(target.latitude, target.longitude)
+    else:
+        target.geohash = None
+
+@db.event.listens_for(Issue.__table__, 'after_create')
+def _create_search_index(target, connection, **kw):
+    """Create the full-text index alongside a freshly created issue table"""
+    search.install_search_index(connection)
+
+class IssueCounter(db.Model):
+    """Pre-computed dashboard counters, maintained by stats_service when enabled"""
+    name = db.Column(db.String(32), primary_key=True)
+    value = db.Column(db.BigInteger, default=0, nullable=False)
+
+    def __repr__(self):
+        return f'<IssueCounter {self.name}={self.value}>'
+
+class IssueDailyRollup(db.Model):
+    """Issues created per day by category, status and priority, maintained by rollups.py"""
+    __tablename__ = 'issue_daily_rollup'
+    day = db.Column(db.Date, primary_key=True)
+    category = db.Column(db.String(50), primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    priority = db.Column(db.String(20), primary_key=True)
+    count = db.Column(db.Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return f'<IssueDailyRollup {self.day} {self.category}/{self.status}/{self.priority}={self.count}>'
+
+class EmailOutbox(db.Model):
+    """Email queued in the same transaction as the change that caused it"""
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(30), nullable=False)
+    issue_id = db.Column(db.Integer, db.ForeignKey('issue.id'), nullable=True)
+    recipients = db.Column(db.Text, nullable=False)  # comma-separated addresses
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), default='pending', nullable=False)  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+
+    @property
+    def recipient_list(self):
+        return [address for address in self.recipients.split(',') if address]
+
+    def __repr__(self):
+        return f'<EmailOutbox {self.id}: {self.kind} - {self.status}>'
+
+class DigestEntry(db.Model):
+    """A new issue waiting to go out in an authority's digest email (see digests.py)"""
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(120), nullable=False)
+    issue_id = db.Column(db.Integer, db.ForeignKey('issue.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    outbox_id = db.Column(db.Integer, db.ForeignKey('email_outbox.id'), nullable=True)  # set once sent in a digest
+
+    __table_args__ = (
+        db.Index('ix_digest_entry_outbox_recipient', 'outbox_id', 'recipient', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f'<DigestEntry {self.recipient} #{self.issue_id}>'
+
 class Admin(UserMixin, db.Model):
     """Model for admin users"""
     id = db.Column(db.Integer, primary_key=True)
@@ -67,6 +173,7 @@ class Admin(UserMixin, db.Model):
         """Check if provided password matches the hash"""
         return check_password_hash(self.password_hash, password)
 
+    @property
     def is_active(self):
         """Return whether admin account is active"""
         return self.active
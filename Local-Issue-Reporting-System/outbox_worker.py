@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Background delivery for the email outbox.
+
+Messages are queued by email_service in the same transaction as the issue
+change. This worker claims due messages, sends the batch over pooled SMTP
+connections (email_service.send_bulk) and records each result. Failed sends
+are retried with exponential backoff up to EMAIL_OUTBOX_MAX_ATTEMPTS. Issues are marked authority_notified only after
+their notification has actually been delivered. Each pass also queues the
+authority digests that are due (see digests.py).
+
+Run it as a separate process (``python outbox_worker.py``), or set
+EMAIL_OUTBOX_WORKER_THREADS to run delivery threads inside the web process.
+"""
+import logging
+import os
+import sys
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import update, or_, and_
+
+sys.path.append('.')
+
+
+def _backoff(config, attempts):
+    """Delay before the next attempt after ``attempts`` failures"""
+    delay = config['EMAIL_OUTBOX_BACKOFF_SECONDS'] * (2 ** (attempts - 1))
+    return timedelta(seconds=min(delay, config['EMAIL_OUTBOX_BACKOFF_MAX_SECONDS']))
+
+
+def _claim(message_id, config):
+    """Atomically move a due message to 'sending'; returns False if another worker got it"""
+    from app import db
+    from models import EmailOutbox
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=config['EMAIL_OUTBOX_LEASE_SECONDS'])
+    result = db.session.execute(
+        update(EmailOutbox)
+        .where(EmailOutbox.id == message_id)
+        .where(or_(
+            and_(EmailOutbox.status == 'pending', EmailOutbox.next_attempt_at <= now),
+            # A worker that died mid-send leaves its claim behind; reclaim it after the lease
+            and_(EmailOutbox.status == 'sending', EmailOutbox.claimed_at < stale)
+        ))
+        .values(status='sending', claimed_at=now)
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def _mark_delivered(message):
+    """Record a successful send and its side effects on the issue"""
+    from app import db
+    from models import Issue
+    from stats_service import record_notification
+    message.status = 'sent'
+    message.sent_at = datetime.utcnow()
+    message.last_error = None
+    if message.kind == 'authority_notification' and message.issue_id:
+        issue = db.session.get(Issue, message.issue_id)
+        if issue and not issue.authority_notified:
+            record_notification()
+            issue.authority_notified = True
+            issue.notification_sent_at = message.sent_at
+            return True
+    if message.kind == 'authority_digest':
+        from digests import mark_digest_delivered
+        notified = mark_digest_delivered(message)
+        if notified:
+            record_notification(notified)
+            return True
+    return False
+
+
+def record_result(message, error, config):
+    """Record the outcome of sending a claimed message; returns True on success"""
+    from app import db
+    if error is not None:
+        message.attempts += 1
+        message.last_error = str(error)
+        if message.attempts >= config['EMAIL_OUTBOX_MAX_ATTEMPTS']:
+            message.status = 'failed'
+            logging.error(f"Giving up on outbox message #{message.id} after {message.attempts} attempts: {str(error)}")
+        else:
+            message.status = 'pending'
+            message.next_attempt_at = datetime.utcnow() + _backoff(config, message.attempts)
+            logging.warning(f"Outbox message #{message.id} failed (attempt {message.attempts}), retrying at {message.next_attempt_at}: {str(error)}")
+        db.session.commit()
+        return False
+    notified = _mark_delivered(message)
+    db.session.commit()
+    if notified:
+        from analytics_service import invalidate_analytics
+        invalidate_analytics()
+    logging.info(f"Outbox message #{message.id} ({message.kind}) delivered to {len(message.recipient_list)} recipients")
+    return True
+
+
+def deliver_pending(batch_size=None):
+    """Deliver up to ``batch_size`` due messages; returns how many were sent"""
+    from flask import current_app
+    from app import db
+    from email_service import send_bulk
+    from models import EmailOutbox
+    config = current_app.config
+    batch_size = batch_size or config['EMAIL_OUTBOX_BATCH_SIZE']
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=config['EMAIL_OUTBOX_LEASE_SECONDS'])
+    candidate_ids = [row.id for row in db.session.query(EmailOutbox.id).filter(or_(
+        and_(EmailOutbox.status == 'pending', EmailOutbox.next_attempt_at <= now),
+        and_(EmailOutbox.status == 'sending', EmailOutbox.claimed_at < stale)
+    )).order_by(EmailOutbox.id).limit(batch_size).all()]
+    db.session.commit()
+
+    claimed = [db.session.get(EmailOutbox, message_id)
+               for message_id in candidate_ids if _claim(message_id, config)]
+    if not claimed:
+        return 0
+    # One pooled connection carries the whole batch; each message goes to
+    # all of its recipients in a single SMTP transaction
+    errors = send_bulk([(message.recipient_list, message.subject, message.body) for message in claimed])
+    return sum(record_result(message, error, config) for message, error in zip(claimed, errors))
+
+
+def run_worker(flask_app, stop_event=None):
+    """Poll the outbox until ``stop_event`` is set, queueing due digests first"""
+    from digests import flush_due_digests
+    stop_event = stop_event or threading.Event()
+    interval = flask_app.config['EMAIL_OUTBOX_POLL_INTERVAL']
+    while not stop_event.is_set():
+        with flask_app.app_context():
+            try:
+                flush_due_digests()
+                delivered = deliver_pending()
+            except Exception as e:
+                logging.error(f"Outbox worker error: {str(e)}")
+                delivered = 0
+        # Keep draining without sleeping while there is a backlog
+        if not delivered:
+            stop_event.wait(interval)
+
+
+def start_worker_threads(flask_app, count):
+    """Start ``count`` daemon delivery threads in this process"""
+    stop_event = threading.Event()
+    for index in range(count):
+        thread = threading.Thread(target=run_worker, args=(flask_app, stop_event),
+                                  name=f'outbox-worker-{index}', daemon=True)
+        thread.start()
+    return stop_event
+
+
+def start_worker_threads_on_first_request(flask_app, count):
+    """Start ``count`` delivery threads when this process serves its first request
+
+    Threads do not survive fork, so with "gunicorn --preload" they have to be
+    started in each worker rather than in the master that built the app.
+    """
+    lock = threading.Lock()
+    started = {}
+
+    def start():
+        pid = os.getpid()
+        if started.get('pid') != pid:
+            with lock:
+                if started.get('pid') != pid:
+                    started['stop_event'] = start_worker_threads(flask_app, count)
+                    started['pid'] = pid
+
+    flask_app.before_request(start)
+
+
+if __name__ == "__main__":
+    from app import create_app
+    app = create_app()
+    logging.info("Starting email outbox worker")
+    try:
+        run_worker(app)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,80 @@
+"""
+Keyset (cursor) pagination.
+
+A page is fetched with ``WHERE (sort keys) > (last row's keys) ORDER BY sort keys
+LIMIT n``. Every page therefore costs the same as the first, however deep the
+client goes. The last key must be unique (the primary key) so that ties in the
+sort column are not skipped or repeated.
+"""
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        return datetime.fromisoformat(value['dt'])
+    return value
+
+
+def encode_cursor(*values):
+    """Encode the sort-key values of a row as an opaque URL-safe cursor"""
+    raw = json.dumps([_encode_value(value) for value in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, size=2):
+    """Decode a cursor produced by encode_cursor, raising ValueError if malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        if not isinstance(values, list) or len(values) != size:
+            raise ValueError
+        return tuple(_decode_value(value) for value in values)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+
+
+def keyset_condition(columns, values, descending=False):
+    """SQL condition selecting rows that sort strictly after ``values``
+
+    ``columns`` are the ORDER BY expressions, all sorted in the same direction.
+    """
+    column, value = columns[0], values[0]
+    beyond = column < value if descending else column > value
+    if len(columns) == 1:
+        return beyond
+    return or_(beyond, and_(column == value, keyset_condition(columns[1:], values[1:], descending)))
+
+
+def keyset_after(query, model, cursor):
+    """Restrict an ascending (created_at, id) query to rows after the cursor"""
+    return query.filter(keyset_condition((model.created_at, model.id), decode_cursor(cursor)))
+
+
+def keyset_page(query, sort_keys, limit, cursor=None, descending=False):
+    """Fetch one page of ``query`` ordered by ``sort_keys``; returns (rows, next_cursor)
+
+    ``sort_keys`` is a list of (name, expression) pairs ending with a unique
+    column. Each row must expose every key under its name, so select
+    expressions with ``.label(name)``.
+    """
+    columns = [expression for _, expression in sort_keys]
+    if cursor:
+        query = query.filter(keyset_condition(columns, decode_cursor(cursor, len(columns)), descending))
+    query = query.order_by(*[column.desc() if descending else column.asc() for column in columns])
+    # Fetch one extra row to know whether another page exists
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(*[getattr(rows[-1], name) for name, _ in sort_keys])
+    return rows, next_cursor
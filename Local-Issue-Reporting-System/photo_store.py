@@ -0,0 +1,243 @@
+"""
+Content-addressed, sharded storage for issue photos.
+
+A photo is stored once under the SHA-256 of its bytes. The file fans out
+into two levels of shard directories, e.g. ``3f/a2/3fa2...e9.jpg``, so no
+directory grows past a few hundred entries. Uploading the same bytes again
+yields the same name, and nothing new is written.
+
+Issue.photo_filename holds that relative name and is the reference count:
+a stored photo is live while at least one issue points at it.
+collect_garbage() removes files no issue references, and their variants.
+migrate_flat_uploads() moves files from the old flat uuid-named layout into
+the store and rewrites the issue rows that point at them.
+"""
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import time
+
+from sqlalchemy import func, update, bindparam
+
+from app import db
+
+# Relative names of stored originals and of their resized variants
+_STORED_NAME = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.[a-z0-9]+$')
+_VARIANT_NAME = re.compile(r'\.(thumb|medium|large)\.(webp|jpg)$')
+_DIGEST = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64}(?:\.(?:thumb|medium|large))?)\.[a-z0-9]+$')
+
+_EXTENSION_ALIASES = {'jpeg': 'jpg'}
+
+TEMP_DIR = 'tmp'
+
+
+def normalize_extension(ext):
+    ext = ext.lower().lstrip('.')
+    return _EXTENSION_ALIASES.get(ext, ext)
+
+
+def stored_name(digest, ext):
+    """Relative path for content with the given hex digest"""
+    return f"{digest[:2]}/{digest[2:4]}/{digest}.{normalize_extension(ext)}"
+
+
+def is_stored_name(name):
+    return bool(_STORED_NAME.match(name))
+
+
+def stored_digest(name):
+    """Content hash of a stored original or variant ('<hash>.thumb'), or None"""
+    match = _DIGEST.match(name)
+    return match.group(1) if match else None
+
+
+def is_variant_name(name):
+    return bool(_VARIANT_NAME.search(name))
+
+
+def store_stream(stream, ext, upload_folder, chunk_size=64 * 1024):
+    """Stream content into the store, hashing as it is written; returns the stored name
+
+    The content is written to a temporary file first. If a file with the same
+    hash already exists, the temporary copy is discarded and the existing
+    file's mtime is refreshed, so collect_garbage() treats it as a new upload
+    until the issue that references it has committed.
+    """
+    temp_dir = os.path.join(upload_folder, TEMP_DIR)
+    os.makedirs(temp_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    handle, temp_path = tempfile.mkstemp(dir=temp_dir, suffix='.part')
+    try:
+        with os.fdopen(handle, 'wb') as output:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                output.write(chunk)
+        name = stored_name(digest.hexdigest(), ext)
+        target = os.path.join(upload_folder, name)
+        if os.path.exists(target):
+            os.utime(target)
+            return name
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(temp_path, target)
+        return name
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def store_file(path, upload_folder):
+    """Copy an existing file into the store; returns the stored name
+
+    The original is left in place, so the caller can remove it once the rows
+    that point at the new name have committed.
+    """
+    with open(path, 'rb') as source:
+        return store_stream(source, os.path.splitext(path)[1], upload_folder)
+
+
+def reference_counts(names):
+    """Return {name: number of issues referencing it} for the given stored names"""
+    from models import Issue
+    counts = dict.fromkeys(names, 0)
+    if names:
+        rows = db.session.query(Issue.photo_filename, func.count(Issue.id)).filter(
+            Issue.photo_filename.in_(names)
+        ).group_by(Issue.photo_filename).all()
+        counts.update(rows)
+    return counts
+
+
+def _variant_paths(upload_folder, name):
+    from uploads import VARIANT_SIZES, variant_filename
+    return [os.path.join(upload_folder, variant_filename(name, size)) for size in VARIANT_SIZES]
+
+
+def _iter_store(upload_folder):
+    """Yield (relative name, absolute path) for every stored original"""
+    for first in sorted(os.listdir(upload_folder)):
+        first_path = os.path.join(upload_folder, first)
+        if len(first) != 2 or not os.path.isdir(first_path):
+            continue
+        for second in sorted(os.listdir(first_path)):
+            second_path = os.path.join(first_path, second)
+            if not os.path.isdir(second_path):
+                continue
+            for filename in os.listdir(second_path):
+                name = f"{first}/{second}/{filename}"
+                if is_stored_name(name):
+                    yield name, os.path.join(second_path, filename)
+
+
+def _prune_shards(upload_folder, name):
+    """Remove the shard directories of ``name`` once they are empty"""
+    shard = os.path.join(upload_folder, os.path.dirname(name))
+    for directory in (shard, os.path.dirname(shard)):
+        try:
+            os.rmdir(directory)
+        except OSError:  # not empty
+            return
+
+
+def collect_garbage(upload_folder, grace_seconds=86400, dry_run=False, batch_size=500):
+    """Delete stored photos (and variants) that no issue references
+
+    Files younger than ``grace_seconds`` are kept. An upload is written before
+    its issue row commits, so a new file can look unreferenced for a moment.
+    Returns (files removed, bytes freed).
+    """
+    removed = freed = 0
+    cutoff = time.time() - grace_seconds
+
+    def sweep(batch):
+        nonlocal removed, freed
+        for name, count in reference_counts([name for name, _ in batch]).items():
+            if count:
+                continue
+            path = dict(batch)[name]
+            # A new upload of the same bytes may have claimed it since the scan
+            if os.path.getmtime(path) > cutoff:
+                continue
+            for candidate in [path] + _variant_paths(upload_folder, name):
+                if os.path.exists(candidate):
+                    freed += os.path.getsize(candidate)
+                    removed += 1
+                    logging.info(f"{'Would remove' if dry_run else 'Removing'} orphaned photo file {candidate}")
+                    if not dry_run:
+                        os.remove(candidate)
+            if not dry_run:
+                _prune_shards(upload_folder, name)
+
+    batch = []
+    for name, path in _iter_store(upload_folder):
+        if os.path.getmtime(path) > cutoff:
+            continue
+        batch.append((name, path))
+        if len(batch) >= batch_size:
+            sweep(batch)
+            batch = []
+    if batch:
+        sweep(batch)
+
+    # Abandoned partial uploads
+    temp_dir = os.path.join(upload_folder, TEMP_DIR)
+    if os.path.isdir(temp_dir):
+        for filename in os.listdir(temp_dir):
+            path = os.path.join(temp_dir, filename)
+            if os.path.getmtime(path) <= cutoff:
+                freed += os.path.getsize(path)
+                removed += 1
+                if not dry_run:
+                    os.remove(path)
+    return removed, freed
+
+
+def migrate_flat_uploads(upload_folder):
+    """Move files from the flat upload directory into the store and repoint issues
+
+    Each batch of originals is copied into the store, the issue rows are
+    repointed and committed, and only then are the originals removed, so an
+    interrupted run leaves every issue pointing at a file that exists; rerun
+    it to finish. Old variants are deleted rather than moved; regenerate them
+    with 'flask generate-photo-variants'. Returns the number of files moved.
+    """
+    from models import Issue
+    table = Issue.__table__
+    # Leave updated_at untouched: the issue itself has not changed
+    repoint = update(table).where(table.c.photo_filename == bindparam('old_name')).values(
+        photo_filename=bindparam('new_name'), updated_at=table.c.updated_at)
+    moved = 0
+    renames = []
+
+    def commit_batch():
+        db.session.execute(repoint, [{'old_name': old, 'new_name': new} for old, new, _ in renames])
+        db.session.commit()
+        # Only now are the originals unreferenced; a crash before this point
+        # leaves them in place for a rerun to pick up
+        for _, _, path in renames:
+            os.remove(path)
+        renames.clear()
+
+    for filename in sorted(os.listdir(upload_folder)):
+        path = os.path.join(upload_folder, filename)
+        if not os.path.isfile(path) or filename.endswith('.part'):
+            continue
+        if is_variant_name(filename):
+            os.remove(path)
+            continue
+        renames.append((filename, store_file(path, upload_folder), path))
+        moved += 1
+        if len(renames) >= 500:
+            commit_batch()
+    if renames:
+        commit_batch()
+    legacy_variants = os.path.join(upload_folder, 'variants')
+    if os.path.isdir(legacy_variants):
+        for filename in os.listdir(legacy_variants):
+            os.remove(os.path.join(legacy_variants, filename))
+        os.rmdir(legacy_variants)
+    return moved
@@ -0,0 +1,69 @@
+"""
+EXPLAIN checks for the hot Issue queries.
+
+Each query mirrors one issued by the list and analytics views. check_query_plans()
+asks the connected database for its plan and reports whether an index is used,
+for both SQLite (EXPLAIN QUERY PLAN) and PostgreSQL (EXPLAIN). The same checks
+run from "flask check-query-plans" against the configured database and from
+tests/test_query_plans.py against both dialects.
+"""
+from sqlalchemy import select, func, literal
+
+from app import db
+
+# Plan fragments that show an index is being used, per dialect
+INDEX_MARKERS = {
+    'sqlite': ('USING INDEX', 'USING COVERING INDEX', 'USING INTEGER PRIMARY KEY'),
+    'postgresql': ('Index Scan', 'Index Only Scan', 'Bitmap Index Scan'),
+}
+
+
+def hot_queries():
+    """Return (name, statement) pairs for the queries the views run most"""
+    from models import Issue
+    newest_first = (Issue.created_at.desc(),)
+    return [
+        ('list_all', select(Issue).order_by(*newest_first).limit(20)),
+        ('list_by_status', select(Issue).where(Issue.status == 'submitted').order_by(*newest_first).limit(20)),
+        ('list_by_category', select(Issue).where(Issue.category == 'roads').order_by(*newest_first).limit(20)),
+        ('list_by_priority', select(Issue).where(Issue.priority == 'high').order_by(*newest_first).limit(20)),
+        ('list_by_status_category', select(Issue).where(
+            Issue.status == 'submitted', Issue.category == 'roads').order_by(*newest_first).limit(20)),
+        ('count_by_status', select(func.count(Issue.id)).where(Issue.status == 'resolved')),
+        ('count_notified', select(func.count(Issue.id)).where(Issue.authority_notified == literal(True))),
+        ('geo_points', select(Issue.latitude, Issue.longitude).where(
+            Issue.latitude.isnot(None), Issue.longitude.isnot(None))),
+    ]
+
+
+def explain(statement):
+    """Return the database's plan for a statement as a list of text lines"""
+    dialect = db.engine.dialect.name
+    sql = str(statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+    with db.engine.connect() as conn:
+        if dialect == 'sqlite':
+            rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}").all()
+            return [row[-1] for row in rows]
+        if dialect == 'postgresql':
+            # Small development tables make a sequential scan look cheaper;
+            # disable it so the check shows whether an index is usable at all.
+            with conn.begin():
+                conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+                rows = conn.exec_driver_sql(f"EXPLAIN {sql}").all()
+            return [row[0] for row in rows]
+    raise NotImplementedError(f"EXPLAIN checks are not supported for dialect {dialect}")
+
+
+def uses_index(plan):
+    """True when a plan from explain() reads through an index"""
+    markers = INDEX_MARKERS.get(db.engine.dialect.name, ())
+    return any(marker in line for line in plan for marker in markers)
+
+
+def check_query_plans():
+    """Explain every hot query and return a list of (name, uses_index, plan_lines)"""
+    results = []
+    for name, statement in hot_queries():
+        plan = explain(statement)
+        results.append((name, uses_index(plan), plan))
+    return results
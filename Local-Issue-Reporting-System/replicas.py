@@ -0,0 +1,175 @@
+"""
+Read replica routing.
+
+With DATABASE_REPLICA_URLS set, each replica becomes a "replica_<n>" bind and
+db.session becomes a RoutingSession. GET and HEAD requests read from a
+healthy replica, taken in turn. Everything else goes to the primary: other
+methods, flushes, INSERT/UPDATE/DELETE, SELECT ... FOR UPDATE, every read
+after the request's first write, and code that runs outside a request (CLI,
+workers, the group-commit writer).
+
+Read-your-writes: after a POST (or PUT, PATCH, DELETE) the client's session
+cookie remembers a deadline. Until then its GET requests also read from the
+primary, so a reporter or admin who was just redirected sees their own
+change even if the replicas lag. REPLICA_STICKY_SECONDS sets how long that
+lasts.
+
+Health: a replica is checked at most every REPLICA_HEALTH_INTERVAL seconds
+with "SELECT 1". On PostgreSQL it is also skipped while its replay lag is
+above REPLICA_MAX_LAG_SECONDS. A connection error or an OperationalError on
+a replica fails that one request and marks the replica down until the next
+check. With no healthy replica, reads fall back to the primary.
+
+To try it locally with SQLite, point DATABASE_REPLICA_URLS at a second file
+and refresh it with "flask sync-replicas".
+"""
+import itertools
+import logging
+import threading
+import time
+
+from flask import current_app, g, has_app_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, exc, text
+
+REPLICA_BIND_PREFIX = 'replica_'
+STICKY_SESSION_KEY = '_primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RoutingSession(Session):
+    """db.session that reads from the replica chosen for the current request"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            replica = g.get('read_replica')
+            if replica is not None and not self.info.get('wrote'):
+                if not (self._flushing or getattr(clause, 'is_dml', False)
+                        or getattr(clause, '_for_update_arg', None) is not None):
+                    return self._db.engines[replica]
+                # Stay on the primary for the rest of the request, so later
+                # reads see this write
+                self.info['wrote'] = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class ReplicaSet:
+    """Health-checked round robin over the replica binds"""
+
+    def __init__(self, engines, config):
+        self.engines = engines
+        self.interval = config['REPLICA_HEALTH_INTERVAL']
+        self.max_lag = config['REPLICA_MAX_LAG_SECONDS']
+        self.healthy = dict.fromkeys(engines, True)
+        self.checked_at = dict.fromkeys(engines, 0.0)
+        self.check_lock = threading.Lock()
+        self.order = itertools.cycle(sorted(engines))
+        for key, engine in engines.items():
+            event.listen(engine, 'handle_error', self._error_listener(key))
+
+    def choose(self):
+        """Bind key of a healthy replica, or None to use the primary"""
+        for _ in range(len(self.engines)):
+            key = next(self.order)
+            if self._is_healthy(key):
+                return key
+        return None
+
+    def mark_down(self, key, reason):
+        if self.healthy[key]:
+            logging.warning(f'Read replica {key} marked down: {reason}')
+        self.healthy[key] = False
+        self.checked_at[key] = time.monotonic()
+
+    def _is_healthy(self, key):
+        if time.monotonic() - self.checked_at[key] >= self.interval and self.check_lock.acquire(blocking=False):
+            # One thread re-checks; the others keep using the last result
+            try:
+                self._check(key)
+            finally:
+                self.check_lock.release()
+        return self.healthy[key]
+
+    def _check(self, key):
+        engine = self.engines[key]
+        try:
+            with engine.connect() as connection:
+                connection.execute(text('SELECT 1'))
+                lag = None
+                if engine.dialect.name == 'postgresql':
+                    lag = connection.execute(text(
+                        'SELECT CASE WHEN pg_is_in_recovery() THEN '
+                        'EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END'
+                    )).scalar()
+        except Exception as e:
+            self.mark_down(key, str(e))
+            return
+        if lag is not None and lag > self.max_lag:
+            self.mark_down(key, f'replication lag {lag:.1f}s')
+            return
+        if not self.healthy[key]:
+            logging.info(f'Read replica {key} is back')
+        self.healthy[key] = True
+        self.checked_at[key] = time.monotonic()
+
+    def _error_listener(self, key):
+        def handle_error(context):
+            if context.is_disconnect or isinstance(context.sqlalchemy_exception, exc.OperationalError):
+                self.mark_down(key, str(context.original_exception))
+        return handle_error
+
+
+def configure(config):
+    """Add a bind for every DATABASE_REPLICA_URLS entry; call before db.init_app()"""
+    options = config.get('SQLALCHEMY_ENGINE_OPTIONS') or {}
+    binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+    for index, uri in enumerate(config['SQLALCHEMY_REPLICA_URIS']):
+        binds[f'{REPLICA_BIND_PREFIX}{index}'] = dict(options, url=uri)
+    config['SQLALCHEMY_BINDS'] = binds
+
+
+def init_app(app):
+    """Route GET requests to the replicas; call after db.init_app()"""
+    if not app.config['SQLALCHEMY_REPLICA_URIS']:
+        return
+    from app import db
+    with app.app_context():
+        engines = {key: engine for key, engine in db.engines.items()
+                   if key and key.startswith(REPLICA_BIND_PREFIX)}
+    app.extensions['replicas'] = ReplicaSet(engines, app.config)
+    app.before_request(_choose_replica)
+    app.after_request(_stick_to_primary)
+
+
+def _choose_replica():
+    if request.method not in SAFE_METHODS:
+        return
+    if session.get(STICKY_SESSION_KEY, 0) > time.time():
+        return
+    g.read_replica = current_app.extensions['replicas'].choose()
+
+
+def _stick_to_primary(response):
+    if request.method not in SAFE_METHODS:
+        session[STICKY_SESSION_KEY] = int(time.time() + current_app.config['REPLICA_STICKY_SECONDS']) + 1
+    return response
+
+
+def sync_sqlite_replicas(app):
+    """Copy the SQLite primary over every SQLite replica; returns the replicas copied"""
+    import sqlite3
+    from app import db
+    with app.app_context():
+        primary = db.engine.url.database
+        replicas = [engine.url.database for key, engine in db.engines.items()
+                    if key and key.startswith(REPLICA_BIND_PREFIX) and engine.dialect.name == 'sqlite']
+    copied = []
+    for path in replicas:
+        source, target = sqlite3.connect(primary), sqlite3.connect(path)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+        copied.append(path)
+    return copied
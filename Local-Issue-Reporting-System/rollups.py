@@ -0,0 +1,194 @@
+"""
+Daily rollup of issue counts for trend analytics.
+
+issue_daily_rollup holds one row per (day, category, status, priority): the
+number of issues created that day that currently have that status and
+priority. The write paths keep it current in the same transaction as the
+issue change. A status or priority change moves one count from the old row
+to the new one. 'flask rebuild-rollups' recomputes the table from scratch.
+
+Trend queries read only the rollup. Their cost depends on the number of days
+in the window, not on the number of issues.
+"""
+import re
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, delete, insert, select, update
+
+from app import db
+
+GRANULARITIES = ('day', 'week', 'month')
+
+_WINDOW = re.compile(r'^(\d+)([dwm])$')
+
+
+def _apply_deltas(deltas):
+    """Add each delta to its rollup row, creating missing rows
+
+    ``deltas`` maps (day, category, status, priority) to a count change. On
+    SQLite and PostgreSQL every row is upserted by one executemany statement.
+    """
+    from models import IssueDailyRollup
+    table = IssueDailyRollup.__table__
+    rows = [{'day': day, 'category': category, 'status': status, 'priority': priority, 'count': delta}
+            for (day, category, status, priority), delta in deltas.items() if delta]
+    if not rows:
+        return
+    dialect = db.engine.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        statement = dialect_insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=['day', 'category', 'status', 'priority'],
+            set_={'count': table.c['count'] + statement.excluded['count']}
+        )
+        db.session.execute(statement, rows)
+        return
+    for row in rows:
+        key = {name: row[name] for name in ('day', 'category', 'status', 'priority')}
+        result = db.session.execute(
+            update(table).where(*[table.c[name] == value for name, value in key.items()])
+            .values(count=table.c['count'] + row['count'])
+        )
+        if result.rowcount == 0:
+            db.session.execute(insert(table).values(**row))
+
+
+def _apply_delta(day, category, status, priority, delta):
+    """Add ``delta`` to one rollup row, creating the row when missing"""
+    _apply_deltas({(day, category, status, priority): delta})
+
+
+def record_issue_created(issue):
+    """Count a new issue; call after a flush so created_at is set, before the commit"""
+    _apply_delta(issue.created_at.date(), issue.category, issue.status, issue.priority, 1)
+
+
+def record_issue_changed(issue, old_status, old_priority):
+    """Move an issue's count after its status or priority changed"""
+    if (old_status, old_priority) == (issue.status, issue.priority):
+        return
+    day = issue.created_at.date()
+    _apply_delta(day, issue.category, old_status, old_priority, -1)
+    _apply_delta(day, issue.category, issue.status, issue.priority, 1)
+
+
+def record_bulk_change(groups, new_status=None, new_priority=None):
+    """Move counts after a bulk update
+
+    ``groups`` maps (day, category, old status, old priority) to the number of
+    changed issues. A new value of None means that field was left unchanged.
+    """
+    deltas = {}
+    for (day, category, status, priority), count in groups.items():
+        target = (day, category, new_status or status, new_priority or priority)
+        if target == (day, category, status, priority):
+            continue
+        deltas[(day, category, status, priority)] = deltas.get((day, category, status, priority), 0) - count
+        deltas[target] = deltas.get(target, 0) + count
+    _apply_deltas(deltas)
+
+
+def rebuild_rollups():
+    """Recompute the whole rollup table from the issue table; returns the row count"""
+    from models import Issue, IssueDailyRollup
+    table = IssueDailyRollup.__table__
+    day = func.date(Issue.created_at)
+    source = select(
+        day, Issue.category, Issue.status, Issue.priority, func.count(Issue.id)
+    ).group_by(day, Issue.category, Issue.status, Issue.priority)
+    db.session.execute(delete(table))
+    db.session.execute(insert(table).from_select(
+        ['day', 'category', 'status', 'priority', 'count'], source))
+    db.session.commit()
+    return db.session.query(func.count()).select_from(table).scalar()
+
+
+def period_start(day, granularity):
+    """First day of the day/week (Monday)/month bucket containing ``day``"""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _next_period(day, granularity):
+    if granularity == 'week':
+        return day + timedelta(days=7)
+    if granularity == 'month':
+        return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return day + timedelta(days=1)
+
+
+def _months_before(day, months):
+    index = day.year * 12 + day.month - 1 - months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def parse_window(window, today=None):
+    """Turn '30d', '8w' or '12m' into a (start, end) date range ending today
+
+    Week and month windows start on a bucket boundary. The current period
+    counts as one of the N, so '12m' means this month plus the 11 before it.
+    """
+    match = _WINDOW.match(window or '')
+    if not match:
+        raise ValueError('window must look like 30d, 8w or 12m')
+    amount, unit = int(match.group(1)), match.group(2)
+    if amount < 1:
+        raise ValueError('window must cover at least one period')
+    today = today or datetime.utcnow().date()
+    if unit == 'd':
+        return today - timedelta(days=amount - 1), today
+    if unit == 'w':
+        return period_start(today, 'week') - timedelta(weeks=amount - 1), today
+    return _months_before(today.replace(day=1), amount - 1), today
+
+
+def _bucket(day, granularity):
+    """SQL expression for the start of the bucket containing ``day``"""
+    if granularity == 'day':
+        return day
+    if db.engine.dialect.name == 'postgresql':
+        return func.date_trunc(granularity, day)
+    if granularity == 'week':
+        # The next Sunday (or the day itself), back to its Monday
+        return func.date(day, 'weekday 0', '-6 days')
+    return func.date(day, 'start of month')
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    return value
+
+
+def trend_series(start, end, granularity='day', category=None, status=None, priority=None):
+    """Issue counts per period between two dates (inclusive), with empty periods as 0"""
+    from models import IssueDailyRollup
+    if granularity not in GRANULARITIES:
+        raise ValueError(f'granularity must be one of {", ".join(GRANULARITIES)}')
+    if start > end:
+        raise ValueError('start must not be after end')
+    bucket = _bucket(IssueDailyRollup.day, granularity).label('period')
+    query = db.session.query(bucket, func.sum(IssueDailyRollup.count)).filter(
+        IssueDailyRollup.day >= start,
+        IssueDailyRollup.day <= end
+    )
+    for column, value in (('category', category), ('status', status), ('priority', priority)):
+        if value and value != 'all':
+            query = query.filter(getattr(IssueDailyRollup, column) == value)
+    counts = {_as_date(period): int(total or 0) for period, total in query.group_by(bucket).all()}
+
+    series = []
+    period = period_start(start, granularity)
+    while period <= end:
+        series.append({'period': period.isoformat(), 'count': counts.get(period, 0)})
+        period = _next_period(period, granularity)
+    return series
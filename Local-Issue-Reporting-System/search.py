@@ -0,0 +1,118 @@
+"""
+Full-text search over issue description, location and admin_notes.
+
+The inverted index lives in the database itself:
+- SQLite: an external-content FTS5 table (issue_fts), kept in sync by
+  insert/update/delete triggers on issue
+- PostgreSQL: a generated tsvector column (issue.search_vector) with a GIN
+  index, which the database keeps current on every write
+
+install_search_index() creates the index. It runs from the issue table's
+after_create hook for new databases and from 'flask upgrade-db' for existing
+ones. Searches always go through the index; there is no LIKE fallback.
+"""
+import re
+
+from sqlalchemy import text, Integer, Float
+
+_SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS issue_fts USING fts5(
+        description, location, admin_notes,
+        content='issue', content_rowid='id', tokenize='porter unicode61'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS issue_fts_ai AFTER INSERT ON issue BEGIN
+        INSERT INTO issue_fts(rowid, description, location, admin_notes)
+        VALUES (new.id, new.description, new.location, new.admin_notes);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS issue_fts_ad AFTER DELETE ON issue BEGIN
+        INSERT INTO issue_fts(issue_fts, rowid, description, location, admin_notes)
+        VALUES ('delete', old.id, old.description, old.location, old.admin_notes);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS issue_fts_au AFTER UPDATE OF description, location, admin_notes ON issue BEGIN
+        INSERT INTO issue_fts(issue_fts, rowid, description, location, admin_notes)
+        VALUES ('delete', old.id, old.description, old.location, old.admin_notes);
+        INSERT INTO issue_fts(rowid, description, location, admin_notes)
+        VALUES (new.id, new.description, new.location, new.admin_notes);
+    END""",
+]
+
+_POSTGRES_DDL = [
+    """ALTER TABLE issue ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(description, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(location, '')), 'B') ||
+            setweight(to_tsvector('english', coalesce(admin_notes, '')), 'C')
+        ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_issue_search_vector ON issue USING GIN (search_vector)",
+]
+
+_TERM = re.compile(r'\w+', re.UNICODE)
+
+
+def install_search_index(connection, rebuild=False):
+    """Create the full-text index for the connection's dialect
+
+    With ``rebuild`` the SQLite index is re-populated from the issue table.
+    That is needed once when the index is added to an existing database.
+    """
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        for statement in _SQLITE_DDL:
+            connection.execute(text(statement))
+        if rebuild:
+            connection.execute(text("INSERT INTO issue_fts(issue_fts) VALUES ('rebuild')"))
+    elif dialect == 'postgresql':
+        for statement in _POSTGRES_DDL:
+            connection.execute(text(statement))
+    else:
+        raise NotImplementedError(f"Full-text search is not supported on {dialect}")
+
+
+def _fts5_query(terms):
+    """Quote each term for FTS5; the last term matches as a prefix for search-as-you-type"""
+    quoted = ['"' + term.replace('"', '""') + '"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def parse_terms(query):
+    """Split a user query into search terms, dropping operators and punctuation"""
+    return _TERM.findall(query or '')
+
+
+def search_matches(dialect, query):
+    """Return a subquery of (id, rank) for issues matching ``query``, higher rank first
+
+    Returns None when the query has no searchable terms.
+    """
+    terms = parse_terms(query)
+    if not terms:
+        return None
+    if dialect == 'sqlite':
+        # bm25() is lower-is-better; negate it so rank sorts the same way on both backends
+        statement = text(
+            "SELECT rowid AS id, -bm25(issue_fts, 10.0, 5.0, 2.0) AS rank "
+            "FROM issue_fts WHERE issue_fts MATCH :terms"
+        ).bindparams(terms=_fts5_query(terms))
+    elif dialect == 'postgresql':
+        statement = text(
+            "SELECT id, ts_rank(search_vector, query) AS rank "
+            "FROM issue, websearch_to_tsquery('english', :terms) AS query "
+            "WHERE search_vector @@ query"
+        ).bindparams(terms=' '.join(terms))
+    else:
+        raise NotImplementedError(f"Full-text search is not supported on {dialect}")
+    return statement.columns(id=Integer, rank=Float).subquery('matches')
+
+
+def apply_search(query, search_query):
+    """Restrict an Issue query to full-text matches for ``search_query``
+
+    Returns the query and the matches subquery (None when there is nothing to search for).
+    """
+    from app import db
+    from models import Issue
+    matches = search_matches(db.engine.dialect.name, search_query)
+    if matches is None:
+        return query, None
+    return query.join(matches, Issue.id == matches.c.id), matches
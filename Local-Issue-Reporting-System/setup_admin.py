@@ -6,12 +6,12 @@ import os
 import sys
 sys.path.append('.')
 
-from app import app, db
+from app import create_app, db
 from models import Admin
-from werkzeug.security import generate_password_hash
 
 def create_admin_account():
-    """Create the first admin account"""
+    """Create the first admin account (run "flask upgrade-db" first)"""
+    app = create_app()
     with app.app_context():
         # Check if admin already exists
         existing_admin = Admin.query.first()
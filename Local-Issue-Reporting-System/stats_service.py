@@ -0,0 +1,85 @@
+"""
+Dashboard counters for the admin, public and analytics pages.
+
+get_issue_counts() returns total / per-status / notified counts. By default it
+computes them with one conditional-aggregation query. With
+ISSUE_COUNTERS_ENABLED the values come from the issue_counter table instead.
+The write paths keep that table current in the same transaction as the issue
+change, so reads cost the same however large the issue table grows.
+"""
+from flask import current_app
+from sqlalchemy import func, case, update
+
+from app import db
+
+STATUSES = ('submitted', 'in_progress', 'resolved', 'rejected')
+COUNTER_NAMES = ('total',) + STATUSES + ('notified',)
+
+
+def counters_enabled():
+    """Return whether the counters table is the source of dashboard counts"""
+    return current_app.config.get('ISSUE_COUNTERS_ENABLED', False)
+
+
+def aggregate_counts():
+    """Count totals, statuses and notified issues in a single table pass"""
+    from models import Issue
+    columns = [func.count(Issue.id).label('total')]
+    columns += [func.sum(case((Issue.status == status, 1), else_=0)).label(status) for status in STATUSES]
+    columns.append(func.sum(case((Issue.authority_notified.is_(True), 1), else_=0)).label('notified'))
+    row = db.session.query(*columns).one()
+    return {name: int(value or 0) for name, value in row._mapping.items()}
+
+
+def get_issue_counts():
+    """Return a dict of total, submitted, in_progress, resolved, rejected and notified counts"""
+    if counters_enabled():
+        from models import IssueCounter
+        counts = dict(db.session.query(IssueCounter.name, IssueCounter.value).all())
+        if all(name in counts for name in COUNTER_NAMES):
+            return {name: int(counts[name]) for name in COUNTER_NAMES}
+        current_app.logger.warning('Issue counters table is not seeded; run "flask rebuild-counters"')
+    return aggregate_counts()
+
+
+def _bump(deltas):
+    """Apply counter deltas in the current transaction (the caller commits)"""
+    from models import IssueCounter
+    for name, delta in deltas.items():
+        if delta:
+            db.session.execute(
+                update(IssueCounter)
+                .where(IssueCounter.name == name)
+                .values(value=IssueCounter.value + delta)
+            )
+
+
+def record_issue_created(issue):
+    """Count a newly added issue; call before the commit that inserts it"""
+    if not counters_enabled():
+        return
+    _bump({'total': 1, issue.status: 1, 'notified': 1 if issue.authority_notified else 0})
+
+
+def record_status_change(old_status, new_status, count=1):
+    """Move ``count`` issues from one status counter to another"""
+    if not counters_enabled() or old_status == new_status:
+        return
+    _bump({old_status: -count, new_status: count})
+
+
+def record_notification(count=1):
+    """Count issues whose authorities have just been notified"""
+    if not counters_enabled():
+        return
+    _bump({'notified': count})
+
+
+def rebuild_counters():
+    """Recompute every counter from the issue table and store it"""
+    from models import IssueCounter
+    counts = aggregate_counts()
+    for name in COUNTER_NAMES:
+        db.session.merge(IssueCounter(name=name, value=counts[name]))
+    db.session.commit()
+    return counts
@@ -0,0 +1,175 @@
+"""Outbox delivery against a local aiosmtpd server standing in for the real relay"""
+import socket
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import AuthResult
+
+import email_service
+from app import db
+from models import EmailOutbox, Issue
+from outbox_worker import _claim, deliver_pending
+
+
+class RecordingHandler:
+    """Keeps every accepted message; answers 451 to the next ``fail_next`` ones"""
+
+    def __init__(self):
+        self.messages = []
+        self.fail_next = 0
+        self.lock = threading.Lock()
+
+    async def handle_DATA(self, server, session, envelope):
+        with self.lock:
+            if self.fail_next:
+                self.fail_next -= 1
+                return '451 Try again later'
+            self.messages.append(envelope)
+        return '250 OK'
+
+    def subjects(self):
+        from email import message_from_bytes
+        return [message_from_bytes(envelope.content)['Subject'] for envelope in self.messages]
+
+
+def _accept_any_login(server, session, envelope, mechanism, auth_data):
+    return AuthResult(success=True)
+
+
+def _free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    handler = RecordingHandler()
+    controller = Controller(handler, hostname='127.0.0.1', port=_free_port(),
+                            authenticator=_accept_any_login, auth_require_tls=False)
+    controller.start()
+    monkeypatch.setenv('SMTP_SERVER', '127.0.0.1')
+    monkeypatch.setenv('SMTP_PORT', str(controller.port))
+    monkeypatch.setenv('SMTP_STARTTLS', 'false')
+    monkeypatch.setenv('SENDER_PASSWORD', 'secret')
+    # A fresh pool pointed at this server
+    monkeypatch.setattr(email_service, '_pool', None)
+    yield handler
+    if email_service._pool is not None:
+        email_service._pool.close_all()
+    controller.stop()
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app(DUPLICATE_DETECTION_ENABLED=False, EMAIL_OUTBOX_BACKOFF_SECONDS=30)
+
+
+def _submit(app, count):
+    client = app.test_client()
+    for index in range(count):
+        response = client.post('/submit_issue', data={
+            'name': 'Reporter', 'email': f'reporter{index}@example.com', 'category': 'potholes',
+            'description': f'Deep pothole number {index} near the crossing',
+            'location': f'Main street {index}',
+        })
+        assert response.status_code == 302
+    with app.app_context():
+        return [issue.id for issue in Issue.query.order_by(Issue.id)]
+
+
+def test_submission_is_delivered_and_marks_issue_notified(app, smtp_server):
+    issue_id, = _submit(app, 1)
+    with app.app_context():
+        assert not db.session.get(Issue, issue_id).authority_notified
+        assert deliver_pending() == 1
+        issue = db.session.get(Issue, issue_id)
+        assert issue.authority_notified
+        assert issue.notification_sent_at is not None
+        message = EmailOutbox.query.one()
+        assert message.status == 'sent'
+        assert message.attempts == 0
+    envelope, = smtp_server.messages
+    assert sorted(envelope.rcpt_tos) == sorted(email_service.AUTHORITY_EMAILS['potholes'])
+    assert smtp_server.subjects() == [f'New Civic Issue Reported - Potholes (#{issue_id})']
+
+
+def test_failed_send_is_retried_with_backoff(app, smtp_server):
+    issue_id, = _submit(app, 1)
+    smtp_server.fail_next = 2
+    with app.app_context():
+        before = datetime.utcnow()
+        assert deliver_pending() == 0
+        message = EmailOutbox.query.one()
+        assert (message.status, message.attempts) == ('pending', 1)
+        assert 'Try again later' in message.last_error
+        assert message.next_attempt_at >= before + timedelta(seconds=30)
+        assert not db.session.get(Issue, issue_id).authority_notified
+        # Not due yet: nothing is sent
+        assert deliver_pending() == 0
+        assert message.attempts == 1
+
+        message.next_attempt_at = datetime.utcnow()
+        db.session.commit()
+        assert deliver_pending() == 0
+        message = EmailOutbox.query.one()
+        assert message.attempts == 2
+        # The second failure doubles the delay
+        assert message.next_attempt_at >= datetime.utcnow() + timedelta(seconds=59)
+
+        message.next_attempt_at = datetime.utcnow()
+        db.session.commit()
+        assert deliver_pending() == 1
+        assert EmailOutbox.query.one().status == 'sent'
+        assert db.session.get(Issue, issue_id).authority_notified
+    assert len(smtp_server.messages) == 1
+
+
+def test_message_gives_up_after_max_attempts(make_app, smtp_server):
+    app = make_app(DUPLICATE_DETECTION_ENABLED=False, EMAIL_OUTBOX_MAX_ATTEMPTS=2)
+    _submit(app, 1)
+    smtp_server.fail_next = 5
+    with app.app_context():
+        for _ in range(2):
+            EmailOutbox.query.update({'next_attempt_at': datetime.utcnow()})
+            db.session.commit()
+            deliver_pending()
+        message = EmailOutbox.query.one()
+        assert (message.status, message.attempts) == ('failed', 2)
+        assert not Issue.query.one().authority_notified
+
+
+def test_a_message_is_claimed_once(app, smtp_server):
+    _submit(app, 1)
+    with app.app_context():
+        message_id = EmailOutbox.query.one().id
+        assert _claim(message_id, app.config)
+        assert not _claim(message_id, app.config)
+
+
+def test_concurrent_workers_deliver_each_message_once(app, smtp_server):
+    issue_ids = _submit(app, 20)
+    delivered = []
+
+    def worker():
+        with app.app_context():
+            while True:
+                sent = deliver_pending(batch_size=3)
+                if not sent:
+                    return
+                delivered.append(sent)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(delivered) == len(issue_ids)
+    assert sorted(smtp_server.subjects()) == sorted(
+        f'New Civic Issue Reported - Potholes (#{issue_id})' for issue_id in issue_ids)
+    with app.app_context():
+        assert Issue.query.filter_by(authority_notified=True).count() == len(issue_ids)
+        assert {message.status for message in EmailOutbox.query} == {'sent'}
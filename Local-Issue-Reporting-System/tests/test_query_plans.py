@@ -0,0 +1,53 @@
+"""The hot list and analytics queries must read through an index on every dialect"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import db
+from query_plans import check_query_plans, explain, hot_queries, uses_index
+
+DIALECTS = ('sqlite', 'postgresql')
+QUERIES = dict(hot_queries())
+
+
+def _seed(count=200):
+    from models import Issue
+    start = datetime(2024, 1, 1)
+    db.session.add_all(Issue(
+        name='Reporter', email=f'reporter{index}@example.com',
+        category=('roads', 'potholes', 'traffic')[index % 3],
+        description='Deep pothole near the crossing', location=f'Main street {index}',
+        latitude=40.7 + index / 10000 if index % 2 else None,
+        longitude=-74.0 + index / 10000 if index % 2 else None,
+        status=('submitted', 'in_progress', 'resolved')[index % 3],
+        priority=('low', 'medium', 'high')[index % 3],
+        authority_notified=bool(index % 4),
+        created_at=start + timedelta(hours=index),
+    ) for index in range(count))
+    db.session.commit()
+
+
+@pytest.mark.parametrize('dialect', DIALECTS)
+@pytest.mark.parametrize('name', QUERIES)
+def test_hot_query_uses_an_index(make_app, dialect, name):
+    app = make_app(dialect)
+    with app.app_context():
+        _seed()
+        plan = explain(QUERIES[name])
+        assert uses_index(plan), f'{name} does not use an index:\n' + '\n'.join(plan)
+
+
+@pytest.mark.parametrize('dialect', DIALECTS)
+def test_check_query_plans_covers_every_query(make_app, dialect):
+    app = make_app(dialect)
+    with app.app_context():
+        results = check_query_plans()
+    assert [name for name, _, _ in results] == list(QUERIES)
+    assert all(ok for _, ok, _ in results)
+
+
+def test_cli_reports_plans(make_app):
+    app = make_app()
+    result = app.test_cli_runner().invoke(args=['check-query-plans'])
+    assert result.exit_code == 0, result.output
+    assert '✗' not in result.output
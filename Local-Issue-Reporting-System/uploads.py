@@ -0,0 +1,168 @@
+"""
+Photo upload pipeline.
+
+Uploads are streamed in UPLOAD_CHUNK_SIZE chunks into the content-addressed
+photo store (see photo_store.py). Resized variants sit next to the original
+and are produced by a small thread pool off the request path:
+- thumb: up to 320px, for listings
+- medium: up to 1280px, for detail views
+- large: up to 2560px, the full-size view linked from the detail page
+
+Variants are re-encoded as WebP (JPEG when Pillow lacks WebP), orientation
+is applied, and EXIF metadata (including GPS) is stripped. Templates call
+photo_url(filename, size) and get the variant when it exists, otherwise the
+original's URL. Originals keep the reporter's metadata, so they are never
+served as uploaded: a request for one is redirected to its large variant,
+which is generated on the spot if the pool has not got to it yet. Variant
+generation needs Pillow; without it nothing can be stripped and only
+originals are served.
+"""
+import logging
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, url_for
+
+import photo_store
+
+ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif'}
+
+VARIANT_SIZES = {
+    'thumb': 320,
+    'medium': 1280,
+    'large': 2560,
+}
+
+# Served in place of an original
+PUBLIC_ORIGINAL_SIZE = 'large'
+
+_executor = None
+_pillow = None
+
+
+def allowed_file(filename):
+    """Check if file extension is allowed"""
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+
+
+def load_pillow():
+    """Return Pillow's (Image, ImageOps, features), or None when it is not installed
+
+    Imported on first use rather than at startup, which keeps worker boot fast.
+    """
+    global _pillow
+    if _pillow is None:
+        try:
+            from PIL import Image, ImageOps, features
+            _pillow = (Image, ImageOps, features)
+        except ImportError:  # Pillow is optional; variants are skipped without it
+            _pillow = ()
+    return _pillow or None
+
+
+def _variant_format():
+    pillow = load_pillow()
+    if pillow is not None and pillow[2].check('webp'):
+        return 'WEBP', 'webp'
+    return 'JPEG', 'jpg'
+
+
+def variant_filename(filename, size):
+    """Relative path (under UPLOAD_FOLDER) of a resized variant, next to its original"""
+    stem = os.path.splitext(filename)[0]
+    return f"{stem}.{size}.{_variant_format()[1]}"
+
+
+def save_uploaded_file(file):
+    """Store an uploaded file, schedule its variants and return the stored filename"""
+    if file and allowed_file(file.filename):
+        config = current_app.config
+        ext = file.filename.rsplit('.', 1)[1]
+        filename = photo_store.store_stream(file.stream, ext, config['UPLOAD_FOLDER'],
+                                            config['UPLOAD_CHUNK_SIZE'])
+        # Variants of a photo that was already stored are kept
+        schedule_variants(filename)
+        return filename
+    return None
+
+
+def generate_variants(filename, upload_folder, force=False):
+    """Write every missing variant of an uploaded photo; returns the sizes written"""
+    pillow = load_pillow()
+    if pillow is None:
+        return []
+    Image, ImageOps, _ = pillow
+    source_path = os.path.join(upload_folder, filename)
+    image_format, _ = _variant_format()
+    written = []
+    with Image.open(source_path) as original:
+        # Bake the EXIF orientation into the pixels; the metadata itself is not copied
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+        if image_format == 'JPEG' and image.mode == 'RGBA':
+            image = image.convert('RGB')
+        for size, max_dimension in VARIANT_SIZES.items():
+            target = os.path.join(upload_folder, variant_filename(filename, size))
+            if os.path.exists(target) and not force:
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            variant = image.copy()
+            variant.thumbnail((max_dimension, max_dimension))
+            # Unique partial name: the same photo may be processed twice at once after a re-upload
+            handle, partial_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix='.part')
+            try:
+                with os.fdopen(handle, 'wb') as output:
+                    variant.save(output, format=image_format, quality=80, exif=b'')
+                os.replace(partial_path, target)
+            finally:
+                if os.path.exists(partial_path):
+                    os.remove(partial_path)
+            written.append(size)
+    return written
+
+
+def _generate_logged(filename, upload_folder):
+    try:
+        generate_variants(filename, upload_folder)
+    except Exception as e:
+        logging.error(f"Failed to generate variants for {filename}: {str(e)}")
+
+
+def schedule_variants(filename):
+    """Queue variant generation on the worker pool without blocking the request"""
+    global _executor
+    if load_pillow() is None:
+        return None
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=current_app.config['PHOTO_VARIANT_WORKERS'],
+                                       thread_name_prefix='photo-variants')
+    return _executor.submit(_generate_logged, filename, current_app.config['UPLOAD_FOLDER'])
+
+
+def photo_url(filename, size=PUBLIC_ORIGINAL_SIZE):
+    """URL of a photo at the requested size, falling back to the original until the variant exists"""
+    variant = variant_filename(filename, size)
+    if os.path.exists(os.path.join(current_app.config['UPLOAD_FOLDER'], variant)):
+        return url_for('main.uploaded_file', filename=variant)
+    return url_for('main.uploaded_file', filename=filename)
+
+
+def stripped_original(filename):
+    """Name of the metadata-free variant to serve instead of a stored original
+
+    Generates the variants when they are still missing. Returns None when
+    that is impossible (no Pillow, or the image can't be decoded).
+    """
+    if load_pillow() is None:
+        return None
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    variant = variant_filename(filename, PUBLIC_ORIGINAL_SIZE)
+    if not os.path.exists(os.path.join(upload_folder, variant)):
+        try:
+            generate_variants(filename, upload_folder)
+        except Exception as e:
+            logging.error(f"Failed to generate variants for {filename}: {str(e)}")
+            return None
+    return variant